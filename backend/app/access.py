@@ -0,0 +1,89 @@
+# backend/app/access.py
+"""Контекст доступа вызывающего (роль, проект лида, членства): один запрос к БД, TTL-кэш по sub."""
+import os
+import threading
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .auth import get_current_user
+from .db import get_async_db
+from .models import Project, TeamMember, UserProfile
+
+ACCESS_CACHE_SIZE = int(os.getenv("ACCESS_CACHE_SIZE", "10000"))
+# кэш у каждого процесса свой: сброс в другом воркере виден здесь не позже TTL
+ACCESS_CACHE_TTL = float(os.getenv("ACCESS_CACHE_TTL", "30"))
+
+_cache: TTLCache = TTLCache(maxsize=max(ACCESS_CACHE_SIZE, 1), ttl=ACCESS_CACHE_TTL)
+# растёт на каждом forget(): контекст, прочитанный до сброса, в кэш уже не кладём
+_generation = 0
+# forget() зовут sync-маршруты из threadpool, load() — event loop; TTLCache не потокобезопасен
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class AccessContext:
+    sub: str
+    is_teacher: bool
+    mode: Optional[str] = None            # user_profiles.mode (None — профиля ещё нет)
+    lead_project: Optional[int] = None    # проект, где вызывающий — лид
+    projects: FrozenSet[int] = frozenset()  # проекты, где он в team_members
+
+    def is_member(self, project_id: int) -> bool:
+        return project_id in self.projects or project_id == self.lead_project
+
+    def can_view(self, project_id: int) -> bool:
+        return self.is_teacher or self.is_member(project_id)
+
+    def require_member(self, project_id: int) -> None:
+        """403, если не преподаватель и не участник/лид проекта."""
+        if not self.can_view(project_id):
+            raise HTTPException(403, "Forbidden")
+
+
+def forget(sub: Optional[str] = None) -> None:
+    """Сбросить контекст одного пользователя (или всех — sub=None)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if sub is None:
+            _cache.clear()
+        else:
+            _cache.pop(sub, None)
+
+
+def _context_stmt(sub: str):
+    # один round-trip: три скалярных подзапроса по индексам sub / lead_sub / member_sub
+    return select(
+        select(UserProfile.mode).where(UserProfile.sub == sub).scalar_subquery(),
+        select(Project.id).where(Project.lead_sub == sub).order_by(Project.id).limit(1).scalar_subquery(),
+        select(func.array_agg(TeamMember.project_id)).where(TeamMember.member_sub == sub).scalar_subquery(),
+    )
+
+
+async def load(db: AsyncSession, sub: str, is_teacher: bool) -> AccessContext:
+    if is_teacher:
+        return AccessContext(sub=sub, is_teacher=True, mode="teacher")
+    with _lock:  # только вокруг обращений к кэшу — не через await
+        ctx = _cache.get(sub)
+        generation = _generation
+    if ctx is None:
+        mode, lead_project, projects = (await db.execute(_context_stmt(sub))).one()
+        ctx = AccessContext(sub=sub, is_teacher=False, mode=mode, lead_project=lead_project,
+                            projects=frozenset(projects or ()))
+        with _lock:
+            if generation == _generation:
+                _cache[sub] = ctx
+    return ctx
+
+
+async def get_access(user=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> AccessContext:
+    sub = user.get("sub")
+    if not sub:
+        raise HTTPException(401, "No sub in token")
+    roles = user.get("realm_access", {}).get("roles", []) or []
+    return await load(db, sub, "teacher" in roles)
@@ -0,0 +1,177 @@
+# backend/app/activity.py
+"""
+Источники активности для подсказки оценки: (commits, lines_changed) за окно.
+
+ACTIVITY_SOURCE=github (по умолчанию) — GitHub REST API с кэшем в БД (github.py).
+ACTIVITY_SOURCE=git — локальные bare-зеркала репозиториев: git fetch докачивает
+только новое, а коммиты и строки считаются через git log --numstat. Не зависит
+от лимитов API, работает с любым git-хостингом и без сети (на уже скачанных зеркалах).
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Protocol
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .github import GITHUB_MAX_PAGES, GITHUB_PER_PAGE, GITHUB_TOKEN, _parse_repo, repo_activity
+
+ACTIVITY_SOURCE = os.getenv("ACTIVITY_SOURCE", "github")
+GIT_MIRROR_ROOT = Path(os.getenv("GIT_MIRROR_ROOT", "/app/mirrors"))
+GIT_MIRROR_FETCH_INTERVAL = float(os.getenv("GIT_MIRROR_FETCH_INTERVAL", "60"))  # сек между fetch одного зеркала
+GIT_TIMEOUT = float(os.getenv("GIT_TIMEOUT", "300"))
+# Какие транспорты git разрешены для URL из карточек проектов. Ссылки вводят студенты,
+# поэтому file://, ext:: и т.п. по умолчанию запрещены; для фикстур в тестах — "https:file".
+GIT_ALLOW_PROTOCOL = os.getenv("GIT_ALLOW_PROTOCOL", "https")
+
+
+class ActivityError(ValueError):
+    """URL репозитория не подходит источнику."""
+
+
+class ActivitySource(Protocol):
+    def label(self, url: str) -> str: ...
+    # (commits, lines_changed, truncated): truncated — упёрлись в потолок коммитов, числа неполные
+    async def activity(self, db: AsyncSession, url: str, since: datetime,
+                       until: datetime) -> tuple[int, int, bool]: ...
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# GitHub REST API
+# ─────────────────────────────────────────────────────────────────────────────
+class GithubApiSource:
+    def _owner_repo(self, url: str) -> tuple[str, str]:
+        parsed = _parse_repo(url)
+        if not parsed:
+            raise ActivityError("Unsupported repo_url format (need https://github.com/owner/repo)")
+        return parsed
+
+    def label(self, url: str) -> str:
+        owner, repo = self._owner_repo(url)
+        return f"{owner}/{repo}"
+
+    async def activity(self, db: AsyncSession, url: str, since: datetime,
+                       until: datetime) -> tuple[int, int, bool]:
+        owner, repo = self._owner_repo(url)
+        return await repo_activity(db, owner, repo, since, until)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Локальные git-зеркала
+# ─────────────────────────────────────────────────────────────────────────────
+class GitMirrorSource:
+    def __init__(self, root: Path = GIT_MIRROR_ROOT):
+        self.root = root
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._fetched_at: dict[str, float] = {}
+
+    def label(self, url: str) -> str:
+        parsed = _parse_repo(url)
+        return f"{parsed[0]}/{parsed[1]}" if parsed else url
+
+    def _check_url(self, url: str) -> str:
+        url = (url or "").strip()
+        scheme = url.split("://", 1)[0].lower() if "://" in url else ""
+        allowed = {p for p in GIT_ALLOW_PROTOCOL.split(":") if p}
+        if scheme not in allowed or url.startswith("-"):
+            raise ActivityError(f"Unsupported repo_url for git mirror (allowed: {', '.join(sorted(allowed))})")
+        return url
+
+    def mirror_path(self, url: str) -> Path:
+        parsed = _parse_repo(url)
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{parsed[0]}__{parsed[1]}") if parsed else "repo"
+        # хеш URL — чтобы одинаковые имена с разных хостов не склеились
+        return self.root / f"{name}-{hashlib.sha1(url.encode()).hexdigest()[:10]}.git"
+
+    def _git_env(self) -> dict[str, str]:
+        return {**os.environ, "GIT_TERMINAL_PROMPT": "0", "GIT_ALLOW_PROTOCOL": GIT_ALLOW_PROTOCOL}
+
+    def _auth_args(self, url: str) -> list[str]:
+        # приватные репозитории на GitHub — тем же токеном, что и API
+        if GITHUB_TOKEN and url.lower().startswith("https://github.com/"):
+            basic = base64.b64encode(f"x-access-token:{GITHUB_TOKEN}".encode()).decode()
+            return ["-c", f"http.https://github.com/.extraheader=AUTHORIZATION: basic {basic}"]
+        return []
+
+    async def _git(self, *args: str, timeout: float = GIT_TIMEOUT) -> str:
+        proc = await asyncio.create_subprocess_exec(
+            "git", *args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=self._git_env(),
+        )
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise RuntimeError(f"git {args[0] if args else ''} timed out")
+        if proc.returncode != 0:
+            raise RuntimeError(f"git failed: {err.decode(errors='replace').strip()[:500]}")
+        return out.decode(errors="replace")
+
+    async def update(self, url: str) -> Path:
+        """Клонирует зеркало при первом обращении, дальше — инкрементальный fetch (не чаще интервала)."""
+        url = self._check_url(url)
+        path = self.mirror_path(url)
+        key = str(path)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if not (path / "HEAD").exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(path.name + ".tmp")
+                if tmp.exists():  # остаток прерванного clone
+                    await asyncio.to_thread(shutil.rmtree, tmp, True)
+                await self._git(*self._auth_args(url), "clone", "--mirror", "--quiet", "--", url, str(tmp))
+                os.replace(tmp, path)
+                self._fetched_at[key] = time.monotonic()
+            elif time.monotonic() - self._fetched_at.get(key, float("-inf")) >= GIT_MIRROR_FETCH_INTERVAL:
+                await self._git(*self._auth_args(url), "-C", str(path), "fetch", "--prune", "--quiet")
+                self._fetched_at[key] = time.monotonic()
+        return path
+
+    async def activity(self, db: AsyncSession, url: str, since: datetime,
+                       until: datetime) -> tuple[int, int, bool]:
+        path = await self.update(url)
+        out = await self._git(
+            "-C", str(path), "log", "HEAD",
+            f"--since={since.astimezone(timezone.utc).isoformat()}",
+            f"--until={until.astimezone(timezone.utc).isoformat()}",
+            f"--max-count={GITHUB_MAX_PAGES * GITHUB_PER_PAGE}",  # тот же потолок, что и у API
+            "--numstat", "--format=%x00%H",
+        )
+        commits, lines = _parse_numstat(out)
+        return commits, lines, commits >= GITHUB_MAX_PAGES * GITHUB_PER_PAGE
+
+
+def _parse_numstat(out: str) -> tuple[int, int]:
+    commits = 0
+    lines = 0
+    for line in out.splitlines():
+        if line.startswith("\x00"):
+            commits += 1
+            continue
+        parts = line.split("\t", 2)
+        if len(parts) == 3:
+            # у бинарных файлов вместо чисел "-"
+            lines += (int(parts[0]) if parts[0].isdigit() else 0) + (int(parts[1]) if parts[1].isdigit() else 0)
+    return commits, lines
+
+
+_SOURCES: dict[str, ActivitySource] = {}
+
+
+def get_source(name: Optional[str] = None) -> ActivitySource:
+    name = (name or ACTIVITY_SOURCE).lower()
+    if name not in _SOURCES:
+        if name == "github":
+            _SOURCES[name] = GithubApiSource()
+        elif name == "git":
+            _SOURCES[name] = GitMirrorSource()
+        else:
+            raise RuntimeError(f"Unknown ACTIVITY_SOURCE: {name}")
+    return _SOURCES[name]
@@ -1,12 +1,16 @@
 # backend/app/auth.py
+import asyncio
+import hashlib
+import logging
 import os
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import httpx
-from cachetools import TTLCache
+from cachetools import TLRUCache
 from fastapi import Depends, Header, HTTPException
-from jose import jwt
+from jose import jwk, jwt
+from jose.backends.base import Key
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Конфиг из окружения
@@ -20,47 +24,237 @@ KC_CA_BUNDLE = os.getenv("KC_CA_BUNDLE")  # путь до кастомного 
 if not KC_ISSUER or not KC_JWKS_URL:
     raise RuntimeError("KC_ISSUER и KC_JWKS_URL обязательны для валидации токена")
 
-# Кэш JWKS на 10 минут
-_jwks_cache: TTLCache = TTLCache(maxsize=1, ttl=600)
+# Кэш проверенных claims: размер и верхняя граница жизни записи (сек).
+# Запись в любом случае живёт не дольше exp самого токена.
+KC_CLAIMS_CACHE_SIZE = int(os.getenv("KC_CLAIMS_CACHE_SIZE", "4096"))
+KC_CLAIMS_CACHE_MAX_TTL = float(os.getenv("KC_CLAIMS_CACHE_MAX_TTL", "300"))
+
+# JWKS: сколько считаем свежим, за сколько до истечения обновляем в фоне,
+# и как часто разрешаем внеплановый refetch (неизвестный kid / ошибка Keycloak)
+KC_JWKS_TTL = float(os.getenv("KC_JWKS_TTL", "600"))
+KC_JWKS_REFRESH_AHEAD = float(os.getenv("KC_JWKS_REFRESH_AHEAD", "60"))
+KC_JWKS_MIN_REFETCH_INTERVAL = float(os.getenv("KC_JWKS_MIN_REFETCH_INTERVAL", "30"))
+
+log = logging.getLogger(__name__)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# JWKS helpers
+# JWKS manager
 # ─────────────────────────────────────────────────────────────────────────────
-async def _get_jwks() -> Dict[str, Any]:
-    if "jwks" in _jwks_cache:
-        return _jwks_cache["jwks"]  # type: ignore[index]
-    verify_arg: Any = KC_CA_BUNDLE if KC_CA_BUNDLE else True
-    async with httpx.AsyncClient(timeout=10.0, verify=verify_arg) as client:
-        r = await client.get(KC_JWKS_URL)  # type: ignore[arg-type]
-        r.raise_for_status()
-        data = r.json()
-        _jwks_cache["jwks"] = data
-        return data
-
-def _rsa_key_for_kid(jwks: Dict[str, Any], kid: Optional[str]) -> Optional[Dict[str, str]]:
-    if not kid:
-        return None
+def _build_jwk_index(jwks: Dict[str, Any]) -> Dict[str, Key]:
+    """kid -> готовый RSA-ключ; битые и не-RSA ключи пропускаем."""
+    index: Dict[str, Key] = {}
     for key in jwks.get("keys", []):
-        if key.get("kid") == kid and key.get("kty") == "RSA":
-            n = key.get("n"); e = key.get("e")
-            if n and e:
-                return {"kty": "RSA", "n": n, "e": e}
-    return None
+        kid = key.get("kid")
+        if not kid or key.get("kty") != "RSA":
+            continue
+        n = key.get("n"); e = key.get("e")
+        if not (n and e):
+            continue
+        try:
+            index[kid] = jwk.construct({"kty": "RSA", "n": n, "e": e}, "RS256")
+        except Exception:
+            continue
+    return index
+
+
+class JWKSManager:
+    """
+    Держит ключи Keycloak в памяти и обновляет их:
+      - один общий httpx-клиент с пулом соединений;
+      - одновременные обновления схлопываются в один запрос (single-flight);
+      - за refresh_ahead секунд до истечения TTL обновляемся в фоне, не блокируя запросы;
+      - на неизвестный kid — внеплановый refetch, но не чаще min_refetch_interval;
+      - если Keycloak недоступен, продолжаем отдавать последние известные ключи.
+    """
+
+    def __init__(self, url: str, *, ttl: float = 600.0, refresh_ahead: float = 60.0,
+                 min_refetch_interval: float = 30.0, verify: Any = True,
+                 on_rotate: Optional[Callable[[], None]] = None):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl)
+        self.min_refetch_interval = min_refetch_interval
+        self._verify = verify
+        self._on_rotate = on_rotate
+        self._client: Optional[httpx.AsyncClient] = None
+        self._index: Dict[str, Key] = {}
+        self._fetched_at: Optional[float] = None  # monotonic, время последнего успешного fetch
+        self._last_attempt = float("-inf")
+        self._inflight: Optional[asyncio.Task] = None
+        self.fetches = 0
+        self.failures = 0
+        self.kid_hits = 0     # kid нашёлся в уже загруженном JWKS
+        self.kid_misses = 0   # пришлось перечитывать JWKS или ключа нет вовсе
+
+    @property
+    def index(self) -> Dict[str, Key]:
+        return self._index
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10.0, verify=self._verify,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._inflight is not None and not self._inflight.done():
+            self._inflight.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _fetch(self) -> None:
+        self._last_attempt = time.monotonic()
+        self.fetches += 1
+        try:
+            r = await self._get_client().get(self.url)
+            r.raise_for_status()
+            index = _build_jwk_index(r.json())
+        except Exception:
+            self.failures += 1
+            if self._fetched_at is None:
+                raise
+            log.warning("JWKS refresh failed, serving stale keys", exc_info=True)
+            return
+        rotated = set(index) != set(self._index)
+        self._index = index
+        self._fetched_at = time.monotonic()
+        if rotated and self._on_rotate is not None:
+            self._on_rotate()
+
+    def _refresh(self) -> "asyncio.Future[None]":
+        # Все, кто пришёл во время обновления, ждут один и тот же запрос
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        # shield: отмена одного HTTP-запроса клиента не должна рвать общий fetch
+        return asyncio.shield(self._inflight)
+
+    def _can_refetch(self) -> bool:
+        return time.monotonic() - self._last_attempt >= self.min_refetch_interval
+
+    async def keys(self) -> Dict[str, Key]:
+        if self._fetched_at is None:
+            await self._refresh()
+            return self._index
+        age = time.monotonic() - self._fetched_at
+        if age >= self.ttl:
+            # Протухло: ждём обновления (при ошибке _fetch оставит старые ключи)
+            if self._can_refetch() or (self._inflight is not None and not self._inflight.done()):
+                await self._refresh()
+        elif age >= self.ttl - self.refresh_ahead and self._can_refetch():
+            self._refresh()  # фоновое обновление, текущий запрос не ждёт
+        return self._index
+
+    async def key_for_kid(self, kid: Optional[str]) -> Optional[Key]:
+        if not kid:
+            return None
+        key = (await self.keys()).get(kid)
+        if key is not None:
+            self.kid_hits += 1
+            return key
+        self.kid_misses += 1
+        if self._can_refetch():
+            # Возможно, Keycloak уже подписывает новым ключом — перечитаем JWKS
+            await self._refresh()
+            key = self._index.get(kid)
+        return key
+
+
+def _on_jwks_rotate() -> None:
+    # Набор ключей поменялся (ротация) — проверенные ранее claims больше не доверяем
+    _claims_cache.clear()
+
+jwks_manager = JWKSManager(
+    KC_JWKS_URL,
+    ttl=KC_JWKS_TTL,
+    refresh_ahead=KC_JWKS_REFRESH_AHEAD,
+    min_refetch_interval=KC_JWKS_MIN_REFETCH_INTERVAL,
+    verify=KC_CA_BUNDLE if KC_CA_BUNDLE else True,
+    on_rotate=_on_jwks_rotate,
+)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Кэш проверенных claims (ключ — sha256 токена)
+# ─────────────────────────────────────────────────────────────────────────────
+def _claims_ttu(_key: bytes, value: Tuple[str, Dict[str, Any]], now: float) -> float:
+    exp = value[1].get("exp")
+    deadline = now + KC_CLAIMS_CACHE_MAX_TTL
+    try:
+        return min(float(exp), deadline) if exp else deadline
+    except (TypeError, ValueError):
+        return now
+
+# timer=time.time — чтобы сравнивать напрямую с exp из токена
+_claims_cache: TLRUCache = TLRUCache(maxsize=KC_CLAIMS_CACHE_SIZE, ttu=_claims_ttu, timer=time.time)
+_claims_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def _cached_claims(digest: bytes) -> Optional[Dict[str, Any]]:
+    entry = _claims_cache.get(digest) if KC_CLAIMS_CACHE_SIZE > 0 else None
+    # Ключ, которым подписан токен, мог уйти из JWKS — тогда запись недействительна
+    if entry is None or entry[0] not in jwks_manager.index:
+        _claims_stats["misses"] += 1
+        return None
+    _claims_stats["hits"] += 1
+    return dict(entry[1])
+
+def claims_cache_stats() -> Dict[str, Any]:
+    hits, misses = _claims_stats["hits"], _claims_stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": (hits / total) if total else None,
+        "size": len(_claims_cache),
+        "maxsize": _claims_cache.maxsize,
+    }
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Основная проверка токена
 # ─────────────────────────────────────────────────────────────────────────────
 async def verify_token_and_roles(token: str, need_roles: Optional[List[str]] = None) -> Dict[str, Any]:
+    # 1-3) Подпись, iss и aud; если токен уже проверяли — берём claims из кэша
+    digest = _token_digest(token)
+    claims = _cached_claims(digest)
+    if claims is None:
+        kid, claims = await _verify_signature_and_audience(token)
+        if KC_CLAIMS_CACHE_SIZE > 0:
+            _claims_cache[digest] = (kid, claims)
+            claims = dict(claims)
+
+    # 4) Проверка ролей (если требуют)
+    if need_roles:
+        roles = (
+            claims.get("realm_access", {}).get("roles", [])
+            or claims.get("resource_access", {}).get(KC_FRONTEND_CLIENT_ID, {}).get("roles", [])
+        )
+        roles = roles or []
+        for nr in need_roles:
+            if nr not in roles:
+                raise PermissionError(f"Role '{nr}' required")
+
+    # 5) Срок действия
+    exp = claims.get("exp")
+    if exp and time.time() > float(exp):
+        raise ValueError("Token expired")
+
+    return claims
+
+async def _verify_signature_and_audience(token: str) -> Tuple[str, Dict[str, Any]]:
     # 1) Заголовок и ключ
     try:
         header = jwt.get_unverified_header(token)
     except Exception as e:
         raise ValueError(f"Invalid JWT header: {e}")
     kid = header.get("kid")
-    jwks = await _get_jwks()
-    rsa_key = _rsa_key_for_kid(jwks, kid)
+    rsa_key = await jwks_manager.key_for_kid(kid)
     if not rsa_key:
         raise ValueError("No matching RSA JWK for kid")
 
@@ -68,7 +262,7 @@ async def verify_token_and_roles(token: str, need_roles: Optional[List[str]] = N
     try:
         claims = jwt.decode(
             token,
-            rsa_key,  # JWK с 'kty','n','e'
+            rsa_key,  # готовый RSA-ключ из JWKSManager
             algorithms=["RS256"],
             options={"verify_aud": False},  # aud проверим ниже вручную
             issuer=KC_ISSUER,
@@ -88,23 +282,7 @@ async def verify_token_and_roles(token: str, need_roles: Optional[List[str]] = N
         if not valid:
             raise ValueError("Invalid audience")
 
-    # 4) Проверка ролей (если требуют)
-    if need_roles:
-        roles = (
-            claims.get("realm_access", {}).get("roles", [])
-            or claims.get("resource_access", {}).get(KC_FRONTEND_CLIENT_ID, {}).get("roles", [])
-        )
-        roles = roles or []
-        for nr in need_roles:
-            if nr not in roles:
-                raise PermissionError(f"Role '{nr}' required")
-
-    # 5) Срок действия
-    exp = claims.get("exp")
-    if exp and time.time() > float(exp):
-        raise ValueError("Token expired")
-
-    return claims
+    return kid, claims
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -0,0 +1,225 @@
+# backend/app/bulk_import.py
+"""
+Массовый импорт профилей, проектов и составов команд (POST /api/admin/import[/csv]).
+
+Всё проверяется в памяти по тем же правилам, что и ручной путь через API:
+один проект на лида, лид — не преподаватель и не состоит в чужой команде,
+не больше 5 человек в команде, при 5 участниках обязателен mobile_repo_url.
+Состояние БД для проверки читается несколькими запросами с IN (...), а не по
+строке. Если ошибок нет — запись в одной транзакции многострочными INSERT
+(профили — upsert по sub). Если есть хоть одна — ничего не пишется, в ответе
+отчёт по строкам.
+"""
+import csv
+import io
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .models import Project, TeamMember, UserProfile
+from . import events, versions
+from .rating import refresh_ratings
+from .schemas import (ImportMembershipRow, ImportProfileRow, ImportProjectRow, ImportReportOut,
+                      ImportRowError)
+
+MAX_TEAM = 5
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "20000"))
+IMPORT_BATCH = 1000  # строк в одном INSERT (держимся подальше от лимита параметров)
+
+PROFILE_FIELDS = ("username", "email", "full_name", "group_no", "tg", "mode")
+
+Rows = List[Tuple[int, Dict[str, Any]]]  # (номер строки для отчёта, сырые поля)
+
+
+def parse_csv(data: bytes) -> Rows:
+    """CSV с заголовком (UTF-8, можно с BOM); пустые ячейки → None. Номер строки — как в файле."""
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    rows: Rows = []
+    for raw in reader:
+        rows.append((reader.line_num, {
+            k.strip(): (v.strip() or None) if isinstance(v, str) else v
+            for k, v in raw.items() if k
+        }))
+    return rows
+
+
+def _format_validation(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(x) for x in err['loc']) or 'row'}: {err['msg']}" for err in e.errors())
+
+
+def _chunks(items: List[Any], size: int = IMPORT_BATCH) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class _Report:
+    def __init__(self):
+        self.errors: List[ImportRowError] = []
+
+    def add(self, section: str, row: int, error: str) -> None:
+        self.errors.append(ImportRowError(section=section, row=row, error=error))
+
+    def validate(self, model: type[BaseModel], section: str, rows: Rows) -> List[Tuple[int, Any]]:
+        out = []
+        for n, raw in rows:
+            try:
+                out.append((n, model.model_validate(raw)))
+            except ValidationError as e:
+                self.add(section, n, _format_validation(e))
+        return out
+
+
+def run_import(db: Session, profiles: Rows, projects: Rows, memberships: Rows,
+               dry_run: bool = False) -> ImportReportOut:
+    rep = _Report()
+    prof_rows = rep.validate(ImportProfileRow, "profiles", profiles)
+    proj_rows = rep.validate(ImportProjectRow, "projects", projects)
+    mem_rows = rep.validate(ImportMembershipRow, "memberships", memberships)
+
+    # ---------- текущее состояние БД — пачкой ----------
+    subs = ({r.sub for _, r in prof_rows} | {r.lead_sub for _, r in proj_rows}
+            | {r.member_sub for _, r in mem_rows} | {r.lead_sub for _, r in mem_rows if r.lead_sub})
+    existing: Dict[str, UserProfile] = {
+        p.sub: p for p in db.scalars(select(UserProfile).where(UserProfile.sub.in_(subs)))
+    } if subs else {}
+    lead_subs = {r.lead_sub for _, r in proj_rows} | {r.lead_sub for _, r in mem_rows if r.lead_sub}
+    ref_ids = {r.project_id for _, r in mem_rows if r.project_id is not None}
+    cond = []
+    if lead_subs:
+        cond.append(Project.lead_sub.in_(lead_subs))
+    if ref_ids:
+        cond.append(Project.id.in_(ref_ids))
+    known_projects: List[Project] = list(db.scalars(select(Project).where(or_(*cond)))) if cond else []
+    project_by_id = {p.id: p for p in known_projects}
+    project_by_lead = {p.lead_sub: p for p in known_projects}
+    team: Dict[Any, set] = {p.id: set() for p in known_projects}
+    for pid, member_sub in db.execute(select(TeamMember.project_id, TeamMember.member_sub)
+                                      .where(TeamMember.project_id.in_(team.keys()))) if team else ():
+        team[pid].add(member_sub)
+    new_leads = {r.lead_sub for _, r in proj_rows}
+    lead_memberships: Dict[str, int] = dict(
+        db.execute(select(TeamMember.member_sub, func.min(TeamMember.project_id))
+                   .where(TeamMember.member_sub.in_(new_leads)).group_by(TeamMember.member_sub)).all()
+    ) if new_leads else {}
+
+    # ---------- профили ----------
+    imported: Dict[str, ImportProfileRow] = {}
+    for n, r in prof_rows:
+        if r.sub in imported:
+            rep.add("profiles", n, f"Duplicate sub {r.sub}")
+        elif existing.get(r.sub) is not None and existing[r.sub].mode == "teacher":
+            rep.add("profiles", n, "Cannot import over a teacher profile")
+        elif existing.get(r.sub) is not None and existing[r.sub].mode == "lead" and r.mode not in (None, "lead"):
+            # как и в update_profile: лид остаётся владельцем projects.lead_sub
+            rep.add("profiles", n, "Mode is locked: cannot switch from lead to participant")
+        else:
+            imported[r.sub] = r
+
+    def mode_of(sub: str) -> Optional[str]:
+        if sub in imported and imported[sub].mode:
+            return imported[sub].mode
+        p = existing.get(sub)
+        return p.mode if p is not None else ("participant" if sub in imported else None)
+
+    # ---------- проекты ----------
+    new_projects: Dict[str, ImportProjectRow] = {}
+    for n, r in proj_rows:
+        mode = mode_of(r.lead_sub)
+        if mode is None:
+            rep.add("projects", n, f"Lead profile {r.lead_sub} not found (add it to profiles)")
+        elif mode == "teacher":
+            rep.add("projects", n, "Teacher cannot lead a project")
+        elif r.lead_sub in project_by_lead or r.lead_sub in new_projects:
+            rep.add("projects", n, "Lead already has a project")
+        elif r.lead_sub in lead_memberships:
+            rep.add("projects", n, f"Lead is already a member of project {lead_memberships[r.lead_sub]}")
+        else:
+            new_projects[r.lead_sub] = r
+            team[r.lead_sub] = {r.lead_sub}  # ключ нового проекта — sub лида, лид — первый участник
+
+    # ---------- составы ----------
+    new_members: List[Tuple[Any, ImportMembershipRow]] = []
+    filled_by: Dict[Any, int] = {}  # проект -> строка, на которой команда дошла до 5
+    for n, r in mem_rows:
+        if r.project_id is not None:
+            key = r.project_id if r.project_id in project_by_id else None
+        elif r.lead_sub:
+            key = r.lead_sub if r.lead_sub in new_projects else getattr(project_by_lead.get(r.lead_sub), "id", None)
+        else:
+            rep.add("memberships", n, "Either project_id or lead_sub is required")
+            continue
+        if key is None:
+            rep.add("memberships", n, "Project not found")
+            continue
+        mode = mode_of(r.member_sub)
+        if mode is None:
+            rep.add("memberships", n, f"Student {r.member_sub} not found (add it to profiles)")
+        elif mode == "teacher":
+            rep.add("memberships", n, "Only students can be added")
+        elif r.member_sub in team[key]:
+            rep.add("memberships", n, "Student already in this project")
+        elif len(team[key]) >= MAX_TEAM:
+            rep.add("memberships", n, f"Team is full (max {MAX_TEAM})")
+        else:
+            team[key].add(r.member_sub)
+            new_members.append((key, r))
+            if len(team[key]) == MAX_TEAM:
+                filled_by[key] = n
+    for key, n in filled_by.items():
+        mobile = new_projects[key].mobile_repo_url if key in new_projects else project_by_id[key].mobile_repo_url
+        if not mobile:
+            rep.add("memberships", n, f"With {MAX_TEAM} members, mobile_repo_url is required")
+
+    # ---------- план записи ----------
+    profile_values: Dict[str, Dict[str, Any]] = {}
+    for sub, r in imported.items():
+        profile_values[sub] = {f: getattr(r, f) for f in PROFILE_FIELDS}
+    for sub in new_projects:
+        profile_values.setdefault(sub, dict.fromkeys(PROFILE_FIELDS))["mode"] = "lead"
+    for sub, v in profile_values.items():
+        if sub not in existing and not v["mode"]:
+            v["mode"] = "participant"
+
+    report = ImportReportOut(
+        ok=not rep.errors, dry_run=dry_run, errors=rep.errors,
+        profiles_created=sum(1 for s in profile_values if s not in existing),
+        profiles_updated=sum(1 for s in profile_values if s in existing),
+        projects_created=len(new_projects),
+        members_added=len(new_members),
+    )
+    if rep.errors or dry_run:
+        db.rollback()
+        return report
+
+    # ---------- запись: одна транзакция, многострочные INSERT ----------
+    table = UserProfile.__table__
+    rows = [{"sub": s, **v} for s, v in profile_values.items()]
+    for chunk in _chunks(rows):
+        stmt = pg_insert(UserProfile).values(chunk)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["sub"],
+            set_={f: func.coalesce(stmt.excluded[f], table.c[f]) for f in PROFILE_FIELDS},
+        ))
+
+    project_ids: Dict[Any, int] = {}
+    for chunk in _chunks(list(new_projects.values())):
+        for pid, lead in db.execute(insert(Project).returning(Project.id, Project.lead_sub),
+                                    [r.model_dump() for r in chunk]):
+            project_ids[lead] = pid
+
+    member_rows = [{"project_id": project_ids[lead], "member_sub": lead, "role_in_team": "lead"}
+                   for lead in new_projects]
+    member_rows += [{"project_id": project_ids.get(key, key), "member_sub": r.member_sub,
+                     "role_in_team": r.role_in_team} for key, r in new_members]
+    for chunk in _chunks(member_rows):
+        db.execute(insert(TeamMember), chunk)
+
+    refresh_ratings(db, {m["project_id"] for m in member_rows})
+    versions.bump(db, "profiles", "projects")
+    events.emit(db, "reset")  # составы команд поменялись пачкой — пусть клиенты переподключатся
+    db.commit()
+    return report
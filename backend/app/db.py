@@ -1,12 +1,86 @@
 import os
-from sqlalchemy import create_engine
+import time
+from typing import Any, Dict
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 DATABASE_URL = os.environ["DATABASE_URL"]
 
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+# Пул соединений — на каждый движок (sync — для маршрутов в threadpool, async — для async-маршрутов)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))   # сек ожидания свободного соединения
+# pre-ping — лишний SELECT 1 на каждый checkout; можно выключить и полагаться на recycle
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() not in ("0", "false", "no")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1" if DB_POOL_PRE_PING else "1800"))  # сек, -1 — не пересоздавать
+# Серверные таймауты (мс, 0 — без ограничения), выставляются при подключении
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_IDLE_IN_TX_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TX_TIMEOUT_MS", "0"))
+
+
+def _connect_args() -> Dict[str, Any]:
+    opts = []
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        opts.append(f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}")
+    if DB_IDLE_IN_TX_TIMEOUT_MS > 0:
+        opts.append(f"-c idle_in_transaction_session_timeout={DB_IDLE_IN_TX_TIMEOUT_MS}")
+    return {"options": " ".join(opts)} if opts else {}
+
+
+class _StatsMixin:
+    """Счётчики checkout: сколько раз ждали свободное соединение и сколько это заняло."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = {"checkouts": 0, "waits": 0, "timeouts": 0,
+                      "checkout_time_total": 0.0, "checkout_time_max": 0.0}
+
+    def _do_get(self):
+        # пул исчерпан: ни свободных соединений, ни права открыть overflow — придётся ждать
+        exhausted = self._pool.qsize() == 0 and self._max_overflow > -1 and self._overflow >= self._max_overflow
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            self.stats["checkouts"] += 1
+            self.stats["waits"] += int(exhausted)
+            self.stats["checkout_time_total"] += dt
+            self.stats["checkout_time_max"] = max(self.stats["checkout_time_max"], dt)
+
+
+class StatsQueuePool(_StatsMixin, QueuePool):
+    pass
+
+
+class StatsAsyncQueuePool(_StatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_ENGINE_KW = dict(
+    echo=False,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    connect_args=_connect_args(),
+)
+
+engine = create_engine(DATABASE_URL, poolclass=StatsQueuePool, **_ENGINE_KW)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# postgresql+psycopg:// у create_async_engine автоматически берёт async-вариант psycopg 3
+async_engine = create_async_engine(DATABASE_URL, poolclass=StatsAsyncQueuePool, **_ENGINE_KW)
+# expire_on_commit=False: после commit атрибуты ORM-объектов читаются без ленивого
+# запроса (в async-сессии он невозможен), как и нужно для response_model
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 class Base(DeclarativeBase):
     pass
 
@@ -17,3 +91,40 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _pool_stats(pool) -> Dict[str, Any]:
+    s = getattr(pool, "stats", {})
+    checkouts = s.get("checkouts", 0)
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "waits": s.get("waits", 0),
+        "timeouts": s.get("timeouts", 0),
+        "checkout_ms_avg": round(s["checkout_time_total"] / checkouts * 1000, 3) if checkouts else None,
+        "checkout_ms_max": round(s.get("checkout_time_max", 0.0) * 1000, 3),
+    }
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Текущее состояние обоих пулов и их настройки (для /api/admin/db-pool)."""
+    return {
+        "sync": _pool_stats(engine.pool),
+        "async": _pool_stats(async_engine.sync_engine.pool),
+        "config": {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pre_ping": DB_POOL_PRE_PING,
+            "recycle": DB_POOL_RECYCLE,
+            "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+            "idle_in_transaction_timeout_ms": DB_IDLE_IN_TX_TIMEOUT_MS,
+        },
+    }
@@ -0,0 +1,185 @@
+# backend/app/events.py
+"""
+Push-уведомления об изменениях (GET /api/events, Server-Sent Events); между процессами —
+мост через Postgres LISTEN/NOTIFY (EVENTS_PG_NOTIFY=1).
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set
+
+import orjson
+import psycopg
+from psycopg import sql
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .access import AccessContext
+from .db import DATABASE_URL
+
+EVENTS_PG_NOTIFY = os.getenv("EVENTS_PG_NOTIFY", "0").lower() in ("1", "true", "yes")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "siamonitor_events")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))         # событий на подписчика
+EVENTS_PING_SECONDS = float(os.getenv("EVENTS_PING_SECONDS", "15"))    # комментарий-пинг для прокси
+# поток закрывается через столько секунд, клиент переподключается (перечитывание — по ETag, почти
+# всегда 304): uvicorn при остановке ждёт открытые соединения, и стрим не должен держать её вечно
+EVENTS_MAX_SECONDS = float(os.getenv("EVENTS_MAX_SECONDS", "300"))
+EVENTS_RETRY_MS = 3000                                                 # пауза переподключения клиента
+
+log = logging.getLogger(__name__)
+
+_PENDING = "pending_events"  # ключ в Session.info
+# типы событий: grade | files | milestone | member | reset (перечитать всё; поток после него закрывается)
+RESET = {"type": "reset", "project_id": None}
+
+
+class Subscriber:
+    def __init__(self, ctx: AccessContext):
+        self.ctx = ctx
+        self.joined: Set[int] = set()  # проекты, куда пользователя добавили уже после подписки
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(EVENTS_QUEUE_SIZE, 1))
+
+    def wants(self, ev: Dict[str, Any]) -> bool:
+        pid = ev.get("project_id")
+        if ev["type"] == "member" and ev.get("member_sub") == self.ctx.sub:
+            self.joined.add(pid)
+            return True
+        return pid is None or self.ctx.can_view(pid) or pid in self.joined
+
+    def offer(self, ev: Optional[Dict[str, Any]]) -> None:
+        try:
+            self.queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            # клиент не успевает читать — вместо хвоста событий один "перечитай всё"
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subs: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self, ctx: AccessContext) -> Subscriber:
+        s = Subscriber(ctx)
+        self._subs.add(s)
+        metrics.SSE_SUBSCRIBERS.inc()
+        return s
+
+    def unsubscribe(self, s: Subscriber) -> None:
+        if s in self._subs:
+            self._subs.discard(s)
+            metrics.SSE_SUBSCRIBERS.dec()
+
+    def fanout(self, ev: Dict[str, Any]) -> None:
+        """Раздать событие подписчикам; только из потока event loop."""
+        for s in list(self._subs):
+            if s.wants(ev):
+                s.offer(ev)
+
+    def publish(self, ev: Dict[str, Any]) -> None:
+        """Из любого потока (sync-маршруты работают в threadpool)."""
+        if self._loop is not None and self._subs:
+            self._loop.call_soon_threadsafe(self.fanout, ev)
+
+    def close_all(self) -> None:
+        # None — сигнал потоку завершиться (остальное закроет EVENTS_MAX_SECONDS)
+        for s in list(self._subs):
+            s.offer(None)
+
+
+broadcaster = Broadcaster()
+
+
+def emit(db: Session, type_: str, project_id: Optional[int] = None, **data: Any) -> None:
+    """Событие уйдёт подписчикам, только если транзакция db закоммитится."""
+    db.info.setdefault(_PENDING, []).append({"type": type_, "project_id": project_id, **data})
+
+
+@event.listens_for(Session, "before_commit")
+def _notify(session: Session) -> None:
+    if EVENTS_PG_NOTIFY and session.info.get(_PENDING):
+        # все события транзакции — одним запросом; NOTIFY доставляется при COMMIT
+        session.execute(text("SELECT pg_notify(:ch, p) FROM unnest(CAST(:ps AS text[])) AS p"),
+                        {"ch": EVENTS_CHANNEL, "ps": [orjson.dumps(ev).decode() for ev in session.info[_PENDING]]})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session: Session) -> None:
+    pending: List[Dict[str, Any]] = session.info.pop(_PENDING, [])
+    if not EVENTS_PG_NOTIFY:  # с мостом события вернутся через LISTEN — и этому воркеру тоже
+        for ev in pending:
+            broadcaster.publish(ev)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING, None)
+
+
+async def stream(ctx: AccessContext):
+    """Тело text/event-stream для одного подписчика."""
+    sub = broadcaster.subscribe(ctx)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + EVENTS_MAX_SECONDS
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n".encode()
+        while (left := deadline - loop.time()) > 0:
+            try:
+                ev = await asyncio.wait_for(sub.queue.get(), min(EVENTS_PING_SECONDS, left))
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if ev is None:
+                return
+            yield b"data: " + orjson.dumps(ev) + b"\n\n"
+            if ev["type"] == "reset":
+                return
+    finally:
+        broadcaster.unsubscribe(sub)
+
+
+# ───────────────────────── мост LISTEN/NOTIFY ─────────────────────────
+
+_listener: Optional[asyncio.Task] = None
+
+
+async def _listen() -> None:
+    conninfo = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    first = True
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(EVENTS_CHANNEL)))
+                if not first:
+                    broadcaster.fanout(RESET)  # пока соединения не было, события могли потеряться
+                first = False
+                async for n in conn.notifies():
+                    broadcaster.fanout(orjson.loads(n.payload))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("events LISTEN connection lost: %s", e)
+            await asyncio.sleep(5)
+
+
+async def start() -> None:
+    global _listener
+    broadcaster.bind(asyncio.get_running_loop())
+    if EVENTS_PG_NOTIFY:
+        _listener = asyncio.create_task(_listen())
+
+
+async def stop() -> None:
+    global _listener
+    broadcaster.close_all()
+    if _listener is not None:
+        _listener.cancel()
+        await asyncio.gather(_listener, return_exceptions=True)
+        _listener = None
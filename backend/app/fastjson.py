@@ -0,0 +1,44 @@
+# backend/app/fastjson.py
+"""
+Быстрая отдача больших списков (rating, with-state, projects, milestones).
+
+Обычный путь FastAPI: ORM-объект → Pydantic-модель → повторная проверка по
+response_model → jsonable_encoder → json.dumps. Здесь строки собираются прямо
+из кортежей SQL (dict на строку), один раз проверяются pydantic-core по
+TypedDict, выведенному из той же схемы ответа (без создания экземпляров
+моделей), и кодируются orjson. response_model у маршрутов остаётся прежним —
+OpenAPI не меняется, а готовый Response FastAPI отдаёт как есть.
+
+Сравнение путей: python -m bench.serialization
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+
+@lru_cache(maxsize=None)
+def _rows_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    # все ключи обязательны: строки собираются целиком, без опоры на значения по умолчанию
+    row = TypedDict(f"{model.__name__}Row", {name: f.annotation for name, f in model.model_fields.items()})
+    return TypeAdapter(List[row])
+
+
+def columns(model: Type[BaseModel], entity) -> list:
+    """Колонки entity в порядке полей схемы ответа — для select(*columns(ProjectOut, Project))."""
+    return [getattr(entity, name) for name in model.model_fields]
+
+
+def rows_response(model: Type[BaseModel], rows: List[Dict[str, Any]],
+                  response: Optional[Response] = None) -> ORJSONResponse:
+    """
+    Проверяет строки по схеме model и отдаёт их orjson'ом. Заголовки, выставленные
+    маршрутом в response (ETag, X-Next-Cursor, ...), переносятся в ответ: FastAPI
+    сам их не подмешивает, когда маршрут возвращает готовый Response.
+    """
+    data = _rows_adapter(model).validate_python(rows)
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"} if response is not None else None
+    return ORJSONResponse(data, headers=headers)
@@ -0,0 +1,262 @@
+# backend/app/github.py
+"""
+Клиент GitHub REST API для подсказки оценки по активности в репозитории.
+
+Один общий httpx-клиент (пул соединений, HTTP/2 если установлен h2),
+детали коммитов тянем параллельно под общим семафором, с таймаутами
+и повторами с джиттером.
+
+Статистика коммитов кэшируется в БД (github_commits): sync_repo() каждый раз
+заново листит окно от его начала — условным запросом (If-None-Match → 304, ETag
+свой у каждого окна), — но детали (additions/deletions) запрашивает только для
+незнакомых sha, а окно майлстоуна агрегируется SQL-запросом.
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import certifi
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import metrics
+from .models import GithubCommit, GithubRepoWindow
+
+try:  # HTTP/2 — опционально, нужен пакет h2 (httpx[http2])
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN") or None
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_CONCURRENCY = int(os.getenv("GITHUB_CONCURRENCY", "8"))   # одновременных запросов к GitHub на процесс
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "10"))         # сек на один запрос
+GITHUB_RETRIES = int(os.getenv("GITHUB_RETRIES", "3"))            # повторов после первой попытки
+GITHUB_BACKOFF = float(os.getenv("GITHUB_BACKOFF", "0.5"))        # база экспоненциальной паузы, сек
+
+GITHUB_MAX_PAGES = 5      # максимум ~500 коммитов смотрим (5*100) — достаточно для оценки
+GITHUB_PER_PAGE = 100
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _parse_repo(url: str) -> tuple[str, str] | None:
+    """Вернёт (owner, repo) из https://github.com/owner/repo(.git)? ..."""
+    if not url:
+        return None
+    m = re.search(r"github\.com[:/]+([^/]+)/([^/\s]+)", url)
+    if not m:
+        return None
+    owner, repo = m.group(1), m.group(2)
+    repo = repo[:-4] if repo.endswith(".git") else repo
+    return owner, repo
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        headers = {"Accept": "application/vnd.github+json"}
+        if GITHUB_TOKEN:
+            headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+        _client = httpx.AsyncClient(
+            base_url=GITHUB_API_URL,
+            headers=headers,
+            timeout=GITHUB_TIMEOUT,
+            verify=certifi.where(),
+            http2=_HTTP2,
+            limits=httpx.Limits(max_connections=max(GITHUB_CONCURRENCY, 1) * 2,
+                                max_keepalive_connections=max(GITHUB_CONCURRENCY, 1)),
+        )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(GITHUB_CONCURRENCY, 1))
+    return _semaphore
+
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(attempt: int, r: Optional[httpx.Response]) -> float:
+    # GitHub при вторичном лимите присылает Retry-After — уважаем его
+    if r is not None:
+        ra = r.headers.get("retry-after")
+        if ra and ra.isdigit():
+            return float(ra)
+    # full jitter: случайная пауза в [0, base * 2^attempt]
+    return random.uniform(0, GITHUB_BACKOFF * (2 ** attempt))
+
+
+def _should_retry(r: httpx.Response) -> bool:
+    if r.status_code == 429 or r.status_code >= 500:
+        return True
+    # 403 с исчерпанным лимитом — тоже временная ошибка
+    return r.status_code == 403 and (r.headers.get("retry-after") or r.headers.get("x-ratelimit-remaining") == "0")
+
+
+async def github_get(path: str, *, params: Optional[Dict[str, Any]] = None,
+                     headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """GET к API под общим семафором; сетевые ошибки, 5xx и 429 повторяем с джиттером."""
+    client = get_client()
+    attempt = 0
+    while True:
+        r: Optional[httpx.Response] = None
+        try:
+            async with _get_semaphore():
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(path, params=params, headers=headers)
+                finally:
+                    metrics.observe_github(str(r.status_code) if r is not None else "error",
+                                           time.perf_counter() - t0)
+            if not _should_retry(r) or attempt >= GITHUB_RETRIES:
+                return r
+        except (httpx.TransportError, httpx.TimeoutException):
+            if attempt >= GITHUB_RETRIES:
+                raise
+        await asyncio.sleep(_retry_delay(attempt, r))
+        attempt += 1
+
+
+async def _commit_stats(owner: str, repo: str, sha: str) -> tuple[int, int]:
+    """(additions, deletions) коммита; удалённый/недоступный коммит считаем пустым."""
+    r = await github_get(f"/repos/{owner}/{repo}/commits/{sha}")
+    if r.status_code == 404:
+        return 0, 0
+    r.raise_for_status()
+    stats = r.json().get("stats") or {}
+    return int(stats.get("additions") or 0), int(stats.get("deletions") or 0)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Кэш коммитов в БД и инкрементальная синхронизация
+# ─────────────────────────────────────────────────────────────────────────────
+def _utc_naive(dt: datetime) -> datetime:
+    """В БД время хранится в UTC без tz."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.replace(tzinfo=timezone.utc).isoformat()
+
+
+def _parse_listed(c: Dict[str, Any]) -> Optional[tuple[str, datetime, Optional[str]]]:
+    sha = c.get("sha")
+    if not sha:
+        return None
+    info = c.get("commit") or {}
+    committer = info.get("committer") or {}
+    author = info.get("author") or {}
+    # фильтр since/until у GitHub работает по дате коммита
+    raw = committer.get("date") or author.get("date")
+    if not raw:
+        return None
+    when = _utc_naive(datetime.fromisoformat(raw.replace("Z", "+00:00")))
+    login = (c.get("author") or {}).get("login")
+    return sha, when, (login or author.get("name"))
+
+
+async def sync_repo(db: AsyncSession, owner: str, repo: str, since: datetime) -> int:
+    """
+    Докачивает в github_commits коммиты окна, начинающегося в since (UTC без tz).
+    Листинг — всегда от начала окна, а не от high-water mark: since у GitHub
+    фильтрует по дате коммита, и ветка, влитая после прошлой синхронизации,
+    приносит коммиты с датами раньше неё. Листинг условный (ETag этого окна);
+    детали запрашиваются лишь для незнакомых sha. Возвращает число новых коммитов.
+    """
+    key = f"{owner}/{repo}".lower()
+    state = await db.get(GithubRepoWindow, (key, since))
+    etag = state.list_etag if state is not None else None
+
+    listed: list[tuple[str, datetime, Optional[str]]] = []
+    new_etag: Optional[str] = None
+    truncated = False
+    page = 1
+    while True:
+        r = await github_get(
+            f"/repos/{owner}/{repo}/commits",
+            params={"since": _iso(since), "per_page": GITHUB_PER_PAGE, "page": page},
+            headers={"If-None-Match": etag} if etag and page == 1 else None,
+        )
+        if r.status_code == 304:
+            return 0  # с прошлого раза ничего не появилось
+        if r.status_code == 422:
+            break  # invalid params / repo empty
+        r.raise_for_status()
+        if page == 1:
+            new_etag = r.headers.get("etag")
+        arr = r.json()
+        listed.extend(x for x in map(_parse_listed, arr) if x)
+        if len(arr) < GITHUB_PER_PAGE:
+            break
+        if page >= GITHUB_MAX_PAGES:
+            truncated = True  # старые коммиты окна не получены — window_stats сообщит об этом
+            break
+        page += 1
+
+    shas = [sha for sha, _, _ in listed]
+    known = set(await db.scalars(select(GithubCommit.sha)
+                                 .where(GithubCommit.repo == key, GithubCommit.sha.in_(shas)))) if shas else set()
+    fresh = [x for x in listed if x[0] not in known]
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(_commit_stats(owner, repo, sha)) for sha, _, _ in fresh]
+    except BaseExceptionGroup as eg:
+        raise eg.exceptions[0]
+
+    if fresh:
+        await db.execute(pg_insert(GithubCommit).values([
+            {"repo": key, "sha": sha, "committed_at": when, "author": (author or "")[:256] or None,
+             "additions": t.result()[0], "deletions": t.result()[1]}
+            for (sha, when, author), t in zip(fresh, tasks)
+        ]).on_conflict_do_nothing(index_elements=["repo", "sha"]))
+
+    values = {"truncated": truncated, "list_etag": new_etag}
+    await db.execute(pg_insert(GithubRepoWindow).values(repo=key, since=since, **values)
+                     .on_conflict_do_update(index_elements=["repo", "since"], set_=values))
+    await db.commit()
+    return len(fresh)
+
+
+async def window_stats(db: AsyncSession, owner: str, repo: str, since: datetime,
+                       until: datetime) -> tuple[int, int, bool]:
+    """
+    (commits, lines_changed, truncated) за окно по кэшу; как и раньше — не больше 500 самых
+    свежих коммитов. truncated — листинг окна упёрся в лимит страниц, числа неполные.
+    """
+    key = f"{owner}/{repo}".lower()
+    window = (select((GithubCommit.additions + GithubCommit.deletions).label("lines"))
+              .where(GithubCommit.repo == key,
+                     GithubCommit.committed_at >= since,
+                     GithubCommit.committed_at <= until)
+              .order_by(GithubCommit.committed_at.desc())
+              .limit(GITHUB_MAX_PAGES * GITHUB_PER_PAGE)
+              .subquery())
+    commits, lines = (await db.execute(select(func.count(), func.coalesce(func.sum(window.c.lines), 0))
+                                       .select_from(window))).one()
+    truncated = await db.scalar(select(GithubRepoWindow.truncated)
+                                .where(GithubRepoWindow.repo == key, GithubRepoWindow.since == since))
+    return int(commits), int(lines), bool(truncated)
+
+
+async def repo_activity(db: AsyncSession, owner: str, repo: str,
+                        since: datetime, until: datetime) -> tuple[int, int, bool]:
+    """Синхронизирует кэш и считает активность за окно [since, until]."""
+    since, until = _utc_naive(since), _utc_naive(until)
+    await sync_repo(db, owner, repo, since)
+    return await window_stats(db, owner, repo, since, until)
@@ -0,0 +1,267 @@
+# backend/app/jobs.py
+"""
+Фоновые задания «подсказать оценки всем проектам майлстоуна».
+
+Задание живёт в БД (suggest_jobs), выполняется пулом asyncio-воркеров внутри
+бэкенда и не зависит от HTTP-запроса, который его создал. Результаты по
+проектам сразу пишутся в grade_suggestions — их видно до окончания задания.
+Суммарная нагрузка на GitHub ограничена семафором в github.py.
+
+Очередь в памяти — только подсказка, какие задания проверить: при нескольких
+процессах бэкенда задание выполняет тот, кто захватил его атомарным UPDATE
+(queued → running, owner = токен захвата, lease_until). Пока задание идёт,
+воркер продлевает аренду; все записи по заданию проверяют owner, так что
+потерявший аренду воркер ничего не портит. Задания с
+истёкшей арендой (процесс упал) и неразобранные queued подбирает периодический
+обход в любом процессе.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, or_, select, update
+
+from .db import AsyncSessionLocal
+from .models import GradeSuggestion, Milestone, Project, SuggestJob
+from .suggest import SuggestError, save_suggestion, suggest_for_project
+
+SUGGEST_WORKERS = int(os.getenv("SUGGEST_WORKERS", "2"))                   # заданий одновременно
+SUGGEST_JOB_CONCURRENCY = int(os.getenv("SUGGEST_JOB_CONCURRENCY", "4"))   # проектов одновременно в задании
+SUGGEST_JOB_LEASE = float(os.getenv("SUGGEST_JOB_LEASE", "60"))            # сек аренды; продлевается каждую треть
+SUGGEST_JOB_SWEEP = float(os.getenv("SUGGEST_JOB_SWEEP", "30"))            # сек между обходами брошенных заданий
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+log = logging.getLogger(__name__)
+
+_queue: Optional[asyncio.Queue] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_queued: set[int] = set()        # уже лежат в локальной очереди — второй раз не кладём
+_running: dict[int, asyncio.Task] = {}
+_workers: list[asyncio.Task] = []
+
+
+class _LeaseLost(Exception):
+    """Задание больше не наше: удалено (wipe) или перехвачено после истечения аренды."""
+
+
+def _put(job_id: int) -> None:
+    if job_id not in _queued:
+        _queued.add(job_id)
+        _queue.put_nowait(job_id)
+
+
+def enqueue(job_id: int) -> None:
+    """Подсказать воркерам проверить задание; из любого потока (suggest_all — sync-маршрут)."""
+    if _queue is None or _loop is None:
+        raise RuntimeError("Job workers are not started")
+    _loop.call_soon_threadsafe(_put, job_id)
+
+
+def _cancel_running() -> None:
+    for t in list(_running.values()):
+        t.cancel()
+
+
+def cancel_running() -> None:
+    """
+    Прервать задания, которые сейчас выполняет этот процесс (wipe). Из любого потока.
+    Задания других процессов остановятся сами: их следующая запись не найдёт свой owner.
+    """
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_cancel_running)
+
+
+def _lease_until() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=SUGGEST_JOB_LEASE)
+
+
+def _claimable():
+    # queued — никем не взято; running с истёкшей арендой — владелец умер
+    # (NULL — задание, начатое до появления аренды)
+    return or_(SuggestJob.status == "queued",
+               (SuggestJob.status == "running")
+               & (SuggestJob.lease_until.is_(None) | (SuggestJob.lease_until < datetime.utcnow())))
+
+
+def _owned(job_id: int, token: str):
+    return (SuggestJob.id == job_id) & (SuggestJob.owner == token)
+
+
+async def _bump(job_id: int, token: str, **counters: int) -> None:
+    # атомарный инкремент счётчиков прогресса (только своего захвата) + продление аренды
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(SuggestJob).where(_owned(job_id, token))
+                         .values({**{getattr(SuggestJob, k): getattr(SuggestJob, k) + v for k, v in counters.items()},
+                                  SuggestJob.lease_until: _lease_until()}))
+        await db.commit()
+
+
+async def _suggest_one(job_id: int, token: str, milestone_id: int, project_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        p = await db.get(Project, project_id)
+        m = await db.get(Milestone, milestone_id)
+        if not p or not m:
+            return
+        out, error = None, None
+        try:
+            out = await suggest_for_project(db, p, m)
+        except SuggestError as e:
+            error = str(e)
+        except Exception as e:  # GitHub недоступен, репозиторий удалён и т.п.
+            await db.rollback()
+            error = f"{type(e).__name__}: {e}"
+        # задание всё ещё наше? FOR SHARE держит строку до commit — wipe (TRUNCATE) дождётся
+        if await db.scalar(select(SuggestJob.id).where(_owned(job_id, token)).with_for_update(read=True)) is None:
+            await db.rollback()
+            raise _LeaseLost()
+        await save_suggestion(db, project_id, milestone_id, out=out, error=error, job_id=job_id)
+        await db.commit()
+    await _bump(job_id, token, done=1, failed=1 if error else 0)
+
+
+async def _heartbeat(job_id: int, token: str) -> None:
+    """Продлевает аренду; возвращается, когда задание перестало быть нашим."""
+    while True:
+        await asyncio.sleep(SUGGEST_JOB_LEASE / 3)
+        async with AsyncSessionLocal() as db:
+            res = await db.execute(update(SuggestJob).where(_owned(job_id, token), SuggestJob.status == "running")
+                                   .values(lease_until=_lease_until()))
+            await db.commit()
+        if res.rowcount == 0:
+            return
+
+
+async def _release(job_id: int, token: str) -> None:
+    # остановка бэкенда: вернуть задание в очередь сразу, не дожидаясь конца аренды
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(SuggestJob).where(_owned(job_id, token), SuggestJob.status == "running")
+                         .values(status="queued", owner=None, lease_until=None))
+        await db.commit()
+
+
+async def _run_job(job_id: int) -> None:
+    token = f"{WORKER_ID[:50]}:{uuid.uuid4().hex[:12]}"
+    async with AsyncSessionLocal() as db:
+        milestone_id = await db.scalar(
+            update(SuggestJob).where(SuggestJob.id == job_id, _claimable())
+            .values(status="running", owner=token, lease_until=_lease_until())
+            .returning(SuggestJob.milestone_id))
+        if milestone_id is None:
+            return  # уже у другого воркера, завершено или удалено
+        project_ids = list(await db.scalars(select(Project.id).order_by(Project.id.asc())))
+        # после рестарта продолжаем с того места, где остановились
+        finished = set(await db.scalars(select(GradeSuggestion.project_id)
+                                        .where(GradeSuggestion.job_id == job_id)))
+        failed = await db.scalar(select(func.count())
+                                 .select_from(GradeSuggestion)
+                                 .where(GradeSuggestion.job_id == job_id, GradeSuggestion.error.isnot(None)))
+        await db.execute(update(SuggestJob).where(SuggestJob.id == job_id)
+                         .values(total=len(project_ids), done=len(finished), failed=failed))
+        await db.commit()
+
+    sem = asyncio.Semaphore(max(SUGGEST_JOB_CONCURRENCY, 1))
+
+    async def _bounded(pid: int) -> None:
+        async with sem:
+            await _suggest_one(job_id, token, milestone_id, pid)
+
+    async def _all() -> None:
+        # TaskGroup: первая ошибка (или потерянная аренда) отменяет остальные проекты и дожидается
+        # их — после выхода ни одна запись по заданию больше не идёт
+        async with asyncio.TaskGroup() as tg:
+            for pid in project_ids:
+                if pid not in finished:
+                    tg.create_task(_bounded(pid))
+
+    work = asyncio.create_task(_all())
+    lease = asyncio.create_task(_heartbeat(job_id, token))
+    try:
+        await asyncio.wait({work, lease}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # остановка бэкенда — задание вернётся в очередь и продолжится (здесь или в другом процессе);
+        # после wipe строки уже нет, и _release ничего не меняет
+        work.cancel()
+        lease.cancel()
+        await asyncio.gather(work, lease, return_exceptions=True)
+        await _release(job_id, token)
+        raise
+    finally:
+        lease.cancel()
+    exc = work.exception() if work.done() else None  # ExceptionGroup из TaskGroup
+    if not work.done() or (exc is not None and exc.subgroup(_LeaseLost) is not None):
+        # аренду потеряли (задание удалено wipe'ом или перехвачено) — дальше не считаем
+        work.cancel()
+        await asyncio.gather(work, return_exceptions=True)
+        log.warning("suggest job %s: lease lost, stopping", job_id)
+        return
+
+    status, error = "done", None
+    if exc is not None:
+        e = exc.exceptions[0]
+        log.error("suggest job %s failed", job_id, exc_info=e)
+        status, error = "failed", f"{type(e).__name__}: {e}"
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(SuggestJob).where(_owned(job_id, token))
+                         .values(status=status, error=error, finished_at=datetime.utcnow(), lease_until=None))
+        await db.commit()
+
+
+async def _worker() -> None:
+    assert _queue is not None
+    while True:
+        job_id = await _queue.get()
+        _queued.discard(job_id)
+        _running[job_id] = task = asyncio.create_task(_run_job(job_id))
+        try:
+            await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise  # остановили сам воркер
+            log.info("suggest job %s cancelled", job_id)  # cancel_running()
+        except Exception:
+            log.exception("suggest job %s crashed", job_id)
+        finally:
+            _running.pop(job_id, None)
+            _queue.task_done()
+
+
+async def _sweep() -> None:
+    """Ставит в локальную очередь неразобранные и брошенные задания (захват разрулит гонку)."""
+    async with AsyncSessionLocal() as db:
+        ids = list(await db.scalars(select(SuggestJob.id).where(_claimable()).order_by(SuggestJob.id.asc())))
+    for job_id in ids:
+        _put(job_id)
+
+
+async def _sweeper() -> None:
+    while True:
+        await asyncio.sleep(SUGGEST_JOB_SWEEP)
+        try:
+            await _sweep()
+        except Exception:
+            log.exception("suggest jobs sweep failed")
+
+
+async def start() -> None:
+    """Поднимает воркеры и возвращает в очередь задания, прерванные рестартом."""
+    global _queue, _loop
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue()
+    for _ in range(max(SUGGEST_WORKERS, 1)):
+        _workers.append(asyncio.create_task(_worker()))
+    _workers.append(asyncio.create_task(_sweeper()))
+    await _sweep()
+
+
+async def stop() -> None:
+    for t in _workers:
+        t.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queued.clear()
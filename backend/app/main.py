@@ -1,19 +1,69 @@
-from fastapi import FastAPI, Depends
-from .db import Base, engine
+import os
+import threading
+from typing import Optional
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
+from .db import Base, engine, async_engine, SessionLocal
 from . import models  # важно, чтобы таблицы зарегистрировались
+from . import auth
+from .auth import jwks_manager
+from . import events, github, jobs, metrics, routes, sqlstats, versions, wipe
+from .rating import ensure_ratings
 from .deps import get_current_user, require_teacher, require_student  # если нужно в /api/me
 from .routes import router as api_router
 
 app = FastAPI(title="SIAMonitor API")
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(sqlstats.QueryStatsMiddleware)  # снаружи метрик: они читают его счётчики
+sqlstats.instrument_engine(engine)
+sqlstats.instrument_engine(async_engine.sync_engine)
+
+# /api/metrics: "Authorization: Bearer <METRICS_TOKEN>" для Prometheus; без токена в окружении —
+# только токен преподавателя (nginx отдаёт /api/ наружу, открытыми метрики не бывают)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
 
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for ddl in models.SCHEMA_PATCHES:
+            conn.exec_driver_sql(ddl)
+    # проекты, созданные до появления project_ratings, получают строку агрегата
+    with SessionLocal() as db:
+        ensure_ratings(db)
+        versions.ensure(db)
+
+@app.on_event("startup")
+def purge_upload_trash():
+    # остатки корзины прерванного wipe удаляем в фоне — старт их не ждёт
+    threading.Thread(target=wipe.purge_trash, args=(routes.UPLOAD_ROOT,), daemon=True).start()
+
+@app.on_event("startup")
+async def start_jobs():
+    await jobs.start()
+    await events.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await events.stop()
+    await jobs.stop()
+    await jwks_manager.aclose()
+    await github.aclose()
+    await async_engine.dispose()
 
 @app.get("/api/health")
 def health():
     return {"status": "ok", "service": "backend"}
 
+@app.get("/api/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN:
+        if authorization != f"Bearer {METRICS_TOKEN}":
+            raise HTTPException(401, "Metrics token required")
+    else:
+        await auth.require_teacher(await auth.get_current_user(authorization))
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
 @app.get("/api/me")
 async def me(user = Depends(get_current_user)):
     return {
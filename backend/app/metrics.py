@@ -0,0 +1,155 @@
+# backend/app/metrics.py
+"""
+Метрики в формате Prometheus (GET /api/metrics).
+
+* HTTP: число запросов и гистограмма латентности по шаблону маршрута и статусу,
+  запросы в полёте — ASGI-middleware, метка маршрута берётся из scope["route"]
+  после роутинга (шаблон "/api/projects/{project_id}", а не конкретный путь).
+* БД: число SQL-запросов и время в БД на запрос (счётчики — sqlstats.py).
+* GitHub API: вызовы по статусу и латентность (github.github_get).
+* Загрузки: байты и длительность по виду файла.
+* Кэши JWT (claims, JWKS) и пулы БД — считываются только в момент scrape,
+  на горячем пути их не трогаем.
+"""
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram,
+                               disable_created_metrics, generate_latest)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from . import sqlstats
+
+disable_created_metrics()  # *_created на каждую серию нам не нужны — вдвое меньше вывода
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UNMATCHED_ROUTE = "<unmatched>"  # 404 и т.п. — не плодим серии по сырым путям
+
+HTTP_REQUESTS = Counter("siam_http_requests_total", "HTTP requests",
+                        ["method", "route", "status"])
+HTTP_LATENCY = Histogram("siam_http_request_duration_seconds", "HTTP request latency (until the body is sent)",
+                         ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("siam_http_requests_in_flight", "HTTP requests being processed")
+
+DB_QUERIES_PER_REQUEST = Histogram("siam_db_queries_per_request", "SQL statements per HTTP request",
+                                   ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100))
+DB_TIME_PER_REQUEST = Histogram("siam_db_time_per_request_seconds", "Time spent in SQL per HTTP request",
+                                ["route"], buckets=LATENCY_BUCKETS)
+DB_STATEMENTS = Counter("siam_db_statements_total", "SQL statements executed")
+DB_STATEMENT_SECONDS = Counter("siam_db_statement_seconds_total", "Time spent executing SQL statements")
+
+GITHUB_REQUESTS = Counter("siam_github_requests_total", "GitHub API requests (each retry counts)", ["status"])
+GITHUB_LATENCY = Histogram("siam_github_request_duration_seconds", "GitHub API request latency",
+                           buckets=LATENCY_BUCKETS)
+
+UPLOAD_BYTES = Counter("siam_upload_bytes_total", "Bytes stored from uploads", ["kind"])
+UPLOAD_DURATION = Histogram("siam_upload_duration_seconds", "Time to receive and store an uploaded file",
+                            ["kind"], buckets=LATENCY_BUCKETS)
+
+SSE_SUBSCRIBERS = Gauge("siam_sse_subscribers", "Open /api/events streams")
+
+def _observe_statement(seconds: float) -> None:
+    DB_STATEMENTS.inc()
+    DB_STATEMENT_SECONDS.inc(seconds)
+
+
+sqlstats.on_statement(_observe_statement)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# GitHub / загрузки
+# ─────────────────────────────────────────────────────────────────────────────
+def observe_github(status: str, seconds: float) -> None:
+    GITHUB_REQUESTS.labels(status).inc()
+    GITHUB_LATENCY.observe(seconds)
+
+
+def observe_upload(kind: str, size: int, seconds: float) -> None:
+    UPLOAD_BYTES.labels(kind).inc(size)
+    UPLOAD_DURATION.labels(kind).observe(seconds)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# HTTP
+# ─────────────────────────────────────────────────────────────────────────────
+class MetricsMiddleware:
+    """Чистое ASGI-middleware: без BaseHTTPMiddleware и лишних копий тела ответа."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            code = str(status)
+            HTTP_REQUESTS.labels(method, route, code).inc()
+            HTTP_LATENCY.labels(method, route, code).observe(elapsed)
+            stats = sqlstats.current()  # заводит QueryStatsMiddleware снаружи
+            if stats is not None:
+                DB_QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+                DB_TIME_PER_REQUEST.labels(route).observe(stats.seconds)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Состояние кэшей и пулов — на момент scrape
+# ─────────────────────────────────────────────────────────────────────────────
+class _StateCollector:
+    def describe(self):
+        return []  # иначе registry вызовет collect() прямо при регистрации (на импорте)
+
+    def collect(self):
+        from .auth import claims_cache_stats, jwks_manager
+        from .db import pool_stats
+
+        claims = claims_cache_stats()
+        yield CounterMetricFamily("siam_claims_cache_hits", "Verified-claims cache hits", value=claims["hits"])
+        yield CounterMetricFamily("siam_claims_cache_misses", "Verified-claims cache misses", value=claims["misses"])
+        yield GaugeMetricFamily("siam_claims_cache_hit_ratio", "Verified-claims cache hit ratio",
+                                value=claims["hit_ratio"] or 0.0)
+        yield GaugeMetricFamily("siam_claims_cache_size", "Verified-claims cache entries", value=claims["size"])
+
+        kid_total = jwks_manager.kid_hits + jwks_manager.kid_misses
+        yield CounterMetricFamily("siam_jwks_kid_hits", "JWT kid found in loaded JWKS", value=jwks_manager.kid_hits)
+        yield CounterMetricFamily("siam_jwks_kid_misses", "JWT kid missing from loaded JWKS",
+                                  value=jwks_manager.kid_misses)
+        yield GaugeMetricFamily("siam_jwks_hit_ratio", "JWKS kid lookup hit ratio",
+                                value=(jwks_manager.kid_hits / kid_total) if kid_total else 0.0)
+        yield CounterMetricFamily("siam_jwks_fetches", "JWKS fetches from Keycloak", value=jwks_manager.fetches)
+        yield CounterMetricFamily("siam_jwks_fetch_failures", "Failed JWKS fetches", value=jwks_manager.failures)
+
+        pools = pool_stats()
+        checked_out = GaugeMetricFamily("siam_db_pool_checked_out", "Connections in use", labels=["engine"])
+        overflow = GaugeMetricFamily("siam_db_pool_overflow", "Overflow connections", labels=["engine"])
+        waits = CounterMetricFamily("siam_db_pool_waits", "Checkouts that waited on an exhausted pool",
+                                    labels=["engine"])
+        timeouts = CounterMetricFamily("siam_db_pool_timeouts", "Checkouts that timed out", labels=["engine"])
+        for name in ("sync", "async"):
+            p = pools[name]
+            checked_out.add_metric([name], p["checked_out"])
+            overflow.add_metric([name], max(p["overflow"], 0))
+            waits.add_metric([name], p["waits"])
+            timeouts.add_metric([name], p["timeouts"])
+        yield from (checked_out, overflow, waits, timeouts)
+
+
+REGISTRY.register(_StateCollector())
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
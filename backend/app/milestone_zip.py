@@ -0,0 +1,141 @@
+# backend/app/milestone_zip.py
+"""Все сдачи майлстоуна одним ZIP, потоком (GET /api/milestones/{id}/files.zip, или по подписанной ссылке)."""
+import csv
+import hashlib
+import hmac
+import io
+import os
+import re
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from .db import DATABASE_URL, SessionLocal
+from .models import Project, ProjectMilestoneGrade
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+STORED_SUFFIXES = frozenset({
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".key",
+    ".zip", ".7z", ".rar", ".gz", ".bz2", ".xz",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4", ".mov", ".webm",
+})
+ZIP_LINK_TTL = int(os.getenv("ZIP_LINK_TTL", "60"))  # сек жизни ссылки — только чтобы начать скачивание
+# Ключ подписи должен быть общим у всех процессов бэкенда; без DOWNLOAD_LINK_SECRET
+# выводится из DATABASE_URL (в нём пароль БД — снаружи его не знают)
+_LINK_KEY = hashlib.sha256(b"siamonitor-download-link\0"
+                           + (os.getenv("DOWNLOAD_LINK_SECRET") or DATABASE_URL).encode()).digest()
+GRADES_CSV_FIELDS = ("project_id", "project_name", "grade", "graded_by_sub", "graded_at",
+                     "presentation", "report")
+
+
+def _link_sig(milestone_id: int, expires: int) -> str:
+    return hmac.new(_LINK_KEY, f"milestone-zip:{milestone_id}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def sign_link(milestone_id: int) -> Tuple[str, int]:
+    """Токен ссылки на архив майлстоуна и момент, до которого она действует (unix time)."""
+    expires = int(time.time()) + ZIP_LINK_TTL
+    return f"{expires}.{_link_sig(milestone_id, expires)}", expires
+
+
+def verify_link(milestone_id: int, token: str) -> bool:
+    expires, _, sig = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sig, _link_sig(milestone_id, int(expires)))
+
+
+class _Sink:
+    """Приёмник для zipfile без seek/tell: копит записанное до следующего drain()."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data) -> int:
+        self._buf += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+def _folder(project_id: int, name: Optional[str]) -> str:
+    # имя каталога команды в архиве: id для сортировки + читаемое название без спецсимволов
+    safe = re.sub(r"[^\w.-]+", "_", name or "").strip("._")[:60]
+    return f"{project_id:03d}_{safe}" if safe else f"{project_id:03d}"
+
+
+def _rows(milestone_id: int) -> List[Tuple]:
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(Project.id, Project.name, ProjectMilestoneGrade.grade, ProjectMilestoneGrade.graded_by_sub,
+                   ProjectMilestoneGrade.graded_at, ProjectMilestoneGrade.presentation_path,
+                   ProjectMilestoneGrade.report_path)
+              .outerjoin(ProjectMilestoneGrade,
+                         (ProjectMilestoneGrade.project_id == Project.id)
+                         & (ProjectMilestoneGrade.milestone_id == milestone_id))
+              .order_by(Project.id.asc())
+        ).all()
+    finally:
+        db.close()  # соединение не держим, пока клиент качает архив
+
+
+def _grades_csv(rows: List[Tuple], names: dict) -> bytes:
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(GRADES_CSV_FIELDS)
+    for pid, pname, grade, graded_by, graded_at, pres, rep in rows:
+        w.writerow([pid, pname, "" if grade is None else grade, graded_by or "",
+                    graded_at.isoformat() if graded_at else "", names.get(pres, ""), names.get(rep, "")])
+    return ("\ufeff" + out.getvalue()).encode("utf-8")  # BOM — чтобы Excel понял кириллицу
+
+
+def stream_zip(root: Path, milestone_id: int, with_grades: bool = True) -> Iterator[bytes]:
+    """Архив файлов майлстоуна кусками; файлы, пропавшие с диска, перечислены в missing.txt."""
+    for chunk in _zip_chunks(root, milestone_id, with_grades):
+        if chunk:  # пустые куски не отправляем
+            yield chunk
+
+
+def _zip_chunks(root: Path, milestone_id: int, with_grades: bool) -> Iterator[bytes]:
+    rows = _rows(milestone_id)
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        files: List[Tuple[str, Path]] = []
+        names = {}  # путь в uploads -> путь в архиве (для grades.csv)
+        for pid, pname, *_, pres, rep in rows:
+            for rel in (pres, rep):
+                if rel:
+                    names[rel] = f"{_folder(pid, pname)}/{Path(rel).name}"
+                    files.append((names[rel], root / rel))
+
+        if with_grades:
+            zf.writestr("grades.csv", _grades_csv(rows, names))
+            yield sink.drain()
+
+        missing = []
+        for arcname, fp in files:
+            try:
+                info = zipfile.ZipInfo.from_file(fp, arcname)
+                src = open(fp, "rb")
+            except FileNotFoundError:
+                missing.append(arcname)
+                continue
+            info.compress_type = zipfile.ZIP_STORED if fp.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            with src, zf.open(info, "w") as dst:
+                while chunk := src.read(ZIP_CHUNK_SIZE):
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+        if missing:
+            zf.writestr("missing.txt", "\n".join(missing) + "\n")
+    yield sink.drain()
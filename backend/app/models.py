@@ -1,4 +1,4 @@
-from sqlalchemy import String, Text, Integer, DateTime, ForeignKey, func, UniqueConstraint
+from sqlalchemy import String, Text, Integer, BigInteger, Float, JSON, Boolean, DateTime, ForeignKey, Index, func, text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
 
@@ -12,7 +12,7 @@ class UserProfile(Base):
     # ЛК по ТЗ
     mode: Mapped[str] = mapped_column(String(16), default="participant") # participant|lead
     full_name: Mapped[str | None] = mapped_column(String(256))
-    group_no: Mapped[str | None] = mapped_column(String(64))
+    group_no: Mapped[str | None] = mapped_column(String(64), index=True)  # фильтр списков по группе
     email_corp: Mapped[str | None] = mapped_column(String(256))
     tg: Mapped[str | None] = mapped_column(String(64))
     avatar_path: Mapped[str | None] = mapped_column(String(512))
@@ -63,8 +63,166 @@ class ProjectMilestoneGrade(Base):
     grade: Mapped[int | None] = mapped_column(Integer)  # 0..5
     presentation_path: Mapped[str | None] = mapped_column(String(512))
     report_path: Mapped[str | None] = mapped_column(String(512))
+    presentation_sha256: Mapped[str | None] = mapped_column(String(64))  # hex, считается при загрузке
+    report_sha256: Mapped[str | None] = mapped_column(String(64))
     graded_by_sub: Mapped[str | None] = mapped_column(String(64))
-    graded_at: Mapped["DateTime"] = mapped_column(DateTime)
+    graded_at: Mapped["DateTime"] = mapped_column(DateTime, nullable=True)  # NULL — файлы есть, оценки ещё нет
 
     project: Mapped["Project"] = relationship(back_populates="grades")
 
+    __table_args__ = (
+        # одна строка на пару — на нём держится upsert в set_grade / bulk_grades
+        UniqueConstraint("project_id", "milestone_id", name="uq_grade_project_milestone"),
+    )
+
+
+# --- Колонки, добавленные в уже существующие таблицы ---
+# create_all создаёт только недостающие таблицы, поэтому новые колонки
+# докатываем на старте идемпотентным DDL (см. main.on_startup).
+SCHEMA_PATCHES = [
+    "ALTER TABLE project_milestone_grades ADD COLUMN IF NOT EXISTS presentation_sha256 VARCHAR(64)",
+    "ALTER TABLE project_milestone_grades ADD COLUMN IF NOT EXISTS report_sha256 VARCHAR(64)",
+    "ALTER TABLE project_milestone_grades ALTER COLUMN graded_at DROP NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_user_profiles_group_no ON user_profiles (group_no)",
+    # состояние синхронизации теперь по окнам (github_repo_windows)
+    "DROP TABLE IF EXISTS github_repo_sync",
+    "ALTER TABLE suggest_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR(64)",
+    "ALTER TABLE suggest_jobs ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP WITHOUT TIME ZONE",
+    # Одно активное задание на майлстоун; лишние активные (гонка двух suggest_all) закрываем
+    """
+    DO $$
+    BEGIN
+      IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_suggest_jobs_active') THEN
+        LOCK TABLE suggest_jobs IN SHARE ROW EXCLUSIVE MODE;
+        UPDATE suggest_jobs a SET status = 'failed', error = 'Superseded by job ' || b.id,
+                                  owner = NULL, lease_until = NULL, finished_at = now()
+          FROM suggest_jobs b
+          WHERE a.milestone_id = b.milestone_id AND a.id < b.id
+            AND a.status IN ('queued', 'running') AND b.status IN ('queued', 'running');
+        CREATE UNIQUE INDEX uq_suggest_jobs_active ON suggest_jobs (milestone_id)
+          WHERE status IN ('queued', 'running');
+      END IF;
+    END $$
+    """,
+    # Уникальность (project_id, milestone_id) для старых баз. До неё гонка set_grade/upload_files
+    # могла оставить дубли: сводим их в самую свежую строку (пустые поля — из остальных),
+    # остальные удаляем, агрегат рейтинга этих проектов сбрасываем — его достроит ensure_ratings.
+    """
+    DO $$
+    BEGIN
+      IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_grade_project_milestone') THEN
+        LOCK TABLE project_milestone_grades IN SHARE ROW EXCLUSIVE MODE;
+        UPDATE project_milestone_grades g SET
+          grade = d.grade, graded_by_sub = d.graded_by_sub, graded_at = d.graded_at,
+          presentation_path = COALESCE(g.presentation_path, d.presentation_path),
+          presentation_sha256 = COALESCE(g.presentation_sha256, d.presentation_sha256),
+          report_path = COALESCE(g.report_path, d.report_path),
+          report_sha256 = COALESCE(g.report_sha256, d.report_sha256)
+        FROM (
+          SELECT max(id) AS keep_id,
+                 (array_agg(grade ORDER BY graded_at DESC NULLS LAST, id DESC))[1] AS grade,
+                 (array_agg(graded_by_sub ORDER BY graded_at DESC NULLS LAST, id DESC))[1] AS graded_by_sub,
+                 max(graded_at) AS graded_at,
+                 (array_agg(presentation_path ORDER BY id DESC) FILTER (WHERE presentation_path IS NOT NULL))[1] AS presentation_path,
+                 (array_agg(presentation_sha256 ORDER BY id DESC) FILTER (WHERE presentation_path IS NOT NULL))[1] AS presentation_sha256,
+                 (array_agg(report_path ORDER BY id DESC) FILTER (WHERE report_path IS NOT NULL))[1] AS report_path,
+                 (array_agg(report_sha256 ORDER BY id DESC) FILTER (WHERE report_path IS NOT NULL))[1] AS report_sha256
+          FROM project_milestone_grades
+          GROUP BY project_id, milestone_id HAVING count(*) > 1
+        ) d
+        WHERE g.id = d.keep_id;
+        DELETE FROM project_ratings WHERE project_id IN (
+          SELECT project_id FROM project_milestone_grades
+          GROUP BY project_id, milestone_id HAVING count(*) > 1);
+        DELETE FROM project_milestone_grades a USING project_milestone_grades b
+          WHERE a.project_id = b.project_id AND a.milestone_id = b.milestone_id AND a.id < b.id;
+        CREATE UNIQUE INDEX uq_grade_project_milestone ON project_milestone_grades (project_id, milestone_id);
+      END IF;
+    END $$
+    """,
+]
+
+# --- Агрегат рейтинга по проекту (поддерживается роутами, см. rating.py) ---
+class ProjectRating(Base):
+    __tablename__ = "project_ratings"
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    grade_count: Mapped[int] = mapped_column(Integer, default=0)
+    grade_sum: Mapped[int] = mapped_column(Integer, default=0)
+    avg_grade: Mapped[float | None] = mapped_column(Float)
+    team_size: Mapped[int] = mapped_column(Integer, default=0)
+    grades: Mapped[list[int]] = mapped_column(JSON, default=list)  # оценки в порядке выставления
+    updated_at: Mapped["DateTime"] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+# порядок выдачи /api/rating: средняя по убыванию (без оценок — в конце), затем id
+Index("ix_project_ratings_rank", ProjectRating.avg_grade.desc().nulls_last(), ProjectRating.project_id)
+
+# --- Кэш статистики коммитов GitHub (additions/deletions у коммита не меняются) ---
+class GithubCommit(Base):
+    __tablename__ = "github_commits"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    repo: Mapped[str] = mapped_column(String(256))           # "owner/repo" в нижнем регистре
+    sha: Mapped[str] = mapped_column(String(64))
+    committed_at: Mapped["DateTime"] = mapped_column(DateTime)  # UTC, без tz
+    author: Mapped[str | None] = mapped_column(String(256))
+    additions: Mapped[int] = mapped_column(Integer, default=0)
+    deletions: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("repo", "sha", name="uq_github_commit"),
+        Index("ix_github_commits_repo_time", "repo", "committed_at"),
+    )
+
+# --- Состояние листинга коммитов репозитория для окна, начинающегося в since ---
+class GithubRepoWindow(Base):
+    __tablename__ = "github_repo_windows"
+    repo: Mapped[str] = mapped_column(String(256), primary_key=True)   # "owner/repo" в нижнем регистре
+    since: Mapped["DateTime"] = mapped_column(DateTime, primary_key=True)  # начало окна (UTC, без tz)
+    truncated: Mapped[bool] = mapped_column(Boolean, default=False)    # упёрлись в GITHUB_MAX_PAGES
+    list_etag: Mapped[str | None] = mapped_column(String(256))         # ETag первой страницы листинга
+    updated_at: Mapped["DateTime"] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+# --- Пакетный расчёт подсказок по всем проектам майлстоуна (см. jobs.py) ---
+class SuggestJob(Base):
+    __tablename__ = "suggest_jobs"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    milestone_id: Mapped[int] = mapped_column(ForeignKey("milestones.id", ondelete="CASCADE"), index=True)
+    status: Mapped[str] = mapped_column(String(16), default="queued")  # queued|running|done|failed
+    owner: Mapped[str | None] = mapped_column(String(64))                # токен воркера, захватившего задание
+    lease_until: Mapped["DateTime"] = mapped_column(DateTime, nullable=True)  # до какого момента захват действует
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    done: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str | None] = mapped_column(Text)
+    created_by_sub: Mapped[str | None] = mapped_column(String(64))
+    created_at: Mapped["DateTime"] = mapped_column(DateTime, server_default=func.now())
+    finished_at: Mapped["DateTime"] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # не больше одного активного задания на майлстоун (suggest_all: ON CONFLICT DO NOTHING)
+        Index("uq_suggest_jobs_active", "milestone_id", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+# --- Последняя подсказка оценки для пары проект/майлстоун ---
+class GradeSuggestion(Base):
+    __tablename__ = "grade_suggestions"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), index=True)
+    milestone_id: Mapped[int] = mapped_column(ForeignKey("milestones.id", ondelete="CASCADE"), index=True)
+    job_id: Mapped[int | None] = mapped_column(ForeignKey("suggest_jobs.id", ondelete="SET NULL"), index=True)
+    score: Mapped[int | None] = mapped_column(Integer)
+    commits: Mapped[int | None] = mapped_column(Integer)
+    lines_changed: Mapped[int | None] = mapped_column(Integer)
+    details: Mapped[str | None] = mapped_column(Text)
+    error: Mapped[str | None] = mapped_column(Text)  # почему не посчитали (нет repo_url, GitHub упал и т.п.)
+    computed_at: Mapped["DateTime"] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("project_id", "milestone_id", name="uq_suggestion_project_milestone"),
+    )
+
+# --- Версии классов данных для ETag / 304 (см. versions.py) ---
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    resource: Mapped[str] = mapped_column(String(32), primary_key=True)  # milestones|projects|grades|profiles
+    version: Mapped[int] = mapped_column(BigInteger)
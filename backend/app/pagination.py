@@ -0,0 +1,66 @@
+# backend/app/pagination.py
+"""
+Keyset-пагинация списков (?limit=&cursor=).
+
+Без limit эндпоинт отдаёт весь список, как раньше (старые клиенты ничего не
+замечают). С limit — не больше limit строк и заголовок X-Next-Cursor, если
+дальше есть ещё; его значение передаётся обратно как ?cursor=. Курсор —
+непрозрачная строка (base64 от ключа сортировки последней строки), страница
+выбирается условием по ключу (WHERE id < :last ... LIMIT n + 1), без OFFSET:
+цена страницы не растёт с номером.
+"""
+import base64
+import json
+import os
+from typing import Any, Callable, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response
+
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(key, list):
+        raise HTTPException(400, "Invalid cursor")
+    return key
+
+
+class Page:
+    """Зависимость маршрута: Depends(Page)."""
+
+    def __init__(self,
+                 limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Page size; omit for the full list"),
+                 cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page")):
+        self.limit = limit
+        self.cursor = decode_cursor(cursor) if cursor else None
+
+    def after(self, *types: type) -> Optional[List[Any]]:
+        """Ключ из курсора, проверенный по типам (None в ключе допустим — NULLS LAST)."""
+        if self.cursor is None:
+            return None
+        if len(self.cursor) != len(types) or not all(
+                v is None or (isinstance(v, t) and not isinstance(v, bool)) or (t is float and isinstance(v, int))
+                for v, t in zip(self.cursor, types)):
+            raise HTTPException(400, "Invalid cursor")
+        return self.cursor
+
+    def apply(self, stmt):
+        """LIMIT n + 1 — лишняя строка говорит, что есть следующая страница."""
+        return stmt.limit(self.limit + 1) if self.limit else stmt
+
+    def finish(self, rows: Sequence[Any], response: Response, key: Callable[[Any], Sequence[Any]]) -> List[Any]:
+        rows = list(rows)
+        if self.limit and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(rows[-1]))
+        return rows
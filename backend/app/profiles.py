@@ -0,0 +1,74 @@
+# backend/app/profiles.py
+"""Синхронизация профиля (ЛК) с токеном Keycloak: запись — только если поля из токена отличаются."""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .models import UserProfile
+
+PROFILE_SYNC_CACHE_SIZE = int(os.getenv("PROFILE_SYNC_CACHE_SIZE", "10000"))
+PROFILE_SYNC_CACHE_TTL = float(os.getenv("PROFILE_SYNC_CACHE_TTL", "3600"))
+
+# sub -> iat токена, с которым профиль последний раз сверяли
+_synced: TTLCache = TTLCache(maxsize=max(PROFILE_SYNC_CACHE_SIZE, 1), ttl=PROFILE_SYNC_CACHE_TTL)
+# mark_synced/forget зовут sync-маршруты из threadpool, recently_synced — event loop
+_lock = threading.Lock()
+
+
+def token_fields(user: Dict[str, Any]) -> Dict[str, str]:
+    """Поля профиля, которые диктует токен; пустые значения профиль не затирают."""
+    given = (user.get("given_name") or "").strip()
+    family = (user.get("family_name") or "").strip()
+    fields = {
+        "full_name": (given + " " + family).strip() or None,
+        "email": (user.get("email") or "").strip() or None,
+        "username": user.get("preferred_username") or None,
+    }
+    # Помечаем преподавателей явным mode='teacher' (для фронта)
+    if "teacher" in (user.get("realm_access", {}).get("roles", []) or []):
+        fields["mode"] = "teacher"
+    return {k: v for k, v in fields.items() if v}
+
+
+def in_sync(prof: Optional[UserProfile], fields: Dict[str, str]) -> bool:
+    return prof is not None and all(getattr(prof, k) == v for k, v in fields.items())
+
+
+def upsert_stmt(sub: str, fields: Dict[str, str]):
+    """INSERT профиля или UPDATE только отличающихся полей; при совпадении строка не трогается."""
+    stmt = pg_insert(UserProfile).values(sub=sub, **fields)
+    if not fields:
+        return stmt.on_conflict_do_nothing(index_elements=["sub"])
+    table = UserProfile.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=["sub"],
+        set_={k: stmt.excluded[k] for k in fields},
+        where=or_(*(table.c[k].is_distinct_from(stmt.excluded[k]) for k in fields)),
+    )
+
+
+def recently_synced(user: Dict[str, Any]) -> bool:
+    iat = user.get("iat")
+    if iat is None:
+        return False
+    with _lock:
+        return _synced.get(user.get("sub")) == iat
+
+
+def mark_synced(user: Dict[str, Any]) -> None:
+    if user.get("iat") is not None and user.get("sub"):
+        with _lock:
+            _synced[user["sub"]] = user["iat"]
+
+
+def forget(sub: Optional[str] = None) -> None:
+    """Сбросить отметку о синхронизации (профиль удалён/переписан в обход upsert)."""
+    with _lock:
+        if sub is None:
+            _synced.clear()
+        else:
+            _synced.pop(sub, None)
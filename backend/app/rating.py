@@ -0,0 +1,157 @@
+# backend/app/rating.py
+"""
+Агрегат рейтинга команд (таблица project_ratings).
+
+Роуты, меняющие оценки или состав команд, вызывают refresh_ratings() в своей
+транзакции — тогда /api/rating читает готовые строки одним упорядоченным запросом.
+
+Пересборка и сверка с «честным» пересчётом:
+    python -m app.rating rebuild
+    python -m app.rating check
+"""
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import Project, ProjectMilestoneGrade, ProjectRating, TeamMember
+
+
+def compute_ratings(db: Session, project_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, Any]]:
+    """Считает рейтинг с нуля по исходным таблицам (как раньше делал /api/rating)."""
+    ids = None if project_ids is None else list(set(project_ids))
+    if ids is not None and not ids:
+        return {}
+
+    q_projects = db.query(Project.id)
+    q_team = db.query(TeamMember.project_id, func.count(TeamMember.id)).group_by(TeamMember.project_id)
+    q_grades = (db.query(ProjectMilestoneGrade.project_id, ProjectMilestoneGrade.grade)
+                  .filter(ProjectMilestoneGrade.grade.isnot(None))
+                  .order_by(ProjectMilestoneGrade.id.asc()))
+    if ids is not None:
+        q_projects = q_projects.filter(Project.id.in_(ids))
+        q_team = q_team.filter(TeamMember.project_id.in_(ids))
+        q_grades = q_grades.filter(ProjectMilestoneGrade.project_id.in_(ids))
+
+    team_sizes = dict(q_team.all())
+    grades_by_proj: Dict[int, List[int]] = {}
+    for pid, g in q_grades.all():
+        grades_by_proj.setdefault(pid, []).append(int(g))
+
+    out: Dict[int, Dict[str, Any]] = {}
+    for (pid,) in q_projects.all():
+        gs = grades_by_proj.get(pid, [])
+        out[pid] = {
+            "grade_count": len(gs),
+            "grade_sum": sum(gs),
+            "avg_grade": (sum(gs) / len(gs)) if gs else None,
+            "team_size": int(team_sizes.get(pid, 0)),
+            "grades": gs,
+        }
+    return out
+
+
+def refresh_ratings(db: Session, project_ids: Iterable[int]) -> None:
+    """
+    Пересчитывает строки агрегата для указанных проектов. Commit не делает —
+    изменения уходят вместе с транзакцией вызывающего роута.
+    """
+    ids = sorted(set(project_ids))
+    if not ids:
+        return
+    db.flush()  # autoflush выключен — пересчёт должен видеть изменения роута
+    # Блокируем строки агрегата: параллельные set_grade по одному проекту
+    # не перетрут друг другу результат пересчёта.
+    existing = {
+        r.project_id: r
+        for r in (db.query(ProjectRating)
+                    .filter(ProjectRating.project_id.in_(ids))
+                    .with_for_update()
+                    .all())
+    }
+    computed = compute_ratings(db, ids)
+    for pid in ids:
+        row = existing.get(pid)
+        values = computed.get(pid)
+        if values is None:
+            if row is not None:
+                db.delete(row)
+            continue
+        if row is None:
+            db.add(ProjectRating(project_id=pid, **values))
+        else:
+            for k, v in values.items():
+                setattr(row, k, v)
+
+
+def rebuild_ratings(db: Session) -> int:
+    """Полностью пересобирает агрегат. Возвращает число строк."""
+    computed = compute_ratings(db)
+    db.query(ProjectRating).delete(synchronize_session=False)
+    db.add_all([ProjectRating(project_id=pid, **values) for pid, values in computed.items()])
+    db.commit()
+    return len(computed)
+
+
+def ensure_ratings(db: Session) -> int:
+    """Достраивает строки для проектов, у которых их нет (например, после обновления)."""
+    missing = [pid for (pid,) in (db.query(Project.id)
+                                    .outerjoin(ProjectRating, ProjectRating.project_id == Project.id)
+                                    .filter(ProjectRating.project_id.is_(None))
+                                    .all())]
+    if missing:
+        refresh_ratings(db, missing)
+        db.commit()
+    return len(missing)
+
+
+def check_ratings(db: Session) -> List[Dict[str, Any]]:
+    """Сверяет агрегат с пересчётом; возвращает список расхождений (пустой — всё сходится)."""
+    computed = compute_ratings(db)
+    stored = {r.project_id: r for r in db.query(ProjectRating).all()}
+    problems: List[Dict[str, Any]] = []
+    for pid in sorted(set(computed) | set(stored)):
+        want = computed.get(pid)
+        row = stored.get(pid)
+        if want is None:
+            problems.append({"project_id": pid, "issue": "orphan rating row"})
+            continue
+        if row is None:
+            problems.append({"project_id": pid, "issue": "missing rating row"})
+            continue
+        for k, v in want.items():
+            have = getattr(row, k)
+            if k == "avg_grade" and v is not None and have is not None:
+                same = abs(have - v) < 1e-9
+            else:
+                same = have == v
+            if not same:
+                problems.append({"project_id": pid, "issue": f"{k}: stored={have!r} expected={v!r}"})
+    return problems
+
+
+def main(argv: List[str]) -> int:
+    from .db import SessionLocal, Base, engine
+
+    cmd = argv[0] if argv else ""
+    if cmd not in ("rebuild", "check"):
+        print("usage: python -m app.rating {rebuild|check}", file=sys.stderr)
+        return 2
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if cmd == "rebuild":
+            print(f"rebuilt {rebuild_ratings(db)} rating rows")
+            return 0
+        problems = check_ratings(db)
+        for p in problems:
+            print(f"project {p['project_id']}: {p['issue']}")
+        print("ok" if not problems else f"{len(problems)} mismatches")
+        return 0 if not problems else 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
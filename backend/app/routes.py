@@ -1,24 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, UploadFile, File, Form, Query, Request, Response
 from sqlalchemy.orm import Session
-from .db import get_db
-from .models import (Project, TeamMember, Milestone, ProjectMilestoneGrade, UserProfile)
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db import get_db, get_async_db, SessionLocal, pool_stats
+from .models import (Project, TeamMember, Milestone, ProjectMilestoneGrade, UserProfile, ProjectRating,
+                     SuggestJob, GradeSuggestion)
 from .schemas import (ProjectCreate, ProjectOut, MemberAdd, MemberOut,
-                      MilestoneCreate, MilestoneOut, GradeSet, GradeIn, GradeOut, ProfileUpdate, ProfileOut, MilestoneIn)
+                      MilestoneCreate, MilestoneOut, GradeSet, GradeIn, GradeOut, ProfileUpdate, ProfileOut, MilestoneIn,
+                      GradeBulkIn, GradeBulkOut, GradeBulkResult)
 from .deps import get_current_user, require_teacher, require_student
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+import csv
+import hashlib
+import json
+import mimetypes
 import os
 import re
 import shutil
+import tempfile
+import time
+import uuid
 from datetime import datetime, timezone
-import httpx
-from sqlalchemy import func
-from .schemas import RatingRowOut, SuggestOut
-import certifi
+from sqlalchemy import and_, func, literal_column, or_, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .schemas import RatingRowOut, SuggestOut, SuggestJobOut, GradeSuggestionOut, ImportIn, ImportReportOut
 from typing import Dict, List, Tuple
 from pathlib import Path
 from fastapi import UploadFile, File, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from .auth import get_current_user, require_teacher
+from .rating import refresh_ratings
+from . import access, bulk_import, events, fastjson, metrics, milestone_zip, profiles, versions, wipe
+from .access import AccessContext, get_access
+from .pagination import Page
+from .suggest import SuggestError, save_suggestion, suggest_for_project
+from . import jobs
 
 router = APIRouter(prefix="/api")
 
@@ -33,37 +48,21 @@ def _roles(user) -> list[str]:
 
 # ---------- Профиль пользователя (ЛК) ----------
 @router.get("/profile", response_model=ProfileOut)
-def get_profile(db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def get_profile(db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
     sub = _sub(user)
-    prof = db.query(UserProfile).filter(UserProfile.sub == sub).first()
-    if not prof:
-        prof = UserProfile(
-            sub=sub,
-            username=user.get("preferred_username"),
-            email=user.get("email"),
-        )
-        db.add(prof); db.commit(); db.refresh(prof)
-
-    # Синхронизируем ФИО/Email/username из токена KC (источник правды)
-    given = (user.get("given_name") or "").strip()
-    family = (user.get("family_name") or "").strip()
-    full_name = (given + " " + family).strip() or None
-    if full_name and prof.full_name != full_name:
-        prof.full_name = full_name
-
-    email = (user.get("email") or "").strip() or None
-    if email and prof.email != email:
-        prof.email = email
-
-    uname = user.get("preferred_username")
-    if uname and prof.username != uname:
-        prof.username = uname
-
-    # Помечаем преподавателей явным mode='teacher' (для фронта)
-    if "teacher" in _roles(user) and prof.mode != "teacher":
-        prof.mode = "teacher"
-
-    db.commit(); db.refresh(prof)
+    prof = await db.scalar(select(UserProfile).where(UserProfile.sub == sub))
+    if prof is not None and profiles.recently_synced(user):
+        return prof
+
+    # Синхронизируем ФИО/Email/username из токена KC (источник правды);
+    # пишем в БД только если что-то поменялось — обычно это чистое чтение
+    fields = profiles.token_fields(user)
+    if not profiles.in_sync(prof, fields):
+        await db.execute(profiles.upsert_stmt(sub, fields))
+        await db.commit()
+        prof = await db.scalar(select(UserProfile).where(UserProfile.sub == sub)
+                               .execution_options(populate_existing=True))
+    profiles.mark_synced(user)
     return prof
 
 @router.post("/profile", response_model=ProfileOut)
@@ -71,16 +70,15 @@ def update_profile(payload: ProfileUpdate, db: Session = Depends(get_db), user=D
     sub = _sub(user)
     roles = _roles(user)
 
+    # ФИО/email/username из токена KC (read-only со стороны формы) — тем же upsert, что и в GET
+    fields = profiles.token_fields(user)
     prof = db.query(UserProfile).filter(UserProfile.sub == sub).first()
-    if not prof:
-        prof = UserProfile(
-            sub=sub,
-            username=user.get("preferred_username"),
-            email=user.get("email"),
-        )
-        db.add(prof); db.commit(); db.refresh(prof)
+    if not profiles.in_sync(prof, fields):
+        db.execute(profiles.upsert_stmt(sub, fields))
+        prof = db.query(UserProfile).filter(UserProfile.sub == sub).populate_existing().first()
 
     is_teacher = "teacher" in roles
+    left: List[int] = []  # проекты, из которых ушёл ставший лидом
 
     # Режим аккаунта: учителю запрещено менять;
     # студент может participant/lead (при lead — вычищаем членства)
@@ -94,7 +92,9 @@ def update_profile(payload: ProfileUpdate, db: Session = Depends(get_db), user=D
         # переход participant/None -> lead (одноразовый)
         if (prof.mode != "lead") and (new_mode == "lead"):
             # при переходе в lead очищаем членства (по ТЗ)
+            left = [pid for (pid,) in db.query(TeamMember.project_id).filter(TeamMember.member_sub == sub).all()]
             db.query(TeamMember).filter(TeamMember.member_sub == sub).delete()
+            refresh_ratings(db, left)
             prof.mode = "lead"
 
         # явная фиксация participant допустима только пока ещё не lead
@@ -107,22 +107,11 @@ def update_profile(payload: ProfileUpdate, db: Session = Depends(get_db), user=D
     if payload.tg is not None:
         prof.tg = payload.tg
 
-    # Снова подливаем ФИО/email из токена KC (read-only со стороны формы)
-    given = (user.get("given_name") or "").strip()
-    family = (user.get("family_name") or "").strip()
-    full_name = (given + " " + family).strip() or None
-    if full_name and prof.full_name != full_name:
-        prof.full_name = full_name
-
-    email = (user.get("email") or "").strip() or None
-    if email and prof.email != email:
-        prof.email = email
-
-    uname = user.get("preferred_username")
-    if uname and prof.username != uname:
-        prof.username = uname
-
+    # одним вызовом и в том же порядке, что импорт (profiles → projects): иначе взаимная блокировка
+    versions.bump(db, "profiles", *(["projects"] if left else []))
     db.commit(); db.refresh(prof)
+    profiles.mark_synced(user)
+    access.forget(sub)  # переход в lead меняет членства
     return prof
 
 # ---------- Проекты ----------
@@ -148,21 +137,52 @@ def create_project(payload: ProjectCreate, db: Session = Depends(get_db), user=D
     db.add(p); db.commit(); db.refresh(p)
     # добавим лида как участника
     db.add(TeamMember(project_id=p.id, member_sub=sub, role_in_team="lead"))
+    refresh_ratings(db, [p.id])
+    versions.bump(db, "projects")
+    events.emit(db, "member", p.id, member_sub=sub)
     db.commit()
+    access.forget(sub)
     return p
 
+def _project_filters(project_id, group_no: str | None, has_grade: bool | None, min_avg_grade: float | None) -> list:
+    """Фильтры списков проектов/рейтинга — подзапросами по id, чтобы не раздувать строки join'ами."""
+    clauses = []
+    if group_no is not None:
+        clauses.append(project_id.in_(
+            select(TeamMember.project_id)
+              .join(UserProfile, UserProfile.sub == TeamMember.member_sub)
+              .where(UserProfile.group_no == group_no)))
+    if has_grade is not None:
+        graded = select(ProjectRating.project_id).where(ProjectRating.grade_count > 0)
+        clauses.append(project_id.in_(graded) if has_grade else project_id.not_in(graded))
+    if min_avg_grade is not None:
+        clauses.append(project_id.in_(select(ProjectRating.project_id).where(ProjectRating.avg_grade >= min_avg_grade)))
+    return clauses
+
+def _filter_resources(group_no: str | None, has_grade: bool | None, min_avg_grade: float | None) -> list[str]:
+    """От каких ещё классов данных (см. versions.py) зависит выдача с этими фильтрами."""
+    return ((["profiles"] if group_no is not None else [])
+            + (["grades"] if has_grade is not None or min_avg_grade is not None else []))
+
 @router.get("/projects", response_model=list[ProjectOut])
-def list_projects(db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def list_projects(request: Request, response: Response, page: Page = Depends(),
+                        group_no: str | None = None, has_grade: bool | None = None,
+                        min_avg_grade: float | None = Query(None, ge=0, le=5),
+                        db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
     sub = _sub(user)
     roles = user.get("realm_access", {}).get("roles", [])
-    if "teacher" in roles:
-        return db.query(Project).order_by(Project.id.desc()).all()
-    # студент видит только свои проекты
-    q = (db.query(Project)
-           .join(TeamMember, TeamMember.project_id == Project.id)
-           .filter(TeamMember.member_sub == sub)
-           .order_by(Project.id.desc()))
-    return q.all()
+    deps = _filter_resources(group_no, has_grade, min_avg_grade)
+    if (not_modified := await versions.conditional(db, request, response, sub, "projects", *deps)) is not None:
+        return not_modified
+    q = (select(*fastjson.columns(ProjectOut, Project))
+           .where(*_project_filters(Project.id, group_no, has_grade, min_avg_grade)))
+    if "teacher" not in roles:
+        # студент видит только свои проекты
+        q = q.join(TeamMember, TeamMember.project_id == Project.id).where(TeamMember.member_sub == sub)
+    if (after := page.after(int)) is not None:
+        q = q.where(Project.id < after[0])
+    rows = [r._asdict() for r in (await db.execute(page.apply(q.order_by(Project.id.desc()))))]
+    return fastjson.rows_response(ProjectOut, page.finish(rows, response, lambda p: (p["id"],)), response)
 
 @router.post("/projects/{project_id}/members", response_model=MemberOut)
 def add_member(project_id: int, payload: MemberAdd, db: Session = Depends(get_db), user=Depends(get_current_user)):
@@ -187,7 +207,12 @@ def add_member(project_id: int, payload: MemberAdd, db: Session = Depends(get_db
     if exists: raise HTTPException(400, "Student already in this project")
 
     m = TeamMember(project_id=project_id, member_sub=payload.member_sub, role_in_team=payload.role_in_team)
-    db.add(m); db.commit(); db.refresh(m)
+    db.add(m)
+    refresh_ratings(db, [project_id])
+    versions.bump(db, "projects")
+    events.emit(db, "member", project_id, member_sub=payload.member_sub)
+    db.commit(); db.refresh(m)
+    access.forget(payload.member_sub)
 
     # Проверка mobile_repo_url при достижении 5 человек
     count += 1
@@ -204,16 +229,19 @@ def add_member(project_id: int, payload: MemberAdd, db: Session = Depends(get_db
     }
 
 @router.get("/projects/{project_id}/members", response_model=list[MemberOut])
-def get_members(project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sub = _sub(user)
-    roles = user.get("realm_access", {}).get("roles", [])
-    if "teacher" in roles:
-        return db.query(TeamMember).where(TeamMember.project_id == project_id).all()
+def get_members(project_id: int, request: Request, response: Response, page: Page = Depends(), group_no: str | None = None,
+                db: Session = Depends(get_db), ctx: AccessContext = Depends(get_access)):
     # студент — только если участник проекта
-    is_member = db.query(TeamMember).filter(TeamMember.project_id == project_id, TeamMember.member_sub == sub).first()
-    if not is_member:
-        raise HTTPException(403, "Forbidden")
-    return db.query(TeamMember).where(TeamMember.project_id == project_id).all()
+    ctx.require_member(project_id)
+    deps = _filter_resources(group_no, None, None)
+    if (not_modified := versions.conditional_sync(db, request, response, ctx.sub, "projects", *deps)) is not None:
+        return not_modified
+    q = db.query(TeamMember).where(TeamMember.project_id == project_id)
+    if group_no is not None:
+        q = q.join(UserProfile, UserProfile.sub == TeamMember.member_sub).where(UserProfile.group_no == group_no)
+    if (after := page.after(int)) is not None:
+        q = q.where(TeamMember.id > after[0])
+    return page.finish(page.apply(q.order_by(TeamMember.id.asc())).all(), response, lambda m: (m.id,))
 
 # ---------- Майлстоуны (глобальные) ----------
 @router.post("/milestones", response_model=MilestoneOut)
@@ -229,15 +257,40 @@ def create_milestone(payload: MilestoneIn, db: Session = Depends(get_db), user=D
 
     m = Milestone(title=payload.title, deadline=payload.deadline)
     db.add(m)
+    versions.bump(db, "milestones")
+    db.flush()  # id нового майлстоуна — для события
+    events.emit(db, "milestone", None, milestone_id=m.id)
     db.commit()
     db.refresh(m)
     return m
 
 @router.get("/milestones", response_model=list[MilestoneOut])
-def list_milestones(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return db.query(Milestone).order_by(Milestone.id.desc()).all()
+async def list_milestones(request: Request, response: Response, page: Page = Depends(),
+                          deadline_from: date | None = None, deadline_to: date | None = None,
+                          db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
+    if (not_modified := await versions.conditional(db, request, response, _sub(user), "milestones")) is not None:
+        return not_modified
+    q = select(*fastjson.columns(MilestoneOut, Milestone))
+    # deadline хранится строкой YYYY-MM-DD — лексикографическое сравнение совпадает с датами
+    if deadline_from is not None:
+        q = q.where(Milestone.deadline >= deadline_from.isoformat())
+    if deadline_to is not None:
+        q = q.where(Milestone.deadline <= deadline_to.isoformat())
+    if (after := page.after(int)) is not None:
+        q = q.where(Milestone.id < after[0])
+    rows = [r._asdict() for r in (await db.execute(page.apply(q.order_by(Milestone.id.desc()))))]
+    return fastjson.rows_response(MilestoneOut, page.finish(rows, response, lambda m: (m["id"],)), response)
 
 # ---------- Оценки и файлы по майлстоуну проекта ----------
+def _grade_upsert(rows: List[dict]):
+    """INSERT ... ON CONFLICT (project_id, milestone_id) DO UPDATE: оценку ставит/меняет одна команда."""
+    stmt = pg_insert(ProjectMilestoneGrade).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["project_id", "milestone_id"],
+        set_={"grade": stmt.excluded.grade, "graded_by_sub": stmt.excluded.graded_by_sub,
+              "graded_at": stmt.excluded.graded_at},
+    )
+
 @router.post("/projects/{project_id}/milestones/{milestone_id}/grade", response_model=GradeOut)
 def set_grade(project_id: int, milestone_id: int, payload: GradeSet, db: Session = Depends(get_db), user=Depends(require_teacher)):
     if not db.get(Project, project_id):
@@ -245,27 +298,17 @@ def set_grade(project_id: int, milestone_id: int, payload: GradeSet, db: Session
     if not db.get(Milestone, milestone_id):
         raise HTTPException(404, "Milestone not found")
 
-    rel = (db.query(ProjectMilestoneGrade)
-             .filter(ProjectMilestoneGrade.project_id == project_id,
-                     ProjectMilestoneGrade.milestone_id == milestone_id)
-             .first())
-
-    if not rel:
-        rel = ProjectMilestoneGrade(
-            project_id=project_id,
-            milestone_id=milestone_id,
-            grade=payload.grade,
-            graded_by_sub=_sub(user),
-            graded_at=datetime.utcnow(),
-        )
-        db.add(rel)
-    else:
-        rel.grade = payload.grade
-        rel.graded_by_sub = _sub(user)
-        rel.graded_at = datetime.utcnow()
+    rel = db.execute(
+        _grade_upsert([{"project_id": project_id, "milestone_id": milestone_id, "grade": payload.grade,
+                        "graded_by_sub": _sub(user), "graded_at": datetime.utcnow()}])
+          .returning(ProjectMilestoneGrade.grade, ProjectMilestoneGrade.presentation_path,
+                     ProjectMilestoneGrade.report_path)
+    ).one()
 
+    refresh_ratings(db, [project_id])
+    versions.bump(db, "grades")
+    events.emit(db, "grade", project_id, milestone_id=milestone_id)
     db.commit()
-    db.refresh(rel)
 
     return GradeOut(
         project_id=project_id,
@@ -275,9 +318,100 @@ def set_grade(project_id: int, milestone_id: int, payload: GradeSet, db: Session
         report_path=rel.report_path
     )
 
+@router.post("/grades/bulk", response_model=GradeBulkOut)
+def bulk_grades(payload: GradeBulkIn, db: Session = Depends(get_db), user=Depends(require_teacher)):
+    """
+    Много оценок за один запрос: существование проектов/майлстоунов — двумя IN-запросами,
+    запись — одним upsert и пересчётом рейтинга в одной транзакции. Ошибка в записи
+    (нет проекта, повтор пары) не мешает остальным; результаты — в порядке entries.
+    """
+    entries = payload.entries
+    projects = set(db.scalars(select(Project.id).where(Project.id.in_({e.project_id for e in entries}))))
+    milestones = set(db.scalars(select(Milestone.id).where(Milestone.id.in_({e.milestone_id for e in entries}))))
+
+    results: List[GradeBulkResult] = []
+    rows: Dict[Tuple[int, int], dict] = {}
+    now, sub = datetime.utcnow(), _sub(user)
+    for e in entries:
+        key = (e.project_id, e.milestone_id)
+        error = ("Project not found" if e.project_id not in projects
+                 else "Milestone not found" if e.milestone_id not in milestones
+                 else "Duplicate entry" if key in rows
+                 else None)
+        results.append(GradeBulkResult(project_id=e.project_id, milestone_id=e.milestone_id,
+                                       status="error" if error else "updated", grade=e.grade, error=error))
+        if not error:
+            rows[key] = {"project_id": e.project_id, "milestone_id": e.milestone_id, "grade": e.grade,
+                         "graded_by_sub": sub, "graded_at": now}
+
+    if rows:
+        # xmax = 0 — строка только что вставлена, иначе — обновлена по конфликту
+        created = {
+            (r.project_id, r.milestone_id)
+            for r in db.execute(_grade_upsert(list(rows.values())).returning(
+                ProjectMilestoneGrade.project_id, ProjectMilestoneGrade.milestone_id,
+                literal_column("xmax = 0").label("created")))
+            if r.created
+        }
+        for r in results:
+            if r.status != "error" and (r.project_id, r.milestone_id) in created:
+                r.status = "created"
+        refresh_ratings(db, {pid for pid, _ in rows})
+        versions.bump(db, "grades")
+        for pid in sorted({pid for pid, _ in rows}):
+            events.emit(db, "grade", pid)  # без milestone_id: клиент перечитывает проект целиком
+        db.commit()
+
+    return GradeBulkOut(applied=len(rows), failed=len(entries) - len(rows), results=results)
+
 #UPLOAD_DIR = "/app/uploads"  # смонтируем том
 UPLOAD_ROOT = Path("/app/uploads")
 
+# Лимиты на размер файла по типу (МБ); по умолчанию — как client_max_body_size в nginx
+UPLOAD_MAX_BYTES = {
+    "presentation": int(float(os.getenv("UPLOAD_MAX_PRESENTATION_MB", "50")) * 1024 * 1024),
+    "report": int(float(os.getenv("UPLOAD_MAX_REPORT_MB", "50")) * 1024 * 1024),
+}
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def _store_upload(upload: UploadFile, dest: Path, max_bytes: int, kind: str) -> str:
+    """
+    Копирует загрузку кусками во временный файл рядом с dest, затем fsync + атомарный rename.
+    Память — один кусок, независимо от размера файла. Возвращает sha256 содержимого.
+    """
+    t0 = time.perf_counter()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(prefix=".upload-", dir=dest.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = upload.file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(413, f"File too large (max {max_bytes // (1024 * 1024)} MB)")
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    # rename должен пережить сбой питания — синхронизируем и каталог
+    dir_fd = os.open(dest.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    metrics.observe_upload(kind, size, time.perf_counter() - t0)
+    return digest.hexdigest()
+
 @router.post("/projects/{project_id}/milestones/{milestone_id}/files", response_model=GradeOut)
 def upload_files(project_id: int, milestone_id: int,
                  presentation: UploadFile | None = File(None),
@@ -292,12 +426,13 @@ def upload_files(project_id: int, milestone_id: int,
     if proj.lead_sub != sub:
         raise HTTPException(403, "Only team lead can upload files")
 
+    # строка пары может ещё не существовать; параллельная оценка/загрузка не создаст дубль
+    db.execute(pg_insert(ProjectMilestoneGrade)
+               .values(project_id=project_id, milestone_id=milestone_id)
+               .on_conflict_do_nothing(index_elements=["project_id", "milestone_id"]))
     rel = (db.query(ProjectMilestoneGrade)
              .filter(ProjectMilestoneGrade.project_id == project_id,
-                     ProjectMilestoneGrade.milestone_id == milestone_id).first())
-    if not rel:
-        rel = ProjectMilestoneGrade(project_id=project_id, milestone_id=milestone_id)
-        db.add(rel)
+                     ProjectMilestoneGrade.milestone_id == milestone_id).one())
 
     target_dir = UPLOAD_ROOT / str(project_id) / str(milestone_id)
     target_dir.mkdir(parents=True, exist_ok=True)
@@ -306,272 +441,471 @@ def upload_files(project_id: int, milestone_id: int,
         name = os.path.basename(name or "")
         return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "file.bin"
 
-    if presentation:
-        p = target_dir / f"presentation_{_safe(presentation.filename)}"
-        with open(p, "wb") as f: f.write(presentation.file.read())
-        rel.presentation_path = str(p.relative_to(UPLOAD_ROOT))
-
-    if report:
-        p = target_dir / f"report_{_safe(report.filename)}"
-        with open(p, "wb") as f: f.write(report.file.read())
-        rel.report_path = str(p.relative_to(UPLOAD_ROOT))
-
-    db.commit(); db.refresh(rel)
+    # Новые файлы — в свой каталог на каждую загрузку, старые не трогаем до commit: откат (413
+    # второго файла, сбой БД) оставляет строку и её sha256 при прежнем, нетронутом содержимом
+    upload_dir = target_dir / uuid.uuid4().hex[:12]
+    upload_dir.mkdir()
+    stored: List[Path] = []
+    replaced = []  # прежние файлы — удалим после commit
+    try:
+        if presentation:
+            p = upload_dir / f"presentation_{_safe(presentation.filename)}"
+            sha = _store_upload(presentation, p, UPLOAD_MAX_BYTES["presentation"], "presentation")
+            stored.append(p)
+            if rel.presentation_path:
+                replaced.append(rel.presentation_path)
+            rel.presentation_path, rel.presentation_sha256 = str(p.relative_to(UPLOAD_ROOT)), sha
+
+        if report:
+            p = upload_dir / f"report_{_safe(report.filename)}"
+            sha = _store_upload(report, p, UPLOAD_MAX_BYTES["report"], "report")
+            stored.append(p)
+            if rel.report_path:
+                replaced.append(rel.report_path)
+            rel.report_path, rel.report_sha256 = str(p.relative_to(UPLOAD_ROOT)), sha
+
+        versions.bump(db, "grades")
+        events.emit(db, "files", project_id, milestone_id=milestone_id)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        for fp in stored:
+            fp.unlink(missing_ok=True)
+        upload_dir.rmdir()
+        raise
+    if not stored:
+        upload_dir.rmdir()
+    db.refresh(rel)
+    for old in replaced:
+        old_fp = UPLOAD_ROOT / old
+        old_fp.unlink(missing_ok=True)
+        if old_fp.parent != target_dir:  # каталог прежней загрузки (файлы старой раскладки лежат прямо в target_dir)
+            try:
+                old_fp.parent.rmdir()
+            except OSError:
+                pass  # там остался второй файл той загрузки
     return GradeOut(project_id=project_id, milestone_id=milestone_id,
                     grade=rel.grade, presentation_path=rel.presentation_path, report_path=rel.report_path,
                     graded_by_sub=rel.graded_by_sub, graded_at=rel.graded_at)
 
-@router.get("/files/{project_id}/{milestone_id}/{kind}")
-def download_file(project_id: int, milestone_id: int, kind: str,
-                  db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sub = _sub(user)
-    roles = user.get("realm_access", {}).get("roles", []) or []
+# Если задан (например, "/_protected_uploads/"), бэкенд только проверяет доступ,
+# а сам файл отдаёт nginx через X-Accel-Redirect (см. nginx/nginx.conf)
+FILES_ACCEL_REDIRECT_PREFIX = os.getenv("FILES_ACCEL_REDIRECT_PREFIX") or None
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
 
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None | bool:
+    """
+    Разбирает одиночный диапазон 'bytes=a-b' → (start, end) включительно.
+    None — заголовка нет/он нам не подходит (отдаём файл целиком), False — диапазон невыполним (416).
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        return None  # несколько диапазонов или мусор — по RFC можно ответить целиком
+    a, b = m.group(1), m.group(2)
+    if a == "" and b == "":
+        return None
+    if a == "":
+        n = int(b)  # последние n байт
+        if n == 0 or size == 0:
+            return False
+        return max(size - n, 0), size - 1
+    start = int(a)
+    if b and int(b) < start:
+        return None  # 'bytes=5-2' синтаксически неверен — по RFC 9110 заголовок игнорируем
+    end = min(int(b), size - 1) if b else size - 1
+    if start >= size:
+        return False
+    return start, end
+
+def _iter_file_range(fp: Path, start: int, end: int):
+    with open(fp, "rb") as f:
+        f.seek(start)
+        left = end - start + 1
+        while left > 0:
+            chunk = f.read(min(UPLOAD_CHUNK_SIZE, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            yield chunk
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+@router.get("/files/{project_id}/{milestone_id}/{kind}")
+def download_file(project_id: int, milestone_id: int, kind: str, request: Request,
+                  db: Session = Depends(get_db), ctx: AccessContext = Depends(get_access)):
     proj = db.get(Project, project_id)
     if not proj: raise HTTPException(404, "Project not found")
 
     # Скачивать можно преподавателю и членам команды (включая лида)
-    if "teacher" not in roles:
-        is_member = db.query(TeamMember).filter_by(project_id=project_id, member_sub=sub).first()
-        if not is_member and proj.lead_sub != sub:
-            raise HTTPException(403, "Forbidden")
+    ctx.require_member(project_id)
 
     rel = db.query(ProjectMilestoneGrade).filter_by(project_id=project_id, milestone_id=milestone_id).first()
     if not rel: raise HTTPException(404, "Files not found")
 
     rel_path = rel.presentation_path if kind == "presentation" else rel.report_path if kind == "report" else None
     if not rel_path: raise HTTPException(404, "File not uploaded")
+    digest = rel.presentation_sha256 if kind == "presentation" else rel.report_sha256
 
     fp = UPLOAD_ROOT / rel_path
-    if not fp.exists(): raise HTTPException(404, "File missing on server")
+    disposition = f'attachment; filename="{fp.name}"'
 
-    return FileResponse(str(fp), filename=fp.name)
+    if FILES_ACCEL_REDIRECT_PREFIX:
+        # Range/ETag/sendfile — на стороне nginx
+        return Response(headers={
+            "X-Accel-Redirect": FILES_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + rel_path,
+            "Content-Disposition": disposition,
+        })
+
+    try:
+        st = fp.stat()
+    except FileNotFoundError:
+        raise HTTPException(404, "File missing on server")
+
+    # Сильный ETag из sha256 содержимого; для файлов, загруженных до появления
+    # хешей, остаётся ETag по mtime/size от FileResponse
+    headers = {"Accept-Ranges": "bytes"}
+    etag = f'"{digest}"' if digest else None
+    if etag:
+        headers["ETag"] = etag
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+    rng = _parse_range(request.headers.get("range"), st.st_size)
+    if_range = request.headers.get("if-range")
+    if rng is not None and if_range is not None and (etag is None or if_range.strip() != etag):
+        rng = None  # файл мог измениться — отдаём целиком
+    if rng is False:
+        headers["Content-Range"] = f"bytes */{st.st_size}"
+        return Response(status_code=416, headers=headers)
+    if rng:
+        start, end = rng
+        headers.update({
+            "Content-Range": f"bytes {start}-{end}/{st.st_size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": disposition,
+        })
+        media_type = mimetypes.guess_type(fp.name)[0] or "application/octet-stream"
+        return StreamingResponse(_iter_file_range(fp, start, end), status_code=206,
+                                 media_type=media_type, headers=headers)
+
+    return FileResponse(str(fp), filename=fp.name, headers=headers, stat_result=st)
+
+@router.post("/milestones/{milestone_id}/files.zip/link")
+def milestone_files_zip_link(milestone_id: int, grades: bool = True, db: Session = Depends(get_db),
+                             user=Depends(require_teacher)):
+    """Короткоживущая подписанная ссылка на архив — для загрузчика браузера (без заголовков)."""
+    if db.get(Milestone, milestone_id) is None:
+        raise HTTPException(404, "Milestone not found")
+    token, expires = milestone_zip.sign_link(milestone_id)
+    return {"url": f"/api/milestones/{milestone_id}/files.zip?grades={str(grades).lower()}&token={token}",
+            "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat()}
+
+async def _zip_access(milestone_id: int, token: str | None = None,
+                      authorization: str | None = Header(default=None)) -> None:
+    # подписанная ссылка (?token=) или обычный Bearer преподавателя
+    if token is not None:
+        if not milestone_zip.verify_link(milestone_id, token):
+            raise HTTPException(403, "Invalid or expired download link")
+        return
+    await require_teacher(await get_current_user(authorization))
+
+@router.get("/milestones/{milestone_id}/files.zip", dependencies=[Depends(_zip_access)])
+def milestone_files_zip(milestone_id: int, grades: bool = True, db: Session = Depends(get_db)):
+    """Все презентации и отчёты майлстоуна одним ZIP (потоком); grades=true — ещё grades.csv."""
+    if db.get(Milestone, milestone_id) is None:
+        raise HTTPException(404, "Milestone not found")
+    return StreamingResponse(
+        milestone_zip.stream_zip(UPLOAD_ROOT, milestone_id, with_grades=grades),
+        media_type="application/zip",
+        # X-Accel-Buffering: nginx отдаёт куски сразу, а не копит ответ во временном файле
+        headers={"Content-Disposition": f'attachment; filename="milestone-{milestone_id}.zip"',
+                 "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/projects/{project_id}/milestones/with-state", response_model=list[GradeOut])
-def milestones_state(project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def milestones_state(project_id: int, request: Request, response: Response,
+                           db: AsyncSession = Depends(get_async_db), ctx: AccessContext = Depends(get_access)):
     # доступ: участник проекта или преподаватель
-    sub = _sub(user)
-    roles = user.get("realm_access", {}).get("roles", [])
-    if "teacher" not in roles:
-        is_member = db.query(TeamMember).filter(TeamMember.project_id == project_id, TeamMember.member_sub == sub).first()
-        if not is_member: raise HTTPException(403, "Forbidden")
-
-    m_ids = [m.id for m in db.query(Milestone).order_by(Milestone.id.asc()).all()]
-    out = []
-    for mid in m_ids:
-        rel = (db.query(ProjectMilestoneGrade)
-                .filter(ProjectMilestoneGrade.project_id == project_id,
-                        ProjectMilestoneGrade.milestone_id == mid).first())
-        out.append(GradeOut(
-            project_id=project_id, milestone_id=mid,
-            grade=rel.grade if rel else None,
-            presentation_path=rel.presentation_path if rel else None,
-            report_path=rel.report_path if rel else None
-        ))
-    return out
+    ctx.require_member(project_id)
+    if (not_modified := await versions.conditional(db, request, response, ctx.sub, "milestones", "grades")) is not None:
+        return not_modified
+
+    # один LEFT JOIN вместо запроса на каждый майлстоун (пара уникальна — uq_grade_project_milestone)
+    rows = await db.execute(
+        select(Milestone.id, ProjectMilestoneGrade.grade,
+               ProjectMilestoneGrade.presentation_path, ProjectMilestoneGrade.report_path)
+          .outerjoin(ProjectMilestoneGrade,
+                     (ProjectMilestoneGrade.milestone_id == Milestone.id)
+                     & (ProjectMilestoneGrade.project_id == project_id))
+          .order_by(Milestone.id.asc())
+    )
+    return fastjson.rows_response(GradeOut, [
+        {"project_id": project_id, "milestone_id": mid, "grade": grade,
+         "presentation_path": presentation_path, "report_path": report_path,
+         "graded_by_sub": None, "graded_at": None}
+        for mid, grade, presentation_path, report_path in rows
+    ], response)
+
+# ---------- Матрица проекты × майлстоуны (учитель) ----------
+GRADES_MATRIX_BATCH = 500
+
+def _grades_matrix_rows():
+    # Своя сессия: зависимость get_db закрывается до того, как ответ дочитают
+    db = SessionLocal()
+    try:
+        q = (db.query(Project.id, Project.name, Milestone.id,
+                      ProjectMilestoneGrade.grade,
+                      ProjectMilestoneGrade.presentation_path.isnot(None),
+                      ProjectMilestoneGrade.report_path.isnot(None),
+                      ProjectMilestoneGrade.graded_at)
+               .select_from(Project)
+               .join(Milestone, true())
+               .outerjoin(ProjectMilestoneGrade,
+                          (ProjectMilestoneGrade.project_id == Project.id)
+                          & (ProjectMilestoneGrade.milestone_id == Milestone.id))
+               .order_by(Project.id.asc(), Milestone.id.asc(), ProjectMilestoneGrade.id.asc())
+               .execution_options(stream_results=True, yield_per=GRADES_MATRIX_BATCH))
+        yield "["
+        first = True
+        last_key = None
+        chunk: list[str] = []
+        for pid, pname, mid, grade, has_pres, has_rep, graded_at in q:
+            if (pid, mid) == last_key:
+                continue  # дубль оценки по той же паре — берём первую, как и with-state
+            last_key = (pid, mid)
+            chunk.append(json.dumps({
+                "project_id": pid, "project_name": pname, "milestone_id": mid,
+                "grade": grade,
+                "has_presentation": bool(has_pres), "has_report": bool(has_rep),
+                "graded_at": graded_at.isoformat() if graded_at else None,
+            }, ensure_ascii=False))
+            if len(chunk) >= GRADES_MATRIX_BATCH:
+                yield ("" if first else ",") + ",".join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield ("" if first else ",") + ",".join(chunk)
+        yield "]"
+    finally:
+        db.close()
+
+@router.get("/grades/matrix")
+def grades_matrix(user=Depends(require_teacher)):
+    """Все проекты × все майлстоуны одним запросом; ответ — JSON-массив, отдаётся потоком."""
+    return StreamingResponse(_grades_matrix_rows(), media_type="application/json")
 
 @router.get("/projects/{project_id}", response_model=ProjectOut)
-def get_project(project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sub = _sub(user)
-    roles = user.get("realm_access", {}).get("roles", [])
-    p = db.get(Project, project_id)
+async def get_project(project_id: int, db: AsyncSession = Depends(get_async_db),
+                      ctx: AccessContext = Depends(get_access)):
+    p = await db.get(Project, project_id)
     if not p:
         raise HTTPException(404, "Project not found")
-    if "teacher" in roles:
-        return p
-    is_member = db.query(TeamMember).filter(TeamMember.project_id == project_id, TeamMember.member_sub == sub).first()
-    if not is_member:
-        raise HTTPException(403, "Forbidden")
+    ctx.require_member(project_id)
     return p
 
 # ---------- Рейтинг команд (учитель видит всех) ----------
 @router.get("/rating", response_model=list[RatingRowOut])
-def get_rating(db: Session = Depends(get_db), user=Depends(require_teacher)):
-    # считаем team_size отдельно (без дублирования оценок)
-    team_sizes = dict(
-        db.query(TeamMember.project_id, func.count(TeamMember.id))
-          .group_by(TeamMember.project_id).all()
-    )
-    # собираем оценки по проектам (без JOIN с участниками!)
-    rows = (
-        db.query(ProjectMilestoneGrade.project_id, ProjectMilestoneGrade.grade)
-          .filter(ProjectMilestoneGrade.grade.isnot(None)).all()
-    )
-    grades_by_proj = {}
-    for pid, g in rows:
-        grades_by_proj.setdefault(pid, []).append(int(g))
-
-    projects = db.query(Project.id, Project.name).order_by(Project.id.asc()).all()
-    out = []
-    for pid, name in projects:
-        gs = grades_by_proj.get(pid, [])
-        avg = (sum(gs)/len(gs)) if gs else None
-        out.append(RatingRowOut(
-            project_id=pid, project_name=name,
-            team_size=int(team_sizes.get(pid, 0)),
-            avg_grade=avg, grades=gs
-        ))
-    # сортировка по средней убыв., затем по id
-    out.sort(key=lambda r: (-(r.avg_grade if r.avg_grade is not None else -1e9), r.project_id))
-    return out
+async def get_rating(request: Request, response: Response, page: Page = Depends(),
+                     group_no: str | None = None, has_grade: bool | None = None,
+                     min_avg_grade: float | None = Query(None, ge=0, le=5),
+                     db: AsyncSession = Depends(get_async_db), user=Depends(require_teacher)):
+    deps = _filter_resources(group_no, None, None)
+    if (not_modified := await versions.conditional(db, request, response, _sub(user), "grades", "projects", *deps)) is not None:
+        return not_modified
+    # агрегат поддерживается set_grade/add_member/... (см. rating.py), здесь — только чтение
+    q = (select(ProjectRating.project_id, Project.name, ProjectRating.team_size,
+                ProjectRating.avg_grade, ProjectRating.grades)
+           .join(Project, Project.id == ProjectRating.project_id)
+           .where(*_project_filters(ProjectRating.project_id, group_no, has_grade, min_avg_grade)))
+    if (after := page.after(float, int)) is not None:
+        # ключ (avg_grade DESC NULLS LAST, project_id ASC) — как у ix_project_ratings_rank
+        avg, pid = after
+        if avg is None:
+            q = q.where(ProjectRating.avg_grade.is_(None), ProjectRating.project_id > pid)
+        else:
+            q = q.where(or_(ProjectRating.avg_grade < avg,
+                            and_(ProjectRating.avg_grade == avg, ProjectRating.project_id > pid),
+                            ProjectRating.avg_grade.is_(None)))
+    rows = (await db.execute(page.apply(
+        q.order_by(ProjectRating.avg_grade.desc().nulls_last(), ProjectRating.project_id.asc())
+    ))).all()
+    return fastjson.rows_response(RatingRowOut, page.finish([
+        {"project_id": pid, "project_name": name, "team_size": team_size,
+         "avg_grade": avg_grade, "grades": grades or []}
+        for pid, name, team_size, avg_grade, grades in rows
+    ], response, lambda r: (r["avg_grade"], r["project_id"])), response)
 
 # ---------- Подсказка оценки по GitHub (0..5) ----------
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN") or None
-
-def _parse_repo(url: str) -> tuple[str, str] | None:
-    """Вернёт (owner, repo) из https://github.com/owner/repo(.git)? ..."""
-    if not url: 
-        return None
-    m = re.search(r"github\.com[:/]+([^/]+)/([^/\s]+)", url)
-    if not m:
-        return None
-    owner, repo = m.group(1), m.group(2)
-    repo = repo[:-4] if repo.endswith(".git") else repo
-    return owner, repo
-
-async def _github_stats(owner: str, repo: str, since_iso: str, until_iso: str) -> tuple[int, int]:
-    """
-    Возвращает (commits, lines_changed) за интервал.
-    Реализация простая: листим коммиты (пагинация до 100 шт), для каждого тащим деталь и суммируем additions+deletions.
-    Этого достаточно для подсказки 0..5.
-    """
-    headers = {"Accept": "application/vnd.github+json"}
-    if GITHUB_TOKEN:
-        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
-    commits = 0
-    lines = 0
-    async with httpx.AsyncClient(timeout=10.0, verify=certifi.where()) as client:
-        page = 1
-        while page <= 5:  # максимум ~500 коммитов смотрим (5*100) — достаточно для оценки
-            r = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}/commits",
-                headers=headers,
-                params={"since": since_iso, "until": until_iso, "per_page": 100, "page": page},
-            )
-            if r.status_code == 422:
-                # invalid params / repo empty
-                break
-            r.raise_for_status()
-            arr = r.json()
-            if not arr:
-                break
-            for c in arr:
-                sha = c.get("sha")
-                if not sha:
-                    continue
-                commits += 1
-                # деталь коммита — чтобы достать additions/deletions
-                r2 = await client.get(
-                    f"https://api.github.com/repos/{owner}/{repo}/commits/{sha}",
-                    headers=headers,
-                )
-                if r2.status_code == 404:
-                    continue
-                r2.raise_for_status()
-                det = r2.json()
-                stats = det.get("stats") or {}
-                lines += int(stats.get("additions") or 0)
-                lines += int(stats.get("deletions") or 0)
-            if len(arr) < 100:
-                break
-            page += 1
-    return commits, lines
-
-def _score_from_activity(commits: int, lines: int) -> int:
-    """
-    Простейшая формула → 0..5.
-    Нормируем: 20 коммитов = максимум по коммитам; 2000 строк = максимум по строкам.
-    Вес: 0.6 по коммитам, 0.4 по строкам. Округляем до целого и клиппим.
-    """
-    c_part = min(commits / 20.0, 1.0)
-    l_part = min(lines / 2000.0, 1.0)
-    raw = 5.0 * (0.6 * c_part + 0.4 * l_part)
-    s = int(round(raw))
-    return max(0, min(5, s))
-
 @router.post("/projects/{project_id}/milestones/{milestone_id}/suggest", response_model=SuggestOut)
-async def suggest_grade(project_id: int, milestone_id: int, db: Session = Depends(get_db), user=Depends(require_teacher)):
-    p = db.get(Project, project_id)
+async def suggest_grade(project_id: int, milestone_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(require_teacher)):
+    p = await db.get(Project, project_id)
     if not p:
         raise HTTPException(404, "Project not found")
-    m = db.get(Milestone, milestone_id)
+    m = await db.get(Milestone, milestone_id)
     if not m:
         raise HTTPException(404, "Milestone not found")
-    if not p.repo_url:
-        raise HTTPException(400, "Project has no main repo_url")
-
-    parsed = _parse_repo(p.repo_url)
-    if not parsed:
-        raise HTTPException(400, "Unsupported repo_url format (need https://github.com/owner/repo)")
-    owner, repo = parsed
-
-    since_dt = m.created_at or datetime.now(timezone.utc)
-    until_dt = datetime.now(timezone.utc)
-    since_iso = since_dt.astimezone(timezone.utc).isoformat()
-    until_iso = until_dt.astimezone(timezone.utc).isoformat()
-
-    commits, lines = await _github_stats(owner, repo, since_iso, until_iso)
-    score = _score_from_activity(commits, lines)
-    return SuggestOut(
-        score=score,
-        commits=commits,
-        lines_changed=lines,
-        details=f"{owner}/{repo} from {since_iso} to {until_iso}",
-    )
+    try:
+        out = await suggest_for_project(db, p, m)
+    except SuggestError as e:
+        raise HTTPException(400, str(e))
+    await save_suggestion(db, project_id, milestone_id, out=out)
+    await db.commit()
+    return out
+
+# ---------- Подсказки для всех проектов майлстоуна (фоновое задание) ----------
+def _job_out(db: Session, job: SuggestJob) -> SuggestJobOut:
+    results = (db.query(GradeSuggestion)
+                 .filter(GradeSuggestion.job_id == job.id)
+                 .order_by(GradeSuggestion.project_id.asc()).all())
+    out = SuggestJobOut.model_validate(job)
+    out.results = [GradeSuggestionOut.model_validate(r) for r in results]
+    return out
+
+@router.post("/milestones/{milestone_id}/suggest-all", response_model=SuggestJobOut, status_code=202)
+def suggest_all(milestone_id: int, db: Session = Depends(get_db), user=Depends(require_teacher)):
+    if not db.get(Milestone, milestone_id):
+        raise HTTPException(404, "Milestone not found")
+    # по одному активному заданию на майлстоун — повторный клик вернёт текущее;
+    # одновременные клики разводит уникальный индекс uq_suggest_jobs_active
+    active = SuggestJob.status.in_(("queued", "running"))
+    total = db.query(Project).count()
+    while True:
+        job_id = db.scalar(
+            pg_insert(SuggestJob)
+            .values(milestone_id=milestone_id, status="queued", created_by_sub=_sub(user),
+                    total=total, done=0, failed=0)
+            .on_conflict_do_nothing(index_elements=["milestone_id"], index_where=active)
+            .returning(SuggestJob.id))
+        db.commit()
+        if job_id is not None:
+            jobs.enqueue(job_id)
+            job = db.get(SuggestJob, job_id)
+            break
+        job = db.query(SuggestJob).filter(SuggestJob.milestone_id == milestone_id, active).first()
+        if job is not None:
+            break
+        # активное задание успело завершиться между INSERT и чтением — пробуем ещё раз
+    return _job_out(db, job)
+
+@router.get("/suggest-jobs/{job_id}", response_model=SuggestJobOut)
+def get_suggest_job(job_id: int, db: Session = Depends(get_db), user=Depends(require_teacher)):
+    job = db.get(SuggestJob, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return _job_out(db, job)
+
+@router.get("/milestones/{milestone_id}/suggestions", response_model=list[GradeSuggestionOut])
+def list_suggestions(milestone_id: int, db: Session = Depends(get_db), user=Depends(require_teacher)):
+    # сохранённые подсказки — для страницы рейтинга, без обращения к GitHub
+    return (db.query(GradeSuggestion)
+              .filter(GradeSuggestion.milestone_id == milestone_id)
+              .order_by(GradeSuggestion.project_id.asc()).all())
+
+# ---------- События (SSE) ----------
+@router.get("/events")
+async def event_stream(ctx: AccessContext = Depends(get_access)):
+    """Поток изменений (text/event-stream): клиент перечитывает только затронутое, см. events.py."""
+    return StreamingResponse(events.stream(ctx), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/admin/db-pool")
+def db_pool(user=Depends(require_teacher)):
+    """Пулы соединений с БД: занято/свободно/overflow, ожидания и время checkout."""
+    return pool_stats()
+
+# ---------- массовый импорт ----------
+def _import_response(db: Session, sections: Dict[str, list], dry_run: bool):
+    total = sum(len(rows) for rows in sections.values())
+    if total > bulk_import.IMPORT_MAX_ROWS:
+        raise HTTPException(413, f"Too many rows ({total} > {bulk_import.IMPORT_MAX_ROWS})")
+    report = bulk_import.run_import(db, dry_run=dry_run, **sections)
+    if not report.ok:
+        # ничего не записано — отдаём отчёт по строкам
+        return JSONResponse(status_code=422, content=report.model_dump())
+    if not dry_run:
+        profiles.forget()
+        access.forget()
+    return report
+
+@router.post("/admin/import", response_model=ImportReportOut, responses={422: {"model": ImportReportOut}})
+def import_json(payload: ImportIn, dry_run: bool = False, db: Session = Depends(get_db),
+                user=Depends(require_teacher)):
+    """Профили, проекты и составы одним JSON; строки нумеруются с 0 внутри каждой секции."""
+    return _import_response(db, {
+        "profiles": list(enumerate(payload.profiles)),
+        "projects": list(enumerate(payload.projects)),
+        "memberships": list(enumerate(payload.memberships)),
+    }, dry_run)
+
+@router.post("/admin/import/csv", response_model=ImportReportOut, responses={422: {"model": ImportReportOut}})
+def import_csv(
+    profiles_csv: UploadFile | None = File(None, alias="profiles"),
+    projects_csv: UploadFile | None = File(None, alias="projects"),
+    memberships_csv: UploadFile | None = File(None, alias="memberships"),
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    user=Depends(require_teacher),
+):
+    """До трёх CSV (поля формы profiles / projects / memberships) с заголовками по именам полей Import*Row."""
+    sections = {}
+    for name, upload in (("profiles", profiles_csv), ("projects", projects_csv), ("memberships", memberships_csv)):
+        try:
+            sections[name] = bulk_import.parse_csv(upload.file.read()) if upload else []
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(400, f"{name}: cannot parse CSV: {e}")
+    return _import_response(db, sections, dry_run)
+
+@router.get("/admin/export")
+def admin_export(user=Depends(require_teacher)):
+    """Снимок таблиц семестра (NDJSON, потоком) — скачать перед wipe."""
+    name = f"siamonitor-{datetime.utcnow():%Y%m%dT%H%M%S}.ndjson"
+    return StreamingResponse(wipe.export_lines(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{name}"'})
 
 @router.post("/admin/wipe")
 def admin_wipe(
+    background: BackgroundTasks,
     db: Session = Depends(get_db),
     user=Depends(require_teacher)  # доступ только преподавателю
 ):
-    # 1) Удаляем загруженные файлы (полностью каталог uploads)
-    try:
-        if UPLOAD_ROOT.exists():
-            shutil.rmtree(UPLOAD_ROOT)
-        UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        # не валим очистку БД, но сообщим в ответе
-        files_error = str(e)
-    else:
-        files_error = None
-
-    # 2) Чистим БД в корректном порядке в одной транзакции
-    #    - оценки (связи проект<->майлстоун)
-    #    - участники команд
-    #    - проекты
-    #    - майлстоуны
-    #    - профили студентов (оставляем только teacher)
-    deleted = {"grades": 0, "members": 0, "projects": 0, "milestones": 0, "student_profiles": 0}
-
+    # 0) фоновые подсказки этого процесса прерываем: они пишут в suggest_jobs/grade_suggestions,
+    #    а после RESTART IDENTITY их id достались бы новому семестру (чужие процессы отвалятся
+    #    сами — каждая запись задания проверяет owner, см. jobs.py)
+    jobs.cancel_running()
+    # 1) БД: один TRUNCATE в транзакции (профили преподавателей остаются, см. wipe.py)
     try:
-        # оценки
-        deleted["grades"] = db.query(ProjectMilestoneGrade).delete(synchronize_session=False)
-
-        # участники
-        deleted["members"] = db.query(TeamMember).delete(synchronize_session=False)
-
-        # проекты
-        deleted["projects"] = db.query(Project).delete(synchronize_session=False)
-
-        # майлстоуны
-        deleted["milestones"] = db.query(Milestone).delete(synchronize_session=False)
-
-        # профили: удалить всех, у кого mode != 'teacher' (или NULL)
-        q_profiles = db.query(UserProfile).filter(UserProfile.mode != "teacher")
-        # В Postgres сравнение с NULL даст NULL, поэтому удалим и те, где mode IS NULL
-        # корректнее так:
-        q_profiles = db.query(UserProfile).filter(
-            (UserProfile.mode != "teacher") | (UserProfile.mode.is_(None))
-        )
-        deleted["student_profiles"] = q_profiles.delete(synchronize_session=False)
-
+        kept = wipe.truncate_semester(db)
+        versions.bump(db, *versions.RESOURCES)
+        events.emit(db, "reset")
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"Database wipe failed: {e!s}")
+    profiles.forget()
+    access.forget()
+
+    # 2) Файлы: переносим в корзину rename'ами, удаляем уже после ответа
+    try:
+        trash = wipe.move_to_trash(UPLOAD_ROOT)
+    except OSError as e:
+        # БД уже очищена — не валим запрос, но сообщим в ответе
+        trash, files_error = None, str(e)
+    else:
+        files_error = None
+    background.add_task(wipe.purge_trash, UPLOAD_ROOT)
 
     return {
         "ok": True,
-        "deleted": deleted,
+        "truncated": list(wipe.SEMESTER_TABLES),
+        "kept_teacher_profiles": kept,
+        "files_trash": str(trash.relative_to(UPLOAD_ROOT)) if trash else None,
         "files_error": files_error,
     }
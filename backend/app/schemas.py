@@ -72,6 +72,25 @@ class MilestoneIn(BaseModel):
 class GradeSet(BaseModel):
     grade: int = Field(ge=0, le=5)
 
+class GradeBulkEntry(GradeSet):
+    project_id: int
+    milestone_id: int
+
+class GradeBulkIn(BaseModel):
+    entries: List[GradeBulkEntry] = Field(..., min_length=1, max_length=5000)
+
+class GradeBulkResult(BaseModel):
+    project_id: int
+    milestone_id: int
+    status: Literal["created", "updated", "error"]
+    grade: Optional[int] = None
+    error: Optional[str] = None
+
+class GradeBulkOut(BaseModel):
+    applied: int
+    failed: int
+    results: List[GradeBulkResult]  # в порядке entries
+
 class GradeOut(BaseModel):
     project_id: int
     milestone_id: int
@@ -94,5 +113,74 @@ class SuggestOut(BaseModel):
     lines_changed: int
     details: str
 
+class GradeSuggestionOut(BaseModel):
+    project_id: int
+    milestone_id: int
+    score: Optional[int] = None
+    commits: Optional[int] = None
+    lines_changed: Optional[int] = None
+    details: Optional[str] = None
+    error: Optional[str] = None
+    computed_at: Optional[datetime] = None
+    class Config: from_attributes = True
+
+class SuggestJobOut(BaseModel):
+    id: int
+    milestone_id: int
+    status: Literal["queued", "running", "done", "failed"]
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    results: List[GradeSuggestionOut] = []
+    class Config: from_attributes = True
+
 class GradeIn(BaseModel):
     grade: conint(ge=0, le=5)
+
+# --- массовый импорт (преподаватель) ---
+class ImportProfileRow(BaseModel):
+    sub: str = Field(..., min_length=1, max_length=64)
+    username: Optional[str] = Field(default=None, max_length=128)
+    email: Optional[str] = Field(default=None, max_length=256)
+    full_name: Optional[str] = Field(default=None, max_length=256)
+    group_no: Optional[str] = Field(default=None, max_length=64)
+    tg: Optional[str] = Field(default=None, max_length=64)
+    mode: Optional[Literal["participant", "lead"]] = None
+
+class ImportProjectRow(BaseModel):
+    lead_sub: str = Field(..., min_length=1, max_length=64)
+    name: str = Field(..., min_length=1, max_length=200)
+    description: Optional[constr(max_length=3000)] = None
+    repo_url: Optional[str] = Field(default=None, max_length=300)
+    tracker_url: Optional[str] = Field(default=None, max_length=300)
+    mobile_repo_url: Optional[str] = Field(default=None, max_length=300)
+
+class ImportMembershipRow(BaseModel):
+    # проект — по id (уже существующий) или по sub лида (в т.ч. создаваемый этим же импортом)
+    project_id: Optional[int] = None
+    lead_sub: Optional[str] = Field(default=None, max_length=64)
+    member_sub: str = Field(..., min_length=1, max_length=64)
+    role_in_team: Optional[str] = Field(default=None, max_length=64)
+
+class ImportIn(BaseModel):
+    # строки проверяются по одной (Import*Row), чтобы ошибка в одной не роняла весь отчёт
+    profiles: List[dict] = []
+    projects: List[dict] = []
+    memberships: List[dict] = []
+
+class ImportRowError(BaseModel):
+    section: Literal["profiles", "projects", "memberships"]
+    row: int      # JSON — индекс с 0; CSV — номер строки файла (заголовок — строка 1)
+    error: str
+
+class ImportReportOut(BaseModel):
+    ok: bool
+    dry_run: bool = False
+    profiles_created: int = 0
+    profiles_updated: int = 0
+    projects_created: int = 0
+    members_added: int = 0
+    errors: List[ImportRowError] = []
@@ -0,0 +1,180 @@
+# backend/app/sqlstats.py
+"""
+Учёт SQL-запросов в пределах одного HTTP-запроса.
+
+События движков SQLAlchemy считают выполненные statements и время в БД и
+складывают их в QueryStats текущего запроса (contextvar: доезжает и до
+threadpool sync-маршрутов, и в greenlet async-сессий).
+
+* DB_DEBUG=1 — в ответ добавляются заголовки X-DB-Queries / X-DB-Time (мс).
+* DB_REPEAT_WARN_THRESHOLD=N — если один и тот же statement (с точностью до
+  параметров) выполнился в запросе больше N раз, пишем warning: похоже на N+1.
+  0 — не проверять.
+* assert_max_queries() — помощник для тестов: потолок числа запросов на эндпоинт.
+"""
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_DEBUG = os.getenv("DB_DEBUG", "0").lower() in ("1", "true", "yes")
+DB_REPEAT_WARN_THRESHOLD = int(os.getenv("DB_REPEAT_WARN_THRESHOLD", "10"))
+
+log = logging.getLogger(__name__)
+
+_finished: Optional[List["QueryStats"]] = None  # assert_max_queries() собирает сюда итог запроса
+
+# IN (%(id_1_1)s, %(id_1_2)s, ...) разной длины — одна и та же форма запроса
+_PARAM_LIST_RE = re.compile(r"\((?:%\(\w+\)s|\$\d+|\?)(?:,\s*(?:%\(\w+\)s|\$\d+|\?))*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    return _SPACE_RE.sub(" ", _PARAM_LIST_RE.sub("(?)", statement)).strip()
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if DB_REPEAT_WARN_THRESHOLD > 0:
+            self.shapes[statement] = self.shapes.get(statement, 0) + 1
+
+    def repeated(self, threshold: int = DB_REPEAT_WARN_THRESHOLD) -> List[Tuple[str, int]]:
+        """Формы запросов, выполненные больше threshold раз (сырые statements сводим по форме)."""
+        if threshold <= 0:
+            return []
+        by_shape: Dict[str, int] = {}
+        for statement, n in self.shapes.items():
+            shape = statement_shape(statement)
+            by_shape[shape] = by_shape.get(shape, 0) + n
+        return sorted(((s, n) for s, n in by_shape.items() if n > threshold), key=lambda x: -x[1])
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("siam_query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track() -> Iterator[QueryStats]:
+    """Считает запросы внутри блока (в том числе в threadpool/greenlet, запущенных из него)."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# События движков
+# ─────────────────────────────────────────────────────────────────────────────
+_hooks: list = []  # глобальные наблюдатели (метрики): hook(seconds)
+
+
+def on_statement(hook) -> None:
+    _hooks.append(hook)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("siam_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("siam_query_start")
+    if not starts:
+        return
+    dt = time.perf_counter() - starts.pop()
+    for hook in _hooks:
+        hook(dt)
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, dt)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подписывает sync-движок (для async — engine.sync_engine) на подсчёт запросов."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# HTTP
+# ─────────────────────────────────────────────────────────────────────────────
+class QueryStatsMiddleware:
+    """
+    Заводит QueryStats на каждый HTTP-запрос. Должно стоять снаружи MetricsMiddleware
+    (добавляться позже): метрики читают current() уже после ответа.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track() as stats:
+            if DB_DEBUG:
+                async def _send(message):
+                    if message["type"] == "http.response.start":
+                        # запросы, сделанные при отдаче тела потоком, сюда уже не попадут
+                        headers = list(message.get("headers", []))
+                        headers.append((b"x-db-queries", str(stats.count).encode()))
+                        headers.append((b"x-db-time", f"{stats.seconds * 1000:.2f}".encode()))
+                        message = {**message, "headers": headers}
+                    await send(message)
+            else:
+                _send = send
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                if _finished is not None:
+                    _finished.append(stats)
+                for shape, n in stats.repeated():
+                    log.warning("possible N+1 in %s %s: statement repeated %d times: %s",
+                                scope["method"], scope["path"], n, shape[:300])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Для тестов
+# ─────────────────────────────────────────────────────────────────────────────
+def assert_max_queries(client, method: str, url: str, max_queries: int, **kwargs):
+    """
+    Выполняет запрос через TestClient и проверяет, что эндпоинт уложился в max_queries
+    SQL-запросов (заголовки X-DB-* на время вызова включаются принудительно). Считаются
+    и запросы, сделанные уже при отдаче тела потоком, — их в X-DB-Queries нет.
+
+        r = assert_max_queries(client, "GET", "/api/rating", 2, headers=auth)
+    """
+    global DB_DEBUG, _finished
+    prev, DB_DEBUG = DB_DEBUG, True
+    _finished = []
+    try:
+        r = client.request(method, url, **kwargs)  # TestClient дочитывает тело до возврата
+        n = max([int(r.headers["x-db-queries"])] + [s.count for s in _finished])
+    finally:
+        DB_DEBUG, _finished = prev, None
+    if n > max_queries:
+        raise AssertionError(f"{method} {url}: {n} SQL queries, expected at most {max_queries}")
+    return r
@@ -0,0 +1,101 @@
+# backend/app/suggest.py
+"""
+Подсказка оценки 0..5 по активности в репозитории проекта.
+
+Общая логика для POST /projects/{id}/milestones/{mid}/suggest и для
+пакетных заданий (jobs.py); результат сохраняется в grade_suggestions.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .activity import ActivityError, get_source
+from .models import GradeSuggestion, Milestone, Project
+from .schemas import SuggestOut
+
+# Считать ли mobile_repo_url вместе с repo_url. По умолчанию нет: коммиты и строки обоих
+# репозиториев упираются в общие потолки формулы, и оценки команд из 5 человек сдвинутся.
+SUGGEST_INCLUDE_MOBILE_REPO = os.getenv("SUGGEST_INCLUDE_MOBILE_REPO", "0").lower() in ("1", "true", "yes")
+
+
+class SuggestError(ValueError):
+    """Подсказку посчитать нельзя по данным проекта (нет/кривой repo_url)."""
+
+
+def _score_from_activity(commits: int, lines: int) -> int:
+    """
+    Простейшая формула → 0..5.
+    Нормируем: 20 коммитов = максимум по коммитам; 2000 строк = максимум по строкам.
+    Вес: 0.6 по коммитам, 0.4 по строкам. Округляем до целого и клиппим.
+    """
+    c_part = min(commits / 20.0, 1.0)
+    l_part = min(lines / 2000.0, 1.0)
+    raw = 5.0 * (0.6 * c_part + 0.4 * l_part)
+    s = int(round(raw))
+    return max(0, min(5, s))
+
+
+async def suggest_for_project(db: AsyncSession, p: Project, m: Milestone) -> SuggestOut:
+    if not p.repo_url:
+        raise SuggestError("Project has no main repo_url")
+    source = get_source()
+    try:
+        labels = [source.label(p.repo_url)]
+    except ActivityError as e:
+        raise SuggestError(str(e))
+    urls = [p.repo_url]
+    # мобильный репозиторий (обязателен у команд из 5 человек) — только по явной настройке;
+    # если его URL источнику не подходит — просто пропускаем
+    if SUGGEST_INCLUDE_MOBILE_REPO and p.mobile_repo_url and p.mobile_repo_url != p.repo_url:
+        try:
+            labels.append(source.label(p.mobile_repo_url))
+            urls.append(p.mobile_repo_url)
+        except ActivityError:
+            pass
+
+    since_dt = m.created_at or datetime.now(timezone.utc)
+    until_dt = datetime.now(timezone.utc)
+    since_iso = since_dt.astimezone(timezone.utc).isoformat()
+    until_iso = until_dt.astimezone(timezone.utc).isoformat()
+
+    commits = lines = 0
+    truncated = False
+    for url in urls:
+        try:
+            c, l, t = await source.activity(db, url, since_dt, until_dt)
+        except ActivityError as e:
+            raise SuggestError(str(e))
+        commits += c
+        lines += l
+        truncated = truncated or t
+    score = _score_from_activity(commits, lines)
+    details = f"{' + '.join(labels)} from {since_iso} to {until_iso}"
+    if truncated:
+        details += " (partial: only the newest commits of the window were counted)"
+    return SuggestOut(
+        score=score,
+        commits=commits,
+        lines_changed=lines,
+        details=details,
+    )
+
+
+async def save_suggestion(db: AsyncSession, project_id: int, milestone_id: int, *,
+                          out: Optional[SuggestOut] = None, error: Optional[str] = None,
+                          job_id: Optional[int] = None) -> None:
+    """Upsert последней подсказки по паре проект/майлстоун (commit — на вызывающем)."""
+    values = {
+        "job_id": job_id,
+        "score": out.score if out else None,
+        "commits": out.commits if out else None,
+        "lines_changed": out.lines_changed if out else None,
+        "details": out.details if out else None,
+        "error": error,
+        "computed_at": datetime.utcnow(),
+    }
+    await db.execute(pg_insert(GradeSuggestion)
+                     .values(project_id=project_id, milestone_id=milestone_id, **values)
+                     .on_conflict_do_update(index_elements=["project_id", "milestone_id"], set_=values))
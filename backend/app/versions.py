@@ -0,0 +1,97 @@
+# backend/app/versions.py
+"""
+Счётчики версий данных и условные GET (ETag / If-None-Match → 304).
+
+Таблица data_versions хранит по счётчику на класс ресурсов:
+
+    milestones — майлстоуны
+    projects   — проекты и составы команд
+    grades     — оценки и файлы (и рейтинг)
+    profiles   — редактируемые поля профилей (group_no и т.п.)
+
+Меняющие роуты вызывают bump() в своей транзакции, прямо перед commit:
+новая версия видна ровно тогда же, когда и новые данные, а блокировка строки
+счётчика держится недолго. GET-роут сначала читает нужные счётчики (один запрос
+по первичному ключу), строит из них, пользователя и URL сильный ETag и, если он
+совпал с If-None-Match, отвечает 304 — основные запросы не выполняются.
+"""
+import hashlib
+import time
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import DataVersion
+
+RESOURCES = ("milestones", "projects", "grades", "profiles")
+CACHE_CONTROL = "private, no-cache"  # браузер хранит ответ, но всегда ревалидирует
+
+
+def _initial() -> int:
+    # счётчики стартуют с текущего времени в мс: после пересоздания БД ETag'и не совпадут со старыми
+    return int(time.time() * 1000)
+
+
+def ensure(db: Session) -> None:
+    """Заводит строки счётчиков (на старте); существующие не трогает."""
+    db.execute(pg_insert(DataVersion).values([{"resource": r, "version": _initial()} for r in RESOURCES])
+               .on_conflict_do_nothing(index_elements=["resource"]))
+    db.commit()
+
+
+def bump(db: Session, *resources: str) -> None:
+    """Увеличивает счётчики в текущей транзакции (commit — за вызывающим)."""
+    # фиксированный порядок — параллельные транзакции берут блокировки строк одинаково
+    rows = [{"resource": r, "version": _initial()} for r in sorted(set(resources))]
+    stmt = pg_insert(DataVersion).values(rows)
+    db.execute(stmt.on_conflict_do_update(index_elements=["resource"],
+                                          set_={"version": DataVersion.version + 1}))
+
+
+def _versions_stmt(resources):
+    return select(DataVersion.resource, DataVersion.version).where(DataVersion.resource.in_(resources))
+
+
+def _etag(request: Request, sub: str, versions: Dict[str, int], resources) -> str:
+    # ответ зависит от данных (версии), от того, кто спрашивает, и от пути с параметрами
+    key = "|".join([request.url.path, request.url.query, sub] + [f"{r}={versions.get(r, 0)}" for r in resources])
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    if _matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
+
+
+async def conditional(db: AsyncSession, request: Request, response: Response, sub: str,
+                      *resources: str) -> Optional[Response]:
+    """
+    Ответ 304, если у клиента актуальная версия, иначе None (ETag уже выставлен в response):
+
+        if (nm := await versions.conditional(db, request, response, sub, "milestones")) is not None:
+            return nm
+    """
+    got = dict((await db.execute(_versions_stmt(resources))).all())
+    return _conditional(request, response, _etag(request, sub, got, resources))
+
+
+def conditional_sync(db: Session, request: Request, response: Response, sub: str,
+                     *resources: str) -> Optional[Response]:
+    got = dict(db.execute(_versions_stmt(resources)).all())
+    return _conditional(request, response, _etag(request, sub, got, resources))
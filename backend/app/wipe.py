@@ -0,0 +1,78 @@
+# backend/app/wipe.py
+"""Сброс семестра (POST /api/admin/wipe) и снимок БД перед ним (GET /api/admin/export)."""
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import orjson
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from .db import Base, SessionLocal
+
+# в порядке зависимостей — для снимка (при восстановлении — сверху вниз)
+SEMESTER_TABLES = ("user_profiles", "milestones", "projects", "team_members", "project_milestone_grades",
+                   "project_ratings", "suggest_jobs", "grade_suggestions")
+TRASH_DIR = ".trash"
+WIPE_LOCK_TIMEOUT = os.getenv("WIPE_LOCK_TIMEOUT", "10s")  # TRUNCATE ждёт читателей не дольше
+EXPORT_BATCH = 1000
+
+
+def truncate_semester(db: Session) -> int:
+    """
+    Очищает таблицы семестра, оставляя профили преподавателей. Commit — за вызывающим.
+    Возвращает число сохранённых профилей.
+    """
+    db.execute(text("SELECT set_config('lock_timeout', :t, true)"), {"t": WIPE_LOCK_TIMEOUT})
+    db.execute(text("CREATE TEMP TABLE wipe_keep_profiles ON COMMIT DROP AS "
+                    "SELECT * FROM user_profiles WHERE mode = 'teacher'"))
+    db.execute(text(f"TRUNCATE {', '.join(SEMESTER_TABLES)} RESTART IDENTITY CASCADE"))
+    kept = db.execute(text("INSERT INTO user_profiles SELECT * FROM wipe_keep_profiles")).rowcount
+    # RESTART IDENTITY сбросил и последовательность профилей — продолжаем после сохранённых id
+    db.execute(text("SELECT setval(pg_get_serial_sequence('user_profiles', 'id'), "
+                    "COALESCE(MAX(id), 0) + 1, false) FROM user_profiles"))
+    return kept
+
+
+def move_to_trash(root: Path) -> Optional[Path]:
+    """Переносит содержимое root в root/.trash/<метка>; None — переносить нечего."""
+    if not root.exists():
+        root.mkdir(parents=True, exist_ok=True)
+        return None
+    entries = [e for e in root.iterdir() if e.name != TRASH_DIR]
+    if not entries:
+        return None
+    dest = root / TRASH_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    dest.mkdir(parents=True)
+    for e in entries:
+        os.rename(e, dest / e.name)
+    return dest
+
+
+def purge_trash(root: Path) -> None:
+    """Удаляет корзину целиком (фоновая задача после wipe; на старте — остатки прерванной очистки)."""
+    shutil.rmtree(root / TRASH_DIR, ignore_errors=True)
+
+
+def export_lines() -> Iterator[bytes]:
+    """
+    Снимок таблиц семестра построчно: первая строка — метаданные, далее
+    {"table": ..., "row": {...}} на каждую строку. Своя сессия — ответ дочитывают
+    уже после выхода из маршрута.
+    """
+    db = SessionLocal()
+    try:
+        conn = db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        yield orjson.dumps({"export": "siamonitor", "created_at": datetime.utcnow(),
+                            "tables": list(SEMESTER_TABLES)}) + b"\n"
+        for name in SEMESTER_TABLES:
+            table = Base.metadata.tables[name]
+            result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH).execute(
+                select(table).order_by(*table.primary_key.columns))
+            for part in result.partitions():
+                yield b"".join(orjson.dumps({"table": name, "row": r._asdict()}) + b"\n" for r in part)
+    finally:
+        db.close()
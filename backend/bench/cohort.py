@@ -0,0 +1,153 @@
+# backend/bench/cohort.py
+"""
+Генератор синтетического потока студентов для бенчмарков.
+
+Пишет прямо в БД (минуя API, чтобы 1000 проектов создавались секунды):
+преподаватель, N проектов с лидом и 1..5 участниками, M майлстоунов, оценки
+и «загруженные» файлы (презентация/отчёт) в каталоге uploads с sha256,
+затем пересобирает project_ratings. Состав команд, оценки и файлы
+детерминированы --seed.
+
+    cd backend && DATABASE_URL=... python -m bench.cohort --projects 200 --milestones 6 --uploads /tmp/uploads
+"""
+import argparse
+import hashlib
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import insert
+
+MAX_TEAM = 5
+
+
+@dataclass
+class Cohort:
+    run: str
+    teacher: str
+    milestones: list[int] = field(default_factory=list)
+    projects: list[int] = field(default_factory=list)
+    leads: dict[int, str] = field(default_factory=dict)          # project_id -> sub лида
+    members: dict[int, list[str]] = field(default_factory=dict)  # project_id -> все участники (вкл. лида)
+    files: list[tuple[int, int, str]] = field(default_factory=list)  # (project_id, milestone_id, kind)
+
+    @property
+    def students(self) -> list[tuple[str, int]]:
+        return [(sub, pid) for pid, subs in self.members.items() for sub in subs]
+
+
+def _fake_file(path: Path, size: int, rnd: random.Random) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = rnd.randbytes(size)
+    path.write_bytes(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def generate(db, *, projects: int = 50, milestones: int = 4, seed: int = 1,
+             grade_ratio: float = 0.7, file_ratio: float = 0.5, file_size: int = 256 * 1024,
+             uploads: Optional[Path] = None, milestone_created_at: Optional[datetime] = None,
+             repo_prefix: str = "https://github.com/bench", repos: int = 4) -> Cohort:
+    """
+    Создаёт данные в db и коммитит. Все sub помечены префиксом запуска — повторные запуски
+    не конфликтуют. Репозитории проектов берутся из пула в repos штук (как форки одного
+    шаблона), чтобы подсказки оценки после прогрева шли через кэш коммитов.
+    """
+    from app.models import Milestone, Project, ProjectMilestoneGrade, TeamMember, UserProfile
+    from app.rating import rebuild_ratings
+
+    rnd = random.Random(seed)
+    run = uuid.uuid4().hex[:8]  # структура данных задаётся seed, префикс sub — свой у каждого запуска
+    c = Cohort(run=run, teacher=f"{run}-teacher")
+
+    profiles = [{"sub": c.teacher, "username": c.teacher, "email": f"{c.teacher}@bench.local",
+                 "full_name": "Teacher Bench", "mode": "teacher"}]
+    for mi in range(milestones):
+        m = Milestone(title=f"Milestone {mi + 1}", deadline=None)
+        if milestone_created_at:
+            m.created_at = milestone_created_at
+        db.add(m)
+        db.flush()
+        c.milestones.append(m.id)
+
+    for i in range(projects):
+        lead = f"{run}-lead{i}"
+        p = Project(name=f"Team {run}-{i}", description="Synthetic project",
+                    repo_url=f"{repo_prefix}/r{i % repos}", lead_sub=lead,
+                    mobile_repo_url=f"{repo_prefix}/m{i % repos}")
+        db.add(p)
+        db.flush()
+        c.projects.append(p.id)
+        c.leads[p.id] = lead
+        team = [lead] + [f"{run}-s{i}-{j}" for j in range(rnd.randint(0, MAX_TEAM - 1))]
+        c.members[p.id] = team
+        for sub in team:
+            profiles.append({"sub": sub, "username": sub, "email": f"{sub}@bench.local",
+                             "full_name": f"Student {sub}", "mode": "lead" if sub == lead else "participant",
+                             "group_no": f"G-{i % 12:02d}"})
+        db.execute(insert(TeamMember), [
+            {"project_id": p.id, "member_sub": sub, "role_in_team": "lead" if sub == lead else None}
+            for sub in team
+        ])
+
+    db.execute(insert(UserProfile), profiles)
+
+    grades = []
+    for pid in c.projects:
+        for mid in c.milestones:
+            graded = rnd.random() < grade_ratio
+            with_files = uploads is not None and rnd.random() < file_ratio
+            if not graded and not with_files:
+                continue
+            row = {"project_id": pid, "milestone_id": mid, "grade": None, "graded_by_sub": None, "graded_at": None,
+                   "presentation_path": None, "report_path": None,
+                   "presentation_sha256": None, "report_sha256": None}
+            if graded:
+                row.update(grade=rnd.randint(0, 5), graded_by_sub=c.teacher, graded_at=datetime.utcnow())
+            if with_files:
+                for kind, ext in (("presentation", "pdf"), ("report", "docx")):
+                    # то же имя, что даст загрузка "bench.<ext>" через API, — повторная загрузка перезапишет файл
+                    rel = f"{pid}/{mid}/{kind}_bench.{ext}"
+                    row[f"{kind}_path"] = rel
+                    row[f"{kind}_sha256"] = _fake_file(uploads / rel, file_size, rnd)
+                    c.files.append((pid, mid, kind))
+            grades.append(row)
+    if grades:
+        db.execute(insert(ProjectMilestoneGrade), grades)
+
+    rebuild_ratings(db)
+    db.commit()
+    return c
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--projects", type=int, default=50)
+    ap.add_argument("--milestones", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--grade-ratio", type=float, default=0.7)
+    ap.add_argument("--file-ratio", type=float, default=0.5)
+    ap.add_argument("--file-size", type=int, default=256 * 1024)
+    ap.add_argument("--repos", type=int, default=4, help="сколько разных репозиториев на все проекты")
+    ap.add_argument("--uploads", type=Path, help="каталог uploads (без него файлы не создаются)")
+    args = ap.parse_args()
+
+    from app.db import Base, SessionLocal, engine
+    from app import models
+    # таблицы и schema patches, как при старте бэкенда (без app.main — ему нужен Keycloak)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for ddl in models.SCHEMA_PATCHES:
+            conn.exec_driver_sql(ddl)
+    with SessionLocal() as db:
+        c = generate(db, projects=args.projects, milestones=args.milestones, seed=args.seed,
+                     grade_ratio=args.grade_ratio, file_ratio=args.file_ratio, file_size=args.file_size,
+                     uploads=args.uploads, repos=args.repos)
+    print(f"run={c.run} projects={len(c.projects)} milestones={len(c.milestones)} "
+          f"students={len(c.students)} files={len(c.files)}")
+
+
+if __name__ == "__main__":
+    main()
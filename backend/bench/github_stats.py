@@ -0,0 +1,82 @@
+# backend/bench/github_stats.py
+"""
+Бенчмарк github.repo_activity (sync_repo + window_stats) против локального мока GitHub
+с искусственной задержкой.
+
+Сравнивает последовательную выборку деталей коммитов (GITHUB_CONCURRENCY=1,
+как было раньше) с параллельной на холодном кэше github_commits, затем — повторную
+синхронизацию (условный листинг → 304) — и проверяет, что итоги совпадают.
+
+    cd backend && DATABASE_URL=postgresql+psycopg://.../bench python -m bench.github_stats \\
+        --commits 300 --latency 0.05 --concurrency 1 8 16
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from .mock_github import BASE_TIME, MockGitHub, ServerThread
+
+OWNER, REPO = "acme", "demo"
+
+
+async def _run(github, since: datetime, until: datetime, concurrency: int,
+               cold: bool) -> tuple[tuple[int, int], float]:
+    from sqlalchemy import delete
+
+    from app.db import AsyncSessionLocal, async_engine
+    from app.models import GithubCommit, GithubRepoWindow
+
+    github.GITHUB_CONCURRENCY = concurrency
+    github._semaphore = None
+    await github.aclose()
+    key = f"{OWNER}/{REPO}"
+    async with AsyncSessionLocal() as db:
+        if cold:  # без кэша: детали всех коммитов окна запрашиваются заново
+            await db.execute(delete(GithubCommit).where(GithubCommit.repo == key))
+            await db.execute(delete(GithubRepoWindow).where(GithubRepoWindow.repo == key))
+            await db.commit()
+        t0 = time.perf_counter()
+        commits, lines, _ = await github.repo_activity(db, OWNER, REPO, since, until)
+        elapsed = time.perf_counter() - t0
+    await github.aclose()
+    await async_engine.dispose()  # следующий asyncio.run — новый event loop
+    return (commits, lines), elapsed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--commits", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 16])
+    args = ap.parse_args()
+    if "DATABASE_URL" not in os.environ:
+        ap.error("DATABASE_URL is required (use a throwaway database)")
+
+    mock = MockGitHub(commits=args.commits, latency=args.latency)
+    with ServerThread(mock.app) as srv:
+        from app import github, models
+        from app.db import Base, engine
+        github.GITHUB_API_URL = srv.url
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for ddl in models.SCHEMA_PATCHES:
+                conn.exec_driver_sql(ddl)
+
+        since, until = BASE_TIME, datetime.now(timezone.utc)
+        expected = mock.expected(since, until)
+        print(f"commits={args.commits} latency={args.latency * 1000:.0f}ms expected={expected}")
+        baseline = None
+        runs = [(c, True) for c in args.concurrency] + [(args.concurrency[-1], False)]
+        for c, cold in runs:
+            mock.calls = 0
+            result, elapsed = asyncio.run(_run(github, since, until, c, cold))
+            baseline = baseline or elapsed
+            status = "ok" if result == expected else f"MISMATCH {result}"
+            print(f"{'cold' if cold else 'warm'} concurrency={c:<3} {elapsed:7.2f}s  calls={mock.calls:<4} "
+                  f"speedup x{baseline / elapsed:5.1f}  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# backend/bench/keycloak_stub.py
+"""
+Заглушка Keycloak для бенчмарков: свой RSA-ключ, JWKS по HTTP и выпуск токенов,
+которые verify_token_and_roles принимает как настоящие (подпись RS256, iss, aud, exp).
+
+    stub = KeycloakStub()
+    with ServerThread(stub.app) as srv:
+        os.environ.update(stub.env(srv.url))   # до импорта app.auth
+        headers = {"Authorization": f"Bearer {stub.token('t1', roles=['teacher'])}"}
+"""
+import base64
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+ISSUER = "http://keycloak.bench/realms/siamonitor"
+AUDIENCE = "frontend"
+
+
+def _b64uint(n: int) -> str:
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class KeycloakStub:
+    def __init__(self, kid: str = "bench-1", issuer: str = ISSUER, audience: str = AUDIENCE):
+        self.kid = kid
+        self.issuer = issuer
+        self.audience = audience
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption())
+        pub = key.public_key().public_numbers()
+        self.jwks = {"keys": [{"kid": kid, "kty": "RSA", "alg": "RS256", "use": "sig",
+                               "n": _b64uint(pub.n), "e": _b64uint(pub.e)}]}
+        self.jwks_calls = 0
+        self.app = Starlette(routes=[Route("/certs", self.certs)])
+
+    async def certs(self, request: Request) -> JSONResponse:
+        self.jwks_calls += 1
+        return JSONResponse(self.jwks)
+
+    def env(self, url: str) -> Dict[str, str]:
+        """Переменные окружения бэкенда, указывающие на эту заглушку."""
+        return {"KC_ISSUER": self.issuer, "KC_JWKS_URL": f"{url}/certs", "KC_FRONTEND_CLIENT_ID": self.audience}
+
+    def token(self, sub: str, roles: Iterable[str] = ("student",), ttl: int = 3600,
+              claims: Optional[Dict[str, Any]] = None) -> str:
+        now = int(time.time())
+        payload = {
+            "sub": sub, "iss": self.issuer, "aud": self.audience,
+            "iat": now, "exp": now + ttl,
+            "preferred_username": sub, "email": f"{sub}@bench.local",
+            "given_name": sub.capitalize(), "family_name": "Bench",
+            "realm_access": {"roles": list(roles)},
+        }
+        payload.update(claims or {})
+        return jwt.encode(payload, self._pem, algorithm="RS256", headers={"kid": self.kid})
@@ -0,0 +1,238 @@
+# backend/bench/load.py
+"""
+Воспроизводимый нагрузочный сценарий для бэкенда с JSON-отчётом.
+
+Всё поднимается локально: заглушка Keycloak (настоящие RS256-токены через
+verify_token_and_roles), мок GitHub, бэкенд в uvicorn; данные — bench.cohort
+прямо в БД, файлы — во временный каталог uploads. Затем --concurrency
+виртуальных пользователей в течение --duration секунд выполняют смесь:
+
+    rating (преподаватель), with-state, profile, projects, download, upload, suggest
+
+Отчёт: p50/p95/p99/max и throughput по каждому сценарию и в целом —
+его удобно сохранять и сравнивать между версиями:
+
+    cd backend && DATABASE_URL=postgresql+psycopg://.../bench python -m bench.load --out after.json
+    python -m bench.load --app-dir /tmp/before/backend --out before.json
+    python -m bench.load --out after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from .keycloak_stub import KeycloakStub
+from .mock_github import BASE_TIME, MockGitHub, ServerThread
+from .stats import summarize
+
+# сценарий -> вес в смеси
+MIX = {
+    "profile": 20,
+    "projects": 15,
+    "with-state": 20,
+    "rating": 10,
+    "download": 15,
+    "upload": 5,
+    "suggest": 3,
+}
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, stub: KeycloakStub, cohort, upload_size: int):
+        self.client = client
+        self.cohort = cohort
+        self.students = cohort.students
+        self.teacher = {"Authorization": f"Bearer {stub.token(cohort.teacher, roles=['teacher'])}"}
+        # токен на пользователя выпускаем один раз, как браузер с живой сессией
+        self.auth = {sub: {"Authorization": f"Bearer {stub.token(sub)}"} for sub, _ in self.students}
+        self.payload = random.Random(0).randbytes(upload_size)
+
+    def _student(self) -> tuple[dict, int]:
+        sub, pid = random.choice(self.students)
+        return self.auth[sub], pid
+
+    async def profile(self) -> httpx.Response:
+        h, _ = self._student()
+        return await self.client.get("/api/profile", headers=h)
+
+    async def projects(self) -> httpx.Response:
+        h, _ = self._student()
+        return await self.client.get("/api/projects", headers=h)
+
+    async def with_state(self) -> httpx.Response:
+        h, pid = self._student()
+        return await self.client.get(f"/api/projects/{pid}/milestones/with-state", headers=h)
+
+    async def rating(self) -> httpx.Response:
+        return await self.client.get("/api/rating", headers=self.teacher)
+
+    async def download(self) -> httpx.Response:
+        if not self.cohort.files:
+            return await self.rating()
+        pid, mid, kind = random.choice(self.cohort.files)
+        h = self.auth[random.choice(self.cohort.members[pid])]
+        return await self.client.get(f"/api/files/{pid}/{mid}/{kind}", headers=h)
+
+    async def upload(self) -> httpx.Response:
+        pid = random.choice(self.cohort.projects)
+        mid = random.choice(self.cohort.milestones)
+        h = self.auth[self.cohort.leads[pid]]
+        return await self.client.post(f"/api/projects/{pid}/milestones/{mid}/files", headers=h,
+                                      files={"report": ("bench.docx", self.payload, "application/octet-stream")})
+
+    async def suggest(self) -> httpx.Response:
+        pid = random.choice(self.cohort.projects)
+        mid = random.choice(self.cohort.milestones)
+        return await self.client.post(f"/api/projects/{pid}/milestones/{mid}/suggest", headers=self.teacher)
+
+    def action(self, name: str):
+        return getattr(self, name.replace("-", "_"))
+
+
+async def _user(sc: Scenario, names: list[str], weights: list[int], stop_at: float,
+                lat: dict, errors: dict) -> None:
+    while time.perf_counter() < stop_at:
+        name = random.choices(names, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            r = await sc.action(name)()
+            ok = r.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        lat[name].append(time.perf_counter() - t0)
+        if not ok:
+            errors[name] += 1
+
+
+async def _run(base_url: str, stub: KeycloakStub, cohort, args) -> dict:
+    mix = {k: v for k, v in MIX.items() if k not in set(args.skip)}
+    names, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        sc = Scenario(client, stub, cohort, args.upload_size)
+        # прогрев: кэш коммитов GitHub (по подсказке на каждый репозиторий), JWKS, пулы соединений
+        if "suggest" in mix:
+            await asyncio.gather(*(client.post(f"/api/projects/{pid}/milestones/{cohort.milestones[0]}/suggest",
+                                               headers=sc.teacher)
+                                   for pid in cohort.projects[:args.repos]))
+        await _user(sc, names, weights, time.perf_counter() + args.warmup, defaultdict(list), defaultdict(int))
+
+        lat: dict[str, list[float]] = defaultdict(list)
+        errors: dict[str, int] = defaultdict(int)
+        t0 = time.perf_counter()
+        stop_at = t0 + args.duration
+        await asyncio.gather(*(_user(sc, names, weights, stop_at, lat, errors) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    everything = [v for name in lat for v in lat[name]]
+    return {
+        "routes": {name: summarize(lat[name], elapsed, errors[name]) for name in names},
+        "total": summarize(everything, elapsed, sum(errors.values())),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def _git_rev(path: str) -> str | None:
+    try:
+        return subprocess.run(["git", "-C", path, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _print(report: dict, baseline: dict | None) -> None:
+    cols = f"{'scenario':<12}{'count':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(cols + ("   p95 vs baseline" if baseline else ""))
+    rows = list(report["routes"].items()) + [("total", report["total"])]
+    for name, r in rows:
+        line = (f"{name:<12}{r['count']:>8}{r['rps'] or 0:>9.1f}{r['p50_ms'] or 0:>10.1f}"
+                f"{r['p95_ms'] or 0:>10.1f}{r['p99_ms'] or 0:>10.1f}{r['errors']:>8}")
+        base = (baseline or {}).get("routes", {}).get(name) if name != "total" else (baseline or {}).get("total")
+        if base and base.get("p95_ms") and r.get("p95_ms"):
+            line += f"   {(r['p95_ms'] / base['p95_ms'] - 1) * 100:+7.1f}%"
+        print(line)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--projects", type=int, default=100)
+    ap.add_argument("--milestones", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--file-size", type=int, default=256 * 1024, help="размер сгенерированных файлов")
+    ap.add_argument("--upload-size", type=int, default=256 * 1024)
+    ap.add_argument("--github-latency", type=float, default=0.05)
+    ap.add_argument("--github-commits", type=int, default=100)
+    ap.add_argument("--repos", type=int, default=4, help="разных репозиториев на все проекты")
+    ap.add_argument("--skip", nargs="*", default=[], choices=list(MIX), help="исключить сценарии из смеси")
+    ap.add_argument("--out", type=Path, help="куда записать JSON-отчёт")
+    ap.add_argument("--baseline", type=Path, help="JSON-отчёт прошлой версии для сравнения")
+    ap.add_argument("--app-dir", help="каталог backend другой ревизии")
+    args = ap.parse_args()
+    if "DATABASE_URL" not in os.environ:
+        ap.error("DATABASE_URL is required (use a throwaway database)")
+
+    random.seed(args.seed)
+    stub = KeycloakStub()
+    mock = MockGitHub(commits=args.github_commits, latency=args.github_latency)
+    uploads = Path(tempfile.mkdtemp(prefix="siam-bench-uploads-"))
+    with ServerThread(stub.app) as kc, ServerThread(mock.app) as gh:
+        os.environ.update(stub.env(kc.url))
+        os.environ["GITHUB_API_URL"] = gh.url
+        os.environ.setdefault("GITHUB_TOKEN", "")
+        os.environ.pop("FILES_ACCEL_REDIRECT_PREFIX", None)  # файлы отдаёт сам бэкенд
+        app_dir = os.path.abspath(args.app_dir) if args.app_dir else os.getcwd()
+        if args.app_dir:
+            sys.path.insert(0, app_dir)
+        from app import routes
+        from app.db import SessionLocal
+        from app.main import app, on_startup
+        from .cohort import generate
+
+        routes.UPLOAD_ROOT = uploads
+        on_startup()
+        with SessionLocal() as db:
+            # майлстоуны «начались» вместе с историей мок-репозитория — у подсказок есть что считать
+            cohort = generate(db, projects=args.projects, milestones=args.milestones, seed=args.seed,
+                              file_size=args.file_size, uploads=uploads, repos=args.repos,
+                              milestone_created_at=BASE_TIME.replace(tzinfo=None))
+        with ServerThread(app, lifespan="on") as backend:
+            result = asyncio.run(_run(backend.url, stub, cohort, args))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_rev": _git_rev(app_dir),
+            "python": platform.python_version(),
+            "projects": args.projects, "milestones": args.milestones,
+            "students": len(cohort.students), "files": len(cohort.files),
+            "concurrency": args.concurrency, "duration_s": args.duration, "seed": args.seed,
+            "repos": args.repos, "github_latency_s": args.github_latency, "github_calls": mock.calls,
+            "jwks_calls": stub.jwks_calls,
+            "mix": {k: v for k, v in MIX.items() if k not in set(args.skip)},
+        },
+        **result,
+    }
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    _print(report, baseline)
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
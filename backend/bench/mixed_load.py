@@ -0,0 +1,160 @@
+# backend/bench/mixed_load.py
+"""
+Смешанная нагрузка на бэкенд: латентность «горячих» чтений (profile, projects,
+milestones, rating, with-state), пока параллельно идут подсказки оценки.
+
+Поднимает в процессе заглушку Keycloak, мок GitHub и сам бэкенд (uvicorn, с lifespan),
+наполняет БД через API и гоняет нагрузку настоящими HTTP-запросами с настоящими JWT.
+Нужен отдельный Postgres — бэкенд создаст в нём таблицы и тестовые данные:
+
+    cd backend && DATABASE_URL=postgresql+psycopg://... python -m bench.mixed_load --readers 64 --suggesters 8
+
+Сравнение «до/после»: тот же скрипт против другой ревизии бэкенда, например
+    git worktree add /tmp/before <rev> && python -m bench.mixed_load --app-dir /tmp/before/backend
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from .keycloak_stub import KeycloakStub
+from .mock_github import MockGitHub, ServerThread
+from .stats import percentile
+
+
+async def _seed(client: httpx.AsyncClient, stub: KeycloakStub, run: str,
+                projects: int, milestones: int, team: int) -> dict:
+    teacher = {"Authorization": f"Bearer {stub.token(f'{run}-teacher', roles=['teacher'])}"}
+    (await client.get("/api/profile", headers=teacher)).raise_for_status()
+    ms = []
+    for i in range(milestones):
+        r = await client.post("/api/milestones", json={"title": f"{run} m{i}"}, headers=teacher)
+        r.raise_for_status()
+        ms.append(r.json()["id"])
+
+    pids, students = [], []
+    for i in range(projects):
+        lead = {"Authorization": f"Bearer {stub.token(f'{run}-lead{i}')}"}
+        (await client.get("/api/profile", headers=lead)).raise_for_status()
+        (await client.post("/api/profile", json={"mode": "lead"}, headers=lead)).raise_for_status()
+        r = await client.post("/api/projects", headers=lead, json={
+            "name": f"{run} p{i}", "repo_url": f"https://github.com/bench/{run}-r{i}",
+        })
+        r.raise_for_status()
+        pid = r.json()["id"]
+        pids.append(pid)
+        students.append((lead, pid))
+        for j in range(team - 1):
+            sub = f"{run}-s{i}-{j}"
+            member = {"Authorization": f"Bearer {stub.token(sub)}"}
+            (await client.get("/api/profile", headers=member)).raise_for_status()
+            (await client.post(f"/api/projects/{pid}/members", json={"member_sub": sub}, headers=lead)).raise_for_status()
+            students.append((member, pid))
+    return {"teacher": teacher, "milestones": ms, "projects": pids, "students": students}
+
+
+async def _reader(client, data, stop_at: float, lat: dict, errors: dict) -> None:
+    while time.perf_counter() < stop_at:
+        headers, pid = random.choice(data["students"])
+        name, method, url, h = random.choice([
+            ("profile", "GET", "/api/profile", headers),
+            ("projects", "GET", "/api/projects", headers),
+            ("milestones", "GET", "/api/milestones", headers),
+            ("with-state", "GET", f"/api/projects/{pid}/milestones/with-state", headers),
+            ("rating", "GET", "/api/rating", data["teacher"]),
+        ])
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, url, headers=h)
+            ok = r.status_code == 200
+        except httpx.TimeoutException:
+            ok = False
+        lat[name].append(time.perf_counter() - t0)
+        if not ok:
+            errors[name] += 1
+
+
+async def _suggester(client, data, stop_at: float, lat: dict, errors: dict) -> None:
+    while time.perf_counter() < stop_at:
+        pid = random.choice(data["projects"])
+        mid = random.choice(data["milestones"])
+        t0 = time.perf_counter()
+        try:
+            r = await client.post(f"/api/projects/{pid}/milestones/{mid}/suggest", headers=data["teacher"])
+            ok = r.status_code == 200
+        except httpx.TimeoutException:
+            ok = False
+        lat["suggest"].append(time.perf_counter() - t0)
+        if not ok:
+            errors["suggest"] += 1
+
+
+async def _run(base_url: str, stub: KeycloakStub, args) -> None:
+    limits = httpx.Limits(max_connections=args.readers + args.suggesters + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        run = uuid.uuid4().hex[:8]
+        data = await _seed(client, stub, run, args.projects, args.milestones, args.team)
+        lat: dict[str, list[float]] = defaultdict(list)
+        errors: dict[str, int] = defaultdict(int)
+        # прогрев: JWKS, пулы соединений, кэш коммитов
+        await _reader(client, data, time.perf_counter() + 1.0, defaultdict(list), defaultdict(int))
+
+        stop_at = time.perf_counter() + args.duration
+        await asyncio.gather(
+            *(_reader(client, data, stop_at, lat, errors) for _ in range(args.readers)),
+            *(_suggester(client, data, stop_at, lat, errors) for _ in range(args.suggesters)),
+        )
+
+    print(f"readers={args.readers} suggesters={args.suggesters} duration={args.duration}s "
+          f"github_latency={args.github_latency * 1000:.0f}ms")
+    print(f"{'route':<12}{'count':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    reads = []
+    for name in sorted(lat):
+        v = lat[name]
+        if name != "suggest":
+            reads.extend(v)
+        print(f"{name:<12}{len(v):>8}{len(v) / args.duration:>9.1f}{percentile(v, 50) * 1000:>10.1f}"
+              f"{percentile(v, 95) * 1000:>10.1f}{percentile(v, 99) * 1000:>10.1f}{errors[name]:>8}")
+    if reads:
+        print(f"{'all reads':<12}{len(reads):>8}{len(reads) / args.duration:>9.1f}"
+              f"{statistics.median(reads) * 1000:>10.1f}{percentile(reads, 95) * 1000:>10.1f}{percentile(reads, 99) * 1000:>10.1f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--readers", type=int, default=64)
+    ap.add_argument("--suggesters", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=15.0)
+    ap.add_argument("--projects", type=int, default=20)
+    ap.add_argument("--milestones", type=int, default=4)
+    ap.add_argument("--team", type=int, default=3)
+    ap.add_argument("--github-latency", type=float, default=0.05)
+    ap.add_argument("--github-commits", type=int, default=200)
+    ap.add_argument("--timeout", type=float, default=60.0, help="таймаут одного запроса, сек")
+    ap.add_argument("--app-dir", help="каталог backend другой ревизии (для замера «до»)")
+    args = ap.parse_args()
+    if "DATABASE_URL" not in os.environ:
+        ap.error("DATABASE_URL is required (use a throwaway database)")
+
+    stub = KeycloakStub()
+    mock = MockGitHub(commits=args.github_commits, latency=args.github_latency)
+    with ServerThread(stub.app) as kc, ServerThread(mock.app) as gh:
+        os.environ.update(stub.env(kc.url))
+        os.environ["GITHUB_API_URL"] = gh.url
+        os.environ.setdefault("GITHUB_TOKEN", "")
+        if args.app_dir:
+            sys.path.insert(0, os.path.abspath(args.app_dir))
+        from app.main import app
+        with ServerThread(app, lifespan="on") as backend:
+            asyncio.run(_run(backend.url, stub, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# backend/bench/mock_github.py
+"""
+Локальный мок GitHub REST API для бенчмарков подсказки оценки.
+
+Отдаёт детерминированный набор коммитов для любого owner/repo:
+    GET /repos/{owner}/{repo}/commits?since=&until=&per_page=&page=
+    GET /repos/{owner}/{repo}/commits/{sha}
+Каждый ответ задерживается на latency секунд — имитация сетевой задержки до api.github.com.
+Листинг отдаёт ETag и отвечает 304 на совпавший If-None-Match, как настоящий API.
+
+Запуск отдельно:  python -m bench.mock_github --commits 300 --latency 0.05 --port 9100
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _sha(i: int) -> str:
+    return f"{i:040x}"
+
+
+def _stats(i: int) -> dict:
+    # детерминированные, но разные размеры коммитов
+    return {"additions": (i * 37) % 200, "deletions": (i * 11) % 50}
+
+
+class MockGitHub:
+    def __init__(self, commits: int = 300, latency: float = 0.05):
+        self.commits = commits
+        self.latency = latency
+        self.calls = 0
+        self.not_modified = 0
+        self.app = Starlette(routes=[
+            Route("/repos/{owner}/{repo}/commits", self.list_commits),
+            Route("/repos/{owner}/{repo}/commits/{sha}", self.commit_detail),
+        ])
+
+    def commit_time(self, i: int) -> datetime:
+        # коммит i сделан через i минут после BASE_TIME (0 — самый старый)
+        return BASE_TIME + timedelta(minutes=i)
+
+    def expected(self, since: datetime, until: datetime, limit: int = 500) -> tuple[int, int]:
+        """Что должен вернуть repo_activity для окна [since, until] (commits, lines)."""
+        ids = [i for i in reversed(range(self.commits)) if since <= self.commit_time(i) <= until][:limit]
+        return len(ids), sum(_stats(i)["additions"] + _stats(i)["deletions"] for i in ids)
+
+    async def _delay(self) -> None:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _window(self, request: Request) -> list[int]:
+        q = request.query_params
+        since = datetime.fromisoformat(q["since"]) if q.get("since") else BASE_TIME
+        until = datetime.fromisoformat(q["until"]) if q.get("until") else datetime.now(timezone.utc)
+        # GitHub отдаёт новые коммиты первыми
+        return [i for i in reversed(range(self.commits)) if since <= self.commit_time(i) <= until]
+
+    async def list_commits(self, request: Request) -> Response:
+        await self._delay()
+        ids = self._window(request)
+        per_page = int(request.query_params.get("per_page", 30))
+        page = int(request.query_params.get("page", 1))
+        chunk = ids[(page - 1) * per_page: page * per_page]
+        body = json.dumps([
+            {"sha": _sha(i), "commit": {
+                "author": {"name": f"dev{i % 5}", "date": self.commit_time(i).isoformat()},
+                "committer": {"name": f"dev{i % 5}", "date": self.commit_time(i).isoformat()},
+            }}
+            for i in chunk
+        ])
+        etag = '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    async def commit_detail(self, request: Request) -> JSONResponse:
+        await self._delay()
+        try:
+            i = int(request.path_params["sha"], 16)
+        except ValueError:
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+        if i >= self.commits:
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+        return JSONResponse({"sha": _sha(i), "stats": _stats(i)})
+
+
+class ServerThread:
+    """uvicorn в фоновом потоке на свободном порту; используется бенчмарками."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0, lifespan: str = "off"):
+        self.config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan=lifespan)
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        sock = self.server.servers[0].sockets[0]
+        host, port = sock.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--commits", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--port", type=int, default=9100)
+    args = ap.parse_args()
+    uvicorn.run(MockGitHub(args.commits, args.latency).app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# backend/bench/serialization.py
+"""
+Микробенчмарк сериализации больших списков: прежний путь FastAPI против app.fastjson.
+
+    before: ORM-объекты / Pydantic-модели → проверка по response_model
+            (serialize_response) → JSONResponse (json.dumps)
+    after:  dict из кортежа SQL → одна проверка по TypedDict → ORJSONResponse
+
+БД не нужна: строки синтетические, той же формы, что отдают запросы /rating,
+/projects, /milestones и with-state. Проверяет, что оба пути дают одинаковый JSON.
+
+    cd backend && python -m bench.serialization --rows 1000 10000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app import fastjson
+from app.schemas import GradeOut, MilestoneOut, ProjectOut, RatingRowOut
+
+
+def _tuples(kind: str, n: int, rnd: random.Random) -> list[tuple]:
+    if kind == "rating":
+        return [(i, f"Team {i}", rnd.randint(1, 5), rnd.choice([None, rnd.random() * 5]),
+                 [rnd.randint(0, 5) for _ in range(rnd.randint(0, 8))]) for i in range(n)]
+    if kind == "projects":
+        return [(i, f"Team {i}", "Synthetic project " * 5, f"https://github.com/o/r{i}", None,
+                 f"https://github.com/o/m{i}", f"lead-{i}") for i in range(n)]
+    if kind == "milestones":
+        t0 = datetime(2025, 9, 1)
+        return [(i, f"Milestone {i}", t0 + timedelta(minutes=i, microseconds=i), "2026-01-15") for i in range(n)]
+    return [(i, rnd.choice([None, rnd.randint(0, 5)]), f"1/{i}/presentation_a.pdf", None) for i in range(n)]
+
+
+def _before(kind: str, rows: list[tuple]) -> bytes:
+    """Как было: модели/ORM-объекты, повторная проверка по response_model, json.dumps."""
+    if kind == "rating":
+        model = RatingRowOut
+        content = [RatingRowOut(project_id=a, project_name=b, team_size=c, avg_grade=d, grades=list(e))
+                   for a, b, c, d, e in rows]
+    elif kind == "projects":
+        model = ProjectOut
+        content = [SimpleNamespace(**dict(zip(ProjectOut.model_fields, r))) for r in rows]
+    elif kind == "milestones":
+        model = MilestoneOut
+        content = [SimpleNamespace(**dict(zip(MilestoneOut.model_fields, r))) for r in rows]
+    else:
+        model = GradeOut
+        content = [GradeOut(project_id=1, milestone_id=m, grade=g, presentation_path=p, report_path=r)
+                   for m, g, p, r in rows]
+    field = create_model_field(name="Response", type_=list[model], mode="serialization")
+    return JSONResponse(asyncio.run(serialize_response(field=field, response_content=content))).body
+
+
+def _after(kind: str, rows: list[tuple]) -> bytes:
+    if kind == "rating":
+        model = RatingRowOut
+        data = [{"project_id": a, "project_name": b, "team_size": c, "avg_grade": d, "grades": e}
+                for a, b, c, d, e in rows]
+    elif kind == "grades":
+        model = GradeOut
+        data = [{"project_id": 1, "milestone_id": m, "grade": g, "presentation_path": p, "report_path": r,
+                 "graded_by_sub": None, "graded_at": None} for m, g, p, r in rows]
+    else:
+        model = ProjectOut if kind == "projects" else MilestoneOut
+        data = [dict(zip(model.model_fields, r)) for r in rows]
+    return fastjson.rows_response(model, data).body
+
+
+def _time(fn, repeat: int) -> float:
+    fn()  # прогрев (кэш TypeAdapter/полей)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--repeat", type=int, default=7, help="лучший из N прогонов")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    print(f"{'endpoint':<12}{'rows':>7}{'before ms':>11}{'after ms':>10}{'speedup':>9}  output")
+    for kind in ("rating", "projects", "milestones", "grades"):
+        for n in args.rows:
+            rows = _tuples(kind, n, random.Random(args.seed))
+            same = json.loads(_before(kind, rows)) == json.loads(_after(kind, rows))
+            before = _time(lambda: _before(kind, rows), args.repeat)
+            after = _time(lambda: _after(kind, rows), args.repeat)
+            print(f"{kind:<12}{n:>7}{before * 1000:>11.1f}{after * 1000:>10.1f}{before / after:>8.1f}x  "
+                  f"{'same' if same else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
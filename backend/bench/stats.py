@@ -0,0 +1,27 @@
+# backend/bench/stats.py
+"""Общие для бенчмарков подсчёты: перцентили и сводка по латентностям."""
+from typing import Optional
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу; для пустого списка — nan."""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def summarize(latencies: list[float], duration: float, errors: int = 0) -> dict:
+    """Сводка для JSON-отчёта: миллисекунды, округлённые до сотых."""
+    def ms(v: float) -> Optional[float]:
+        return None if v != v else round(v * 1000, 2)  # nan -> None
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 2) if duration else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies)) if latencies else None,
+    }
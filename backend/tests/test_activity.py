@@ -0,0 +1,79 @@
+# backend/tests/test_activity.py
+"""GitMirrorSource на фикстурном репозитории: локальный bare-репозиторий по file://."""
+import asyncio
+import os
+import shutil
+import subprocess
+from datetime import datetime, timezone
+
+import pytest
+
+from app import activity
+from app.activity import ActivityError, GitMirrorSource
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(*args, cwd, date=None):
+    env = {**os.environ, "GIT_AUTHOR_NAME": "t", "GIT_AUTHOR_EMAIL": "t@example.com",
+           "GIT_COMMITTER_NAME": "t", "GIT_COMMITTER_EMAIL": "t@example.com"}
+    if date:
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = date
+    subprocess.run(["git", *args], cwd=cwd, env=env, check=True, capture_output=True)
+
+
+def _commit(work, name, lines, date):
+    (work / name).write_text("".join(f"line {i}\n" for i in range(lines)))
+    _git("add", name, cwd=work)
+    _git("commit", "-q", "-m", name, cwd=work, date=date)
+
+
+@pytest.fixture
+def fixture_repo(tmp_path):
+    """Рабочая копия + bare-«удалённый» репозиторий; возвращает (work, url)."""
+    work = tmp_path / "work"
+    work.mkdir()
+    _git("init", "-q", "-b", "main", cwd=work)
+    _commit(work, "old.txt", 7, "2026-01-10T12:00:00+00:00")   # до окна
+    _commit(work, "a.txt", 10, "2026-02-05T12:00:00+00:00")
+    _commit(work, "b.txt", 20, "2026-02-06T12:00:00+00:00")
+    bare = tmp_path / "remote.git"
+    _git("clone", "-q", "--bare", str(work), str(bare), cwd=tmp_path)
+    _git("remote", "add", "origin", str(bare), cwd=work)
+    return work, f"file://{bare}"
+
+
+@pytest.fixture
+def allow_file(monkeypatch):
+    monkeypatch.setattr(activity, "GIT_ALLOW_PROTOCOL", "https:file")
+
+
+WINDOW = (datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2026, 3, 1, tzinfo=timezone.utc))
+
+
+def test_activity_counts_commits_and_lines_in_window(tmp_path, fixture_repo, allow_file):
+    _, url = fixture_repo
+    src = GitMirrorSource(root=tmp_path / "mirrors")
+    assert asyncio.run(src.activity(None, url, *WINDOW)) == (2, 30, False)
+    assert (src.mirror_path(url) / "HEAD").exists()
+
+
+def test_activity_fetches_new_commits_into_existing_mirror(tmp_path, fixture_repo, allow_file, monkeypatch):
+    work, url = fixture_repo
+    monkeypatch.setattr(activity, "GIT_MIRROR_FETCH_INTERVAL", 0)
+    src = GitMirrorSource(root=tmp_path / "mirrors")
+
+    async def run():
+        first = await src.activity(None, url, *WINDOW)
+        # ветку влили позже, но коммит датирован внутри окна
+        _commit(work, "c.txt", 5, "2026-02-03T12:00:00+00:00")
+        _git("push", "-q", "origin", "main", cwd=work)
+        return first, await src.activity(None, url, *WINDOW)
+
+    assert asyncio.run(run()) == ((2, 30, False), (3, 35, False))
+
+
+def test_file_urls_are_rejected_by_default(tmp_path, fixture_repo):
+    _, url = fixture_repo
+    with pytest.raises(ActivityError):
+        asyncio.run(GitMirrorSource(root=tmp_path / "mirrors").activity(None, url, *WINDOW))
@@ -0,0 +1,87 @@
+# backend/tests/test_jwks.py
+"""
+JWKSManager: одновременные проверки токенов при пустом кэше ключей ждут один
+общий запрос к Keycloak (single-flight). JWKS отдаёт локальная заглушка.
+"""
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from app import auth
+
+N_VERIFICATIONS = 500
+
+
+def _b64(n: int) -> str:
+    return base64.urlsafe_b64encode(n.to_bytes((n.bit_length() + 7) // 8, "big")).rstrip(b"=").decode()
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    pub = key.public_key().public_numbers()
+    jwks = {"keys": [{"kid": "k1", "kty": "RSA", "alg": "RS256", "use": "sig",
+                      "n": _b64(pub.n), "e": _b64(pub.e)}]}
+    return jwk.construct(pem, "RS256"), jwks  # готовый ключ: PEM не разбирается на каждый токен
+
+
+@pytest.fixture
+def jwks_server(signing_key):
+    """Заглушка Keycloak: отвечает с задержкой, чтобы проверки успели собраться в очередь."""
+    body = json.dumps(signing_key[1]).encode()
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(0.2)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/certs", hits
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_concurrent_verifications_share_one_jwks_fetch(monkeypatch, signing_key, jwks_server):
+    url, hits = jwks_server
+    manager = auth.JWKSManager(url)
+    monkeypatch.setattr(auth, "jwks_manager", manager)
+    auth._claims_cache.clear()
+    key = signing_key[0]
+    now = int(time.time())
+    # разные токены — кэш claims не спасает, каждому нужен ключ
+    tokens = [jwt.encode({"sub": f"u{i}", "iss": auth.KC_ISSUER, "aud": auth.KC_FRONTEND_CLIENT_ID,
+                          "iat": now, "exp": now + 300}, key, algorithm="RS256", headers={"kid": "k1"})
+              for i in range(N_VERIFICATIONS)]
+
+    async def run():
+        try:
+            return await asyncio.gather(*(auth.verify_token_and_roles(t) for t in tokens))
+        finally:
+            await manager.aclose()
+
+    claims = asyncio.run(run())
+    assert [c["sub"] for c in claims] == [f"u{i}" for i in range(N_VERIFICATIONS)]
+    assert hits == ["/certs"]
+    assert manager.fetches == 1
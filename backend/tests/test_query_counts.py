@@ -0,0 +1,61 @@
+# backend/tests/test_query_counts.py
+"""
+Потолки числа SQL-запросов на горячие эндпоинты (нужен Postgres, см. фикстуру api).
+
+Данных заведомо больше одного проекта и майлстоуна: запрос на строку (N+1)
+сразу выйдет за потолок.
+"""
+import pytest
+
+from app.db import SessionLocal
+from app.models import Milestone, Project, ProjectMilestoneGrade, TeamMember, UserProfile
+from app.sqlstats import assert_max_queries
+
+N_PROJECTS = 3
+N_MILESTONES = 8
+
+
+@pytest.fixture(scope="module")
+def data(api):
+    db = SessionLocal()
+    milestones = [Milestone(title=f"qc-m{i}") for i in range(N_MILESTONES)]
+    projects = [Project(name=f"qc-p{i}", lead_sub=f"qc-lead{i}") for i in range(N_PROJECTS)]
+    db.add_all(milestones + projects)
+    db.flush()
+    for i, p in enumerate(projects):
+        db.add(UserProfile(sub=p.lead_sub, mode="lead"))
+        db.add(TeamMember(project_id=p.id, member_sub=p.lead_sub, role_in_team="lead"))
+        db.add_all(ProjectMilestoneGrade(project_id=p.id, milestone_id=m.id, grade=(i + j) % 6,
+                                         presentation_path=f"{p.id}/{m.id}/p.pdf")
+                   for j, m in enumerate(milestones) if j % 2 == 0)
+    db.commit()
+    try:
+        yield projects
+    finally:
+        # оценки и составы уходят каскадом (ON DELETE CASCADE)
+        db.query(Project).filter(Project.id.in_([p.id for p in projects])).delete()
+        db.query(Milestone).filter(Milestone.id.in_([m.id for m in milestones])).delete()
+        db.query(UserProfile).filter(UserProfile.sub.in_([p.lead_sub for p in projects])).delete()
+        db.commit()
+        db.close()
+
+
+def test_milestones_with_state(api, data):
+    p = data[0]
+    url = f"/api/projects/{p.id}/milestones/with-state"
+    auth = {"Authorization": f"Bearer {p.lead_sub}"}
+    # контекст доступа + версия для ETag + один LEFT JOIN
+    r = assert_max_queries(api, "GET", url, 3, headers=auth)
+    assert r.status_code == 200
+    assert len(r.json()) >= N_MILESTONES
+    # контекст доступа уже в кэше
+    assert_max_queries(api, "GET", url, 2, headers=auth)
+
+
+def test_grades_matrix(api, data):
+    # запрос идёт уже при отдаче тела потоком — assert_max_queries учитывает и его
+    r = assert_max_queries(api, "GET", "/api/grades/matrix", 1,
+                           headers={"Authorization": "Bearer teacher-qc"})
+    assert r.status_code == 200
+    ids = {p.id for p in data}
+    assert sum(1 for row in r.json() if row["project_id"] in ids) == N_PROJECTS * N_MILESTONES
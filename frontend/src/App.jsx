@@ -56,10 +56,8 @@ export default function App() {
       </header>
 
       {authed && isTeacher && showPublish && (
-        <MilestonePublishBar onPublished={()=>{
-          // опционально: можно пробросить событие, чтобы в нужных экранах перезагрузить данные
-           // window.dispatchEvent(new Event('milestones:changed'))
-        }}/>
+        // открытые экраны подхватят новый майлстоун сами — по событию 'milestone' из /api/events
+        <MilestonePublishBar />
       )}
 
       {authed ? (
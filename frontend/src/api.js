@@ -5,10 +5,13 @@ async function handle(r) {
   return r.json()
 }
 
+// 'no-cache' — браузер хранит ответ, но каждый раз ревалидирует его по ETag
+// (If-None-Match): если данные не менялись, бэкенд отвечает 304 без тела,
+// а fetch отдаёт сохранённую копию как обычный 200.
 export function apiGet(path) {
   return fetch(path, {
     headers: { Authorization: `Bearer ${kcToken()}` },
-    cache: 'no-store',
+    cache: 'no-cache',
   }).then(handle)
 }
 
@@ -31,3 +34,75 @@ export function apiUpload(path, formData) {
   }).then(handle)
 }
 
+// Скачать файл, отдаваемый под авторизацией (ссылкой не получится — нужен заголовок)
+export async function apiDownload(path, fallbackName) {
+  const r = await fetch(path, { headers: { Authorization: `Bearer ${kcToken()}` } })
+  if (!r.ok) throw new Error(await r.text())
+  const m = /filename="([^"]+)"/.exec(r.headers.get('Content-Disposition') || '')
+  const url = URL.createObjectURL(await r.blob())
+  const a = document.createElement('a')
+  a.href = url
+  a.download = m ? m[1] : fallbackName
+  a.click()
+  URL.revokeObjectURL(url)
+}
+
+// ---------- Push-события (/api/events, Server-Sent Events) ----------
+// Одно соединение на вкладку, пока есть подписчики. fetch, а не EventSource:
+// нужен заголовок Authorization. После обрыва переподключаемся и шлём
+// подписчикам 'reset' — пропущенное перечитывается (по ETag, обычно 304).
+const eventListeners = new Set()
+let eventsAbort = null
+
+export function onServerEvent(fn) {
+  eventListeners.add(fn)
+  if (!eventsAbort) runEvents()
+  return () => {
+    eventListeners.delete(fn)
+    if (!eventListeners.size && eventsAbort) { eventsAbort.abort(); eventsAbort = null }
+  }
+}
+
+function emitServerEvent(ev) {
+  eventListeners.forEach(fn => { try { fn(ev) } catch (e) { console.error(e) } })
+}
+
+async function runEvents() {
+  const ctrl = eventsAbort = new AbortController()
+  let retry = 3000
+  let missed = false // соединение закрылось не по 'reset' — события могли пропасть
+  while (!ctrl.signal.aborted) {
+    try {
+      const r = await fetch('/api/events', {
+        headers: { Authorization: `Bearer ${kcToken()}`, Accept: 'text/event-stream' },
+        signal: ctrl.signal,
+      })
+      if (!r.ok) throw new Error(`events: HTTP ${r.status}`)
+      if (missed) emitServerEvent({ type: 'reset', project_id: null })
+      missed = true
+      const reader = r.body.pipeThrough(new TextDecoderStream()).getReader()
+      let buf = ''
+      for (;;) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buf += value
+        let i
+        while ((i = buf.indexOf('\n\n')) >= 0) {
+          const block = buf.slice(0, i)
+          buf = buf.slice(i + 2)
+          for (const line of block.split('\n')) {
+            if (line.startsWith('retry: ')) retry = Number(line.slice(7)) || retry
+            if (!line.startsWith('data: ')) continue
+            const ev = JSON.parse(line.slice(6))
+            if (ev.type === 'reset') missed = false
+            emitServerEvent(ev)
+          }
+        }
+      }
+    } catch (e) {
+      if (ctrl.signal.aborted) return
+      missed = true
+    }
+    await new Promise(res => setTimeout(res, retry))
+  }
+}
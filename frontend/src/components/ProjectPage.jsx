@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react'
 import { currentRoute, navigate } from '../router'
-import { apiGet, apiPost, apiUpload } from '../api'
+import { apiGet, apiPost, apiUpload, onServerEvent } from '../api'
 import { kcHasRole, kcProfile } from '../auth/keycloak'
 
 export default function ProjectPage() {
@@ -39,6 +39,24 @@ export default function ProjectPage() {
 
   useEffect(() => { loadExisting() }, [projectId])
 
+  // Push-события: перечитываем только затронутое и без «Загрузка…»
+  useEffect(() => {
+    if (!projectId) return
+    const reload = {
+      milestones: () => apiGet('/api/milestones').then(setMilestones),
+      state: () => apiGet(`/api/projects/${projectId}/milestones/with-state`).then(setState),
+      members: () => apiGet(`/api/projects/${projectId}/members`).then(setMembers),
+    }
+    return onServerEvent(ev => {
+      const parts = ev.type === 'reset' ? ['milestones', 'state', 'members']
+        : ev.type === 'milestone' ? ['milestones', 'state']
+        : ev.project_id !== projectId ? []
+        : ev.type === 'member' ? ['members']
+        : ['state'] // grade, files
+      parts.forEach(k => reload[k]().catch(() => {}))
+    })
+  }, [projectId])
+
   const createProject = async (e) => {
     e.preventDefault()
     try {
@@ -162,6 +180,15 @@ export default function ProjectPage() {
                       }}>
                         Предложить оценку
                       </button>
+                      <button style={{marginLeft:8}} onClick={async ()=>{
+                        // подписанная ссылка: архив принимает загрузчик браузера — потоком, без буфера во вкладке
+                        try{
+                          const { url } = await apiPost(`/api/milestones/${ms.id}/files.zip/link`, {})
+                          window.location.assign(url)
+                        }catch(e){ alert(e.message) }
+                      }}>
+                        Все сдачи (ZIP)
+                      </button>
                     </td>
                   )}
                   <td style={td}>
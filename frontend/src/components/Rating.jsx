@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react'
-import { apiGet, apiPost } from '../api'
+import { apiDownload, apiGet, apiPost, onServerEvent } from '../api'
 import { navigate } from '../router'
 import { kcHasRole } from '../auth/keycloak'
 
@@ -32,6 +32,19 @@ export default function Rating() {
     return () => { mounted = false }
   }, [])
 
+  // Новые оценки и составы приходят событиями; пачку (bulk-оценки) схлопываем в один запрос
+  useEffect(() => {
+    let timer = null
+    const off = onServerEvent((ev) => {
+      if (!['grade', 'member', 'reset'].includes(ev.type)) return
+      clearTimeout(timer)
+      timer = setTimeout(() => {
+        apiGet('/api/rating').then((data) => Array.isArray(data) && setRows(data)).catch(() => {})
+      }, 300)
+    })
+    return () => { off(); clearTimeout(timer) }
+  }, [])
+
   const wipeAll = async () => {
     if (!isTeacher) return
     const first = window.confirm(
@@ -41,6 +54,15 @@ export default function Rating() {
     const text = window.prompt('Для подтверждения введите: УДАЛИТЬ ВСЁ')
     if (text !== 'УДАЛИТЬ ВСЁ') return
 
+    if (window.confirm('Скачать снимок базы перед очисткой?')) {
+      try {
+        await apiDownload('/api/admin/export', 'siamonitor-export.ndjson')
+      } catch (e) {
+        alert('Не удалось скачать снимок: ' + (e?.message || 'unknown') + '. Очистка отменена.')
+        return
+      }
+    }
+
     try {
       await apiPost('/api/admin/wipe', {})
       alert('Очистка выполнена. Страница будет перезагружена.')